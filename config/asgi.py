@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Sob ASGI os endpoints AJAX usam as views assíncronas (qualidade/views/api_async.py)
+os.environ.setdefault('API_ASYNC', 'True')
 
 application = get_asgi_application()
+
+# Expiração automática da lixeira (só liga com LIXEIRA_EXPIRACAO_AUTOMATICA=True)
+from qualidade.lixeira import iniciar_agendador  # noqa: E402
+
+iniciar_agendador()
@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 import dj_database_url
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 load_dotenv()
 
 
@@ -53,33 +54,64 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Depois do WhiteNoise: os arquivos estáticos não entram nos tempos
+    'qualidade.logs.tempos_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    # Depois do CSRF para saber se a resposta levou token (ver qualidade/compressao.py)
+    'qualidade.compressao.compressao_middleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'qualidade.middleware.contexto_usuario_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
+# Perfil dos templates:
+#   cache -> cada template é lido e compilado uma vez por processo (produção)
+#   dev   -> relê e recompila os arquivos a cada renderização, para editar
+#            templates num servidor sem o autoreload do runserver
+TEMPLATES_PERFIS = {
+    'cache': [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ],
+    'dev': [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ],
+}
+TEMPLATES_PERFIL = os.getenv('TEMPLATES_PERFIL', 'cache')
+if TEMPLATES_PERFIL not in TEMPLATES_PERFIS:
+    raise ImproperlyConfigured(
+        f"TEMPLATES_PERFIL inválido: {TEMPLATES_PERFIL!r} (use {', '.join(TEMPLATES_PERFIS)})"
+    )
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': TEMPLATES_PERFIS[TEMPLATES_PERFIL],
         },
     },
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Quando servido por ASGI (config/asgi.py), os endpoints AJAX de produção
+# usam as versões assíncronas de qualidade/views/api_async.py
+API_ASYNC = os.getenv('API_ASYNC', 'False') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -101,9 +133,25 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Banco de testes em arquivo (não em memória): os testes de
+            # concorrência abrem uma conexão por thread, com WAL
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
+# Perfil SQLite para produção (vários tablets gravando ao mesmo tempo).
+# Ativa WAL, busy_timeout e synchronous=NORMAL (ver qualidade/signals.py) e
+# abre as transações de escrita com BEGIN IMMEDIATE, evitando "database is locked".
+SQLITE_OTIMIZADO = os.getenv('SQLITE_OTIMIZADO', 'False') == 'True'
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '20000'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+if SQLITE_OTIMIZADO and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+        'transaction_mode': 'IMMEDIATE',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,7 +191,20 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# CSS/JS das telas ficam em qualidade/static/qualidade/. O collectstatic grava
+# cada arquivo com o hash do conteúdo no nome (manifest) e as versões .gz e .br
+# (brotli, se o pacote estiver instalado); o WhiteNoise serve os arquivos com
+# hash com cache "immutable" de um ano, então só um arquivo alterado é baixado
+# de novo. (STATICFILES_STORAGE não é mais lido desde o Django 5.1.)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 ## USAR ESSE STATIC ROOT SOMENTE SE FOR HOSPEDAR EM RENDER,NGINX ETC
 ## STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -153,6 +214,127 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Tempo (em horas) que a resposta de uma requisição com chave de idempotência
+# fica guardada para responder a reenvios (qualidade/idempotencia.py)
+IDEMPOTENCIA_TTL_HORAS = int(os.getenv('IDEMPOTENCIA_TTL_HORAS', '24'))
+
+# Segundos que o contexto do usuário (request.ctx: perfil e grupos) fica
+# guardado na sessão. Mudanças de perfil/grupo invalidam antes disso pelo cache,
+# então só vale com CACHE_COMPARTILHADO; sem ele o contexto vem do banco (uma
+# consulta) em toda requisição.
+CTX_USUARIO_TTL = int(os.getenv('CTX_USUARIO_TTL', '300'))
+
+# Cache (sessões cached_db, request.ctx, tokens de quiosque). Sem CACHE_REDIS_URL
+# o cache é local de cada processo; com mais de um worker do gunicorn use o Redis
+# (pacote redis), senão um worker pode ler uma sessão que outro já alterou.
+# CACHE_COMPARTILHADO diz se todos os processos enxergam o mesmo cache: o que
+# depende de invalidação entre workers (request.ctx, somas por hora do telão,
+# posição de estoque) só usa o cache nesse caso.
+CACHE_COMPARTILHADO = bool(os.getenv('CACHE_REDIS_URL'))
+if CACHE_COMPARTILHADO:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'qualidade',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000'))},
+        }
+    }
+
+# Perfil de sessão:
+#   db        -> padrão do Django, lê a tabela django_session em toda requisição
+#   cached_db -> lê do cache local e só vai ao banco quando não encontra
+#   cookies   -> sessão assinada no próprio cookie, sem tabela (o logout não
+#                invalida cópias antigas do cookie)
+# Os telões não usam sessão: entram com token de quiosque (qualidade/quiosque.py).
+SESSOES_PERFIS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSAO_PERFIL = os.getenv('SESSAO_PERFIL', 'db')
+if SESSAO_PERFIL not in SESSOES_PERFIS:
+    raise ImproperlyConfigured(
+        f"SESSAO_PERFIL inválido: {SESSAO_PERFIL!r} (use {', '.join(SESSOES_PERFIS)})"
+    )
+SESSION_ENGINE = SESSOES_PERFIS[SESSAO_PERFIL]
+
+# Compressão das respostas das views (qualidade/compressao.py): brotli se o
+# pacote estiver instalado e o navegador aceitar, senão gzip
+COMPRESSAO_ATIVA = os.getenv('COMPRESSAO_ATIVA', 'True') == 'True'
+COMPRESSAO_TAMANHO_MINIMO = int(os.getenv('COMPRESSAO_TAMANHO_MINIMO', '1024'))
+COMPRESSAO_TIPOS = {
+    'text/html',
+    'text/plain',
+    'text/csv',
+    'application/json',
+}
+# 4 é o melhor custo/benefício do brotli para resposta gerada a cada pedido
+COMPRESSAO_NIVEL_BROTLI = int(os.getenv('COMPRESSAO_NIVEL_BROTLI', '4'))
+# Não comprime páginas que renderizaram token CSRF (proteção extra contra BREACH)
+COMPRESSAO_SEM_CSRF = os.getenv('COMPRESSAO_SEM_CSRF', 'False') == 'True'
+
+# Expiração da lixeira: o que foi excluído há mais de LIXEIRA_EXPIRACAO_DIAS é
+# apagado de vez pelo comando purge_lixeira ou, com LIXEIRA_EXPIRACAO_AUTOMATICA,
+# por um agendador dentro do próprio servidor (qualidade/lixeira.py). O agendador
+# liga em todos os workers, mas uma trava no banco (TravaTarefa) faz só um
+# expirar a cada LIXEIRA_EXPIRACAO_INTERVALO_HORAS
+LIXEIRA_EXPIRACAO_DIAS = int(os.getenv('LIXEIRA_EXPIRACAO_DIAS', '90'))
+LIXEIRA_EXPIRACAO_AUTOMATICA = os.getenv('LIXEIRA_EXPIRACAO_AUTOMATICA', 'False') == 'True'
+LIXEIRA_EXPIRACAO_INTERVALO_HORAS = int(os.getenv('LIXEIRA_EXPIRACAO_INTERVALO_HORAS', '24'))
+
+# Logs (qualidade/logs.py): uma linha JSON por evento no stderr, escrita por
+# uma thread com fila limitada (LOG_FILA=False escreve direto, útil em testes)
+LOG_FORMATO = os.getenv('LOG_FORMATO', 'json')  # json ou texto
+LOG_NIVEL = os.getenv('LOG_NIVEL', 'INFO')
+# Níveis por módulo, ex.: "qualidade.models=DEBUG,qualidade.tempos=WARNING"
+LOG_NIVEIS = dict(
+    item.replace(' ', '').split('=', 1)
+    for item in os.getenv('LOG_NIVEIS', '').split(',')
+    if '=' in item
+)
+LOG_FILA = os.getenv('LOG_FILA', 'True') == 'True'
+LOG_FILA_TAMANHO = int(os.getenv('LOG_FILA_TAMANHO', '10000'))
+# Fração dos pedidos com a duração logada; os lentos saem sempre (WARNING)
+LOG_AMOSTRAGEM_TEMPOS = float(os.getenv('LOG_AMOSTRAGEM_TEMPOS', '0.1'))
+LOG_PEDIDO_LENTO_MS = int(os.getenv('LOG_PEDIDO_LENTO_MS', '1000'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'qualidade.logs.FormatadorJSON'},
+        'texto': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'filters': {
+        'amostragem_tempos': {
+            '()': 'qualidade.logs.FiltroAmostragem',
+            'taxa': LOG_AMOSTRAGEM_TEMPOS,
+        },
+    },
+    'handlers': {
+        'saida': (
+            {'class': 'qualidade.logs.FilaHandler', 'tamanho': LOG_FILA_TAMANHO, 'formatter': LOG_FORMATO}
+            if LOG_FILA else
+            {'class': 'logging.StreamHandler', 'formatter': LOG_FORMATO}
+        ),
+    },
+    'root': {'handlers': ['saida'], 'level': 'WARNING'},
+    'loggers': {
+        'django': {'handlers': ['saida'], 'level': 'INFO', 'propagate': False},
+        'qualidade': {'handlers': ['saida'], 'level': LOG_NIVEL, 'propagate': False},
+        'qualidade.tempos': {'filters': ['amostragem_tempos']},
+    },
+}
+for nome, nivel in LOG_NIVEIS.items():
+    LOGGING['loggers'].setdefault(nome, {})['level'] = nivel.upper()
+
 # Configurações CSRF
 CSRF_COOKIE_HTTPONLY = False  # Permite JavaScript acessar o cookie CSRF
 CSRF_COOKIE_SAMESITE = 'Lax'
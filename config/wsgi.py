@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Expiração automática da lixeira (só liga com LIXEIRA_EXPIRACAO_AUTOMATICA=True)
+from qualidade.lixeira import iniciar_agendador  # noqa: E402
+
+iniciar_agendador()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Ficha, RegistroParte, PerfilUsuario
+from .models import Ficha, RegistroParte, PerfilUsuario, TokenQuiosque
 
 
 # Removemos ParteCalcado do admin, agora é gerenciado pela interface da qualidade
@@ -41,4 +41,15 @@ class RegistroParteAdmin(admin.ModelAdmin):
 class PerfilUsuarioAdmin(admin.ModelAdmin):
     list_display = ['user', 'tipo']
     list_filter = ['tipo']
-    search_fields = ['user__username', 'user__first_name', 'user__last_name']
\ No newline at end of file
+    search_fields = ['user__username', 'user__first_name', 'user__last_name']
+
+@admin.register(TokenQuiosque)
+class TokenQuiosqueAdmin(admin.ModelAdmin):
+    list_display = ['nome', 'ativo', 'criado_em', 'criado_por']
+    list_filter = ['ativo']
+    readonly_fields = ['token', 'criado_em', 'criado_por']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.criado_por = request.user
+        super().save_model(request, obj, form, change)
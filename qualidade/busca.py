@@ -0,0 +1,185 @@
+# qualidade/busca.py
+"""
+Busca global (api/busca/) nos nomes de fichas, fichas de inventário,
+modelos, cores e operadores.
+
+- PostgreSQL: índices GIN de trigramas (pg_trgm) nas colunas de nome, só
+  das linhas fora da lixeira; o filtro é ILIKE e a ordem, a semelhança.
+- SQLite: uma tabela FTS5 com tokenizer trigram (qualidade_busca), mantida
+  por triggers nas tabelas de origem.
+- Termos com menos de 3 letras não formam trigrama: nesse caso a busca é
+  pelo começo do nome, sem contar o total.
+
+A estrutura é criada por instalar(), chamado no post_migrate (ver
+qualidade/signals.py) e não numa migration: no SQLite, alterar uma coluna
+recria a tabela e apaga os triggers, então a cada migrate eles são
+conferidos e o índice é refeito se algum estava faltando.
+"""
+from django.db import DatabaseError, connection
+from django.db.models import Count, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+
+from .models import Cor, Ficha, FichaInventario, ModeloCalcado, NomeOperador
+
+# tipo -> (model, campo do nome, código no rowid da tabela FTS5)
+FONTES = {
+    'ficha': (Ficha, 'nome_ficha', 1),
+    'ficha_inventario': (FichaInventario, 'nome_ficha', 2),
+    'modelo': (ModeloCalcado, 'nome', 3),
+    'cor': (Cor, 'nome', 4),
+    'operador': (NomeOperador, 'nome', 5),
+}
+
+TABELA_FTS = 'qualidade_busca'
+# rowid = id * FATOR + código do tipo: o trigger acha a linha pela chave primária
+FATOR = 8
+MIN_TRIGRAMA = 3
+
+
+def _palavras(termo):
+    return [palavra for palavra in termo.split() if len(palavra) >= MIN_TRIGRAMA]
+
+
+# ---------- Estrutura ----------
+
+def _sql_triggers_sqlite(tabela, campo, codigo):
+    chave = f'{FATOR} * {{0}}.id + {codigo}'
+    return {
+        f'{tabela}_busca_ai': (
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_busca_ai AFTER INSERT ON {tabela} BEGIN '
+            f'INSERT INTO {TABELA_FTS}(rowid, texto, excluido) VALUES ({chave.format("new")}, new.{campo}, new.excluido); END'
+        ),
+        f'{tabela}_busca_au': (
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_busca_au AFTER UPDATE OF {campo}, excluido ON {tabela} BEGIN '
+            f'UPDATE {TABELA_FTS} SET texto = new.{campo}, excluido = new.excluido WHERE rowid = {chave.format("old")}; END'
+        ),
+        f'{tabela}_busca_ad': (
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_busca_ad AFTER DELETE ON {tabela} BEGIN '
+            f'DELETE FROM {TABELA_FTS} WHERE rowid = {chave.format("old")}; END'
+        ),
+    }
+
+
+def _instalar_sqlite(conexao):
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existentes = {nome for (nome,) in cursor.fetchall()}
+        refazer = TABELA_FTS not in existentes
+        if refazer:
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {TABELA_FTS} USING fts5("
+                    f"texto, excluido UNINDEXED, tokenize='trigram')"
+                )
+            except DatabaseError:
+                # SQLite sem FTS5/trigram (anterior à 3.34): fica a busca por LIKE
+                return
+
+        for model, campo, codigo in FONTES.values():
+            for nome, sql in _sql_triggers_sqlite(model._meta.db_table, campo, codigo).items():
+                if nome not in existentes:
+                    refazer = True
+                    cursor.execute(sql)
+
+        if refazer:
+            cursor.execute(f'DELETE FROM {TABELA_FTS}')
+            for model, campo, codigo in FONTES.values():
+                cursor.execute(
+                    f'INSERT INTO {TABELA_FTS}(rowid, texto, excluido) '
+                    f'SELECT {FATOR} * id + {codigo}, {campo}, excluido FROM {model._meta.db_table}'
+                )
+
+
+def _instalar_postgresql(conexao):
+    with conexao.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for model, campo, _ in FONTES.values():
+            tabela = model._meta.db_table
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {tabela}_busca_trgm ON {tabela} '
+                f'USING gin ({campo} gin_trgm_ops) WHERE NOT excluido'
+            )
+
+
+def instalar(conexao=connection):
+    """Cria (ou repara) os índices da busca no banco da conexão"""
+    if conexao.vendor == 'sqlite':
+        _instalar_sqlite(conexao)
+    elif conexao.vendor == 'postgresql':
+        _instalar_postgresql(conexao)
+
+
+_fts_instalado = False
+
+
+def _fts_disponivel():
+    global _fts_instalado
+    if not _fts_instalado:
+        _fts_instalado = TABELA_FTS in connection.introspection.table_names()
+    return _fts_instalado
+
+
+# ---------- Consulta ----------
+
+def _com_fts(queryset, tipo, termo):
+    """Filtra o queryset pelas linhas que casam na tabela FTS5.
+
+    O MATCH entra como subconsulta do próprio queryset de permissão, então
+    a ordem e o limite valem sobre o que o usuário pode ver (um operador
+    acha as fichas do seu setor mesmo com milhares de outras casando).
+    """
+    consulta = ' AND '.join('"{}"'.format(palavra.replace('"', '""')) for palavra in _palavras(termo))
+    ids = RawSQL(
+        f'SELECT rowid / {FATOR} FROM {TABELA_FTS} '
+        f'WHERE {TABELA_FTS} MATCH %s AND excluido = 0 AND rowid %% {FATOR} = %s',
+        [consulta, FONTES[tipo][2]],
+    )
+    return queryset.filter(id__in=ids)
+
+
+def _buscar_tipo(tipo, queryset, termo, fts, limite):
+    """(total, objetos) de um tipo, já filtrado pelo queryset de permissão"""
+    campo = FONTES[tipo][1]
+
+    if not _palavras(termo):
+        # Termo curto: começo do nome, os mais novos primeiro (varre pela
+        # chave primária e para no limite, em vez de contar e ordenar tudo)
+        encontrados = list(queryset.filter(**{f'{campo}__istartswith': termo}).order_by('-id')[:limite])
+        return len(encontrados), encontrados
+
+    if fts:
+        # Em nomes curtos o bm25 ordena praticamente pelo tamanho e custa bem
+        # mais em termos comuns; a ordem é pelo nome mais curto (o mais
+        # próximo do termo). O total vem na mesma consulta.
+        encontrados = list(
+            _com_fts(queryset, tipo, termo)
+            .annotate(total_busca=Window(Count('id')))
+            .order_by(Length(campo), campo)[:limite]
+        )
+        return (encontrados[0].total_busca if encontrados else 0), encontrados
+
+    encontrados = queryset
+    for palavra in _palavras(termo):
+        encontrados = encontrados.filter(**{f'{campo}__icontains': palavra})
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        encontrados = encontrados.annotate(semelhanca=TrigramSimilarity(campo, termo)).order_by('-semelhanca', campo)
+    else:
+        encontrados = encontrados.order_by(campo)
+    return encontrados.count(), list(encontrados[:limite])
+
+
+def buscar(termo, querysets, limite=8):
+    """Busca ``termo`` em cada tipo de ``querysets`` ({tipo: queryset visível
+    para o usuário}). Retorna {tipo: (total, [objetos na ordem de relevância])}.
+
+    Com termo curto o total conta só o que foi listado.
+    """
+    termo = termo.strip()
+    fts = connection.vendor == 'sqlite' and bool(_palavras(termo)) and _fts_disponivel()
+
+    return {
+        tipo: _buscar_tipo(tipo, queryset, termo, fts, limite)
+        for tipo, queryset in querysets.items()
+    }
@@ -0,0 +1,38 @@
+# qualidade/catalogo.py
+"""
+Versão do catálogo (modelos, cores, tamanhos e partes).
+
+Os blocos de template que só dependem do catálogo (selects de modelo, grades
+de tamanho, cartões de gerenciar_modelos) ficam no cache de fragmentos com a
+versão na chave: {% versao_catalogo as versao %}{% cache 86400 nome versao %}.
+Qualquer alteração no catálogo troca a versão (receivers em
+qualidade/signals.py) e os fragmentos antigos deixam de ser lidos. A versão
+também entra no ETag das fichas e das APIs de catálogo (qualidade/condicional.py).
+
+A versão é um contador no banco (VersaoCatalogo), não uma chave do cache:
+com o cache local de cada processo, uma troca feita num worker não chegaria
+aos outros. Incrementado dentro da transação da alteração, ele volta junto
+se ela for desfeita.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import VersaoCatalogo
+
+
+def versao():
+    """Versão atual (texto curto, muda a cada alteração do catálogo)"""
+    valor = VersaoCatalogo.objects.filter(pk=1).values_list('versao', flat=True).first()
+    return str(valor or 0)
+
+
+def invalidar():
+    """Troca a versão, na mesma transação da alteração"""
+    if VersaoCatalogo.objects.filter(pk=1).update(versao=F('versao') + 1):
+        return
+    try:
+        with transaction.atomic():
+            VersaoCatalogo.objects.create(pk=1, versao=1)
+    except IntegrityError:
+        # Outro processo criou a linha ao mesmo tempo
+        VersaoCatalogo.objects.filter(pk=1).update(versao=F('versao') + 1)
@@ -0,0 +1,187 @@
+# qualidade/compressao.py
+"""
+Compressão das respostas das views (HTML, JSON, CSV) em brotli ou gzip,
+conforme o Accept-Encoding do navegador.
+
+- Só comprime os tipos de COMPRESSAO_TIPOS e, fora do streaming, respostas
+  com pelo menos COMPRESSAO_TAMANHO_MINIMO bytes (e só se ficar menor).
+- Respostas em streaming (exportações CSV) são comprimidas pedaço a pedaço,
+  sem juntar o arquivo na memória.
+- Os arquivos estáticos não passam por aqui: o WhiteNoise já serve as
+  versões .br/.gz geradas no collectstatic.
+
+BREACH: o Django já mascara o token CSRF a cada resposta e o gzip recebe um
+preenchimento aleatório (como no GZipMiddleware). Com COMPRESSAO_SEM_CSRF,
+as respostas que renderizaram um token CSRF não são comprimidas. Para saber
+disso o middleware fica depois do CsrfViewMiddleware na lista (ver
+config/settings.py): a resposta passa por ele antes de o CSRF gravar o cookie
+e limpar a marca CSRF_COOKIE_NEEDS_UPDATE.
+"""
+import zlib
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # sem o pacote Brotli, só gzip
+    brotli = None
+
+# Preenchimento aleatório do gzip contra BREACH (mesmo valor do GZipMiddleware)
+MAX_BYTES_ALEATORIOS = 100
+# No streaming, o compressor descarrega o que tem a cada tanto de entrada: o
+# navegador recebe o arquivo aos poucos sem que cada linha do CSV vire um bloco
+BYTES_POR_DESCARGA = 16 * 1024
+
+
+def _codificacoes_aceitas(request):
+    """Codificações do Accept-Encoding, sem as marcadas com q=0"""
+    aceitas = set()
+    for parte in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        nome, _, parametros = parte.partition(';')
+        chave, _, valor = parametros.strip().partition('=')
+        if chave.strip() == 'q':
+            try:
+                if float(valor) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if nome.strip():
+            aceitas.add(nome.strip().lower())
+    return aceitas
+
+
+def _escolher_codificacao(request):
+    aceitas = _codificacoes_aceitas(request)
+    if brotli is not None and 'br' in aceitas:
+        return 'br'
+    if 'gzip' in aceitas:
+        return 'gzip'
+    return None
+
+
+def _comprimivel(request, response):
+    if response.has_header('Content-Encoding'):
+        return False
+    tipo = response.get('Content-Type', '').split(';')[0].strip().lower()
+    if tipo not in settings.COMPRESSAO_TIPOS:
+        return False
+    if not response.streaming and len(response.content) < settings.COMPRESSAO_TAMANHO_MINIMO:
+        return False
+    if 'no-transform' in response.get('Cache-Control', ''):
+        return False
+    if settings.COMPRESSAO_SEM_CSRF and request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return False
+    return True
+
+
+# ---------- Brotli ----------
+
+def _brotli(conteudo):
+    return brotli.compress(conteudo, quality=settings.COMPRESSAO_NIVEL_BROTLI)
+
+
+def _sequencia_brotli(sequencia):
+    compressor = brotli.Compressor(quality=settings.COMPRESSAO_NIVEL_BROTLI)
+    pendente = 0
+    for pedaco in sequencia:
+        saida = compressor.process(pedaco)
+        pendente += len(pedaco)
+        if pendente >= BYTES_POR_DESCARGA:
+            saida += compressor.flush()
+            pendente = 0
+        if saida:
+            yield saida
+    yield compressor.finish()
+
+
+async def _sequencia_brotli_async(sequencia):
+    compressor = brotli.Compressor(quality=settings.COMPRESSAO_NIVEL_BROTLI)
+    pendente = 0
+    async for pedaco in sequencia:
+        saida = compressor.process(pedaco)
+        pendente += len(pedaco)
+        if pendente >= BYTES_POR_DESCARGA:
+            saida += compressor.flush()
+            pendente = 0
+        if saida:
+            yield saida
+    yield compressor.finish()
+
+
+# ---------- Gzip ----------
+
+def _gzip(conteudo):
+    return compress_string(conteudo, max_random_bytes=MAX_BYTES_ALEATORIOS)
+
+
+async def _sequencia_gzip_async(sequencia):
+    # Um compressor só para o fluxo inteiro (o GZipMiddleware do Django
+    # comprime cada pedaço como um gzip separado no modo assíncrono)
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    pendente = 0
+    async for pedaco in sequencia:
+        saida = compressor.compress(pedaco)
+        pendente += len(pedaco)
+        if pendente >= BYTES_POR_DESCARGA:
+            saida += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pendente = 0
+        if saida:
+            yield saida
+    yield compressor.flush()
+
+
+def comprimir(request, response):
+    """Comprime ``response`` no lugar, se o navegador aceitar e valer a pena"""
+    if not _comprimivel(request, response):
+        return response
+
+    # A resposta muda com o Accept-Encoding, mesmo quando sai sem compressão
+    patch_vary_headers(response, ('Accept-Encoding',))
+    codificacao = _escolher_codificacao(request)
+    if codificacao is None:
+        return response
+
+    if response.streaming:
+        conteudo = response.streaming_content
+        if codificacao == 'br':
+            response.streaming_content = (
+                _sequencia_brotli_async(conteudo) if response.is_async else _sequencia_brotli(conteudo)
+            )
+        else:
+            response.streaming_content = (
+                _sequencia_gzip_async(conteudo) if response.is_async
+                else compress_sequence(conteudo, max_random_bytes=MAX_BYTES_ALEATORIOS)
+            )
+        # O tamanho final só é conhecido no fim do streaming
+        del response.headers['Content-Length']
+    else:
+        comprimido = _brotli(response.content) if codificacao == 'br' else _gzip(response.content)
+        if len(comprimido) >= len(response.content):
+            return response
+        response.content = comprimido
+        response.headers['Content-Length'] = str(len(comprimido))
+
+    # ETag forte vira fraca: o corpo mudou, mas a representação é a mesma
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+    response.headers['Content-Encoding'] = codificacao
+    return response
+
+
+@sync_and_async_middleware
+def compressao_middleware(get_response):
+    """Comprime as respostas das views (ver COMPRESSAO_* em config/settings.py)"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            return comprimir(request, response) if settings.COMPRESSAO_ATIVA else response
+    else:
+        def middleware(request):
+            response = get_response(request)
+            return comprimir(request, response) if settings.COMPRESSAO_ATIVA else response
+    return middleware
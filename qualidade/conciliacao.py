@@ -0,0 +1,134 @@
+# qualidade/conciliacao.py
+"""
+Conciliação do inventário: refaz os saldos de cada item a partir do
+LogMovimentacaoV2 e compara com o ItemInventario (comando reconcile_inventario).
+
+A leitura é feita em lotes de fichas, com os logs em streaming, para não
+carregar o histórico inteiro na memória. O modo rápido só compara somas de
+conferência (checksums) por ficha, calculadas no banco.
+"""
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import FichaInventario, ItemInventario, LogMovimentacaoV2
+
+TAMANHO_LOTE = 200
+
+
+def _lotes_de_fichas(ficha_ids=None, tamanho_lote=TAMANHO_LOTE):
+    fichas = FichaInventario.objects.order_by('id')
+    if ficha_ids:
+        fichas = fichas.filter(id__in=ficha_ids)
+    ids = list(fichas.values_list('id', flat=True))
+    for inicio in range(0, len(ids), tamanho_lote):
+        yield ids[inicio:inicio + tamanho_lote]
+
+
+def _replay(lote):
+    """{(ficha_id, tamanho_id): [pd, pe, quebras]} refeito pelos logs do lote.
+
+    Quebra é um log cujo saldo de antes não bate com o saldo de depois do
+    log anterior do mesmo item: algo mudou o item sem deixar movimentação.
+    """
+    saldos = {}
+    ultimo_depois = {}
+    logs = (
+        LogMovimentacaoV2.objects.filter(ficha_id__in=lote, tamanho__isnull=False)
+        .order_by('ficha_id', 'tamanho_id', 'id')
+        .values_list(
+            'ficha_id', 'tamanho_id', 'acao', 'lado', 'quantidade_movimentada',
+            'saldo_pd_antes', 'saldo_pe_antes', 'saldo_pd_depois', 'saldo_pe_depois',
+        )
+    )
+    for ficha_id, tamanho_id, acao, lado, quantidade, pd_antes, pe_antes, pd_depois, pe_depois in logs.iterator(chunk_size=2000):
+        chave = (ficha_id, tamanho_id)
+        saldo = saldos.setdefault(chave, [0, 0, 0])
+
+        anterior = ultimo_depois.get(chave)
+        if anterior is not None and pd_antes is not None and anterior != (pd_antes, pe_antes):
+            saldo[2] += 1
+        ultimo_depois[chave] = (pd_depois, pe_depois) if pd_depois is not None else None
+
+        delta = quantidade if acao == 'adicionar' else -quantidade
+        saldo[0 if lado == 'PD' else 1] += delta
+    return saldos
+
+
+def divergencias(ficha_ids=None, tamanho_lote=TAMANHO_LOTE):
+    """Gera um dict por item divergente (ou com quebra no histórico):
+    ficha_id, tamanho_id, item (ou None), esperado (pd, pe), atual (pd, pe), quebras.
+
+    Também conta o que está nos logs mas não existe mais como item (apagado
+    sem log). O último valor gerado é o resumo: {'fichas': n, 'itens': n}.
+    """
+    fichas = itens_conferidos = 0
+    for lote in _lotes_de_fichas(ficha_ids, tamanho_lote):
+        saldos = _replay(lote)
+        itens = ItemInventario.objects.filter(ficha_id__in=lote).select_related('modelo', 'cor', 'tamanho')
+
+        for item in itens.iterator(chunk_size=2000):
+            pd, pe, quebras = saldos.pop((item.ficha_id, item.tamanho_id), (0, 0, 0))
+            atual = (item.quantidade_pe_direito, item.quantidade_pe_esquerdo)
+            itens_conferidos += 1
+            if (pd, pe) != atual or quebras:
+                yield {
+                    'ficha_id': item.ficha_id, 'tamanho_id': item.tamanho_id, 'item': item,
+                    'esperado': (pd, pe), 'atual': atual, 'quebras': quebras,
+                }
+
+        # Sobrou nos logs: item que não existe mais mas com saldo diferente de zero
+        for (ficha_id, tamanho_id), (pd, pe, quebras) in saldos.items():
+            if pd or pe or quebras:
+                yield {
+                    'ficha_id': ficha_id, 'tamanho_id': tamanho_id, 'item': None,
+                    'esperado': (pd, pe), 'atual': (0, 0), 'quebras': quebras,
+                }
+        fichas += len(lote)
+
+    yield {'fichas': fichas, 'itens': itens_conferidos}
+
+
+def _checksums(queryset, pd, pe):
+    """Somas por ficha: total de cada lado e total ponderado pelo tamanho (pega
+    quantidade que "mudou de item" dentro da mesma ficha)"""
+    linhas = (
+        queryset.values('ficha_id')
+        .annotate(
+            soma_pd=Sum(pd),
+            soma_pe=Sum(pe),
+            peso_pd=Sum(F('tamanho_id') * pd),
+            peso_pe=Sum(F('tamanho_id') * pe),
+        )
+        .order_by()
+    )
+    return {
+        linha['ficha_id']: (linha['soma_pd'] or 0, linha['soma_pe'] or 0, linha['peso_pd'] or 0, linha['peso_pe'] or 0)
+        for linha in linhas
+    }
+
+
+def _delta_lado(lado):
+    return Case(
+        When(lado=lado, acao='adicionar', then=F('quantidade_movimentada')),
+        When(lado=lado, then=-F('quantidade_movimentada')),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def fichas_divergentes(ficha_ids=None, tamanho_lote=TAMANHO_LOTE):
+    """Modo rápido: ids das fichas cujos checksums dos itens e dos logs não batem.
+    Duas consultas agrupadas por lote, sem ler item a item."""
+    divergentes = []
+    for lote in _lotes_de_fichas(ficha_ids, tamanho_lote):
+        dos_itens = _checksums(
+            ItemInventario.objects.filter(ficha_id__in=lote),
+            F('quantidade_pe_direito'), F('quantidade_pe_esquerdo'),
+        )
+        dos_logs = _checksums(
+            LogMovimentacaoV2.objects.filter(ficha_id__in=lote, tamanho__isnull=False),
+            _delta_lado('PD'), _delta_lado('PE'),
+        )
+        for ficha_id in lote:
+            if dos_itens.get(ficha_id, (0, 0, 0, 0)) != dos_logs.get(ficha_id, (0, 0, 0, 0)):
+                divergentes.append(ficha_id)
+    return divergentes
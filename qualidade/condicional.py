@@ -0,0 +1,137 @@
+# qualidade/condicional.py
+"""
+GET condicional (ETag / Last-Modified) das telas de ficha e das APIs do
+catálogo: o navegador reenvia o validador e, se nada mudou, a view responde
+304 sem consultar os itens nem renderizar o template.
+
+- Fichas: uma consulta (atualizada_em e exclusão da ficha, maior
+  atualizado_em dos itens) mais a versão do catálogo. Salvar ou apagar um
+  item/registro toca o atualizada_em da ficha (receivers em
+  qualidade/signals.py e Ficha.tocar nos bulk_update).
+- A página também depende de quem vê (menu, nome, token CSRF) e dos
+  arquivos estáticos do deploy: usuário, perfil, cookie CSRF e o hash do
+  manifest do collectstatic entram no ETag. Com mensagens pendentes a tela
+  é renderizada, para não deixá-las para o próximo pedido.
+- APIs get_cores/get_tamanhos: só a versão do catálogo. Vale também para
+  as versões assíncronas (views/api_async.py): lá os validadores são
+  calculados numa thread antes de entrar na view.
+
+As respostas saem com Cache-Control "private, no-cache": o navegador guarda,
+mas sempre confere com o servidor antes de reaproveitar.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db.models import Max
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from . import catalogo
+from .models import Ficha, FichaInventario
+
+_NAO_CALCULADO = object()
+
+
+def _resumo(*partes):
+    return hashlib.sha1(repr(partes).encode()).hexdigest()[:24]
+
+
+def _estado(request, calcular):
+    """(excluido, datas...) da ficha, calculado uma vez por pedido (ETag e
+    Last-Modified usam o mesmo); None quando a tela deve ser sempre renderizada"""
+    estado = getattr(request, '_estado_condicional', _NAO_CALCULADO)
+    if estado is _NAO_CALCULADO:
+        estado = None if len(messages.get_messages(request)) else calcular()
+        request._estado_condicional = estado
+    return estado
+
+
+def _estado_ficha(request, ficha_id):
+    # Os registros de parte não têm data própria: cada alteração toca a ficha
+    return _estado(request, lambda: (
+        Ficha.objects.filter(pk=ficha_id)
+        .values_list('excluido', 'atualizada_em')
+        .first()
+    ))
+
+
+def _estado_ficha_inventario(request, ficha_id):
+    return _estado(request, lambda: (
+        FichaInventario.objects.filter(pk=ficha_id)
+        .annotate(ultimo_item=Max('itens__atualizado_em'))
+        .values_list('excluido', 'atualizada_em', 'ultimo_item')
+        .first()
+    ))
+
+
+def _etag_pagina(request, estado):
+    if estado is None:
+        return None
+    return _resumo(
+        estado,
+        catalogo.versao(),
+        request.user.pk,
+        request.ctx.tipo,
+        request.ctx.grupos,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        getattr(staticfiles_storage, 'manifest_hash', ''),
+    )
+
+
+def _ultima_modificacao(estado):
+    if estado is None:
+        return None
+    return max(data for data in estado[1:] if data is not None)
+
+
+def _condicional(etag_func, last_modified_func=None):
+    def decorador(view):
+        if iscoroutinefunction(view):
+            return cache_control(private=True, no_cache=True)(
+                _condicional_async(view, etag_func, last_modified_func)
+            )
+        view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+        return cache_control(private=True, no_cache=True)(view)
+    return decorador
+
+
+def _condicional_async(view, etag_func, last_modified_func):
+    """condition() chama etag_func/last_modified_func sem await, e elas
+    consultam o banco: na view assíncrona elas rodam antes, numa thread, e
+    condition() só lê o resultado guardado no request"""
+    def validadores(request, *args, **kwargs):
+        return (
+            etag_func(request, *args, **kwargs),
+            last_modified_func(request, *args, **kwargs) if last_modified_func else None,
+        )
+
+    condicional = condition(
+        etag_func=lambda request, *args, **kwargs: request._validadores[0],
+        last_modified_func=lambda request, *args, **kwargs: request._validadores[1],
+    )(view)
+
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        request._validadores = await sync_to_async(validadores)(request, *args, **kwargs)
+        return await condicional(request, *args, **kwargs)
+    return inner
+
+
+ficha_condicional = _condicional(
+    lambda request, ficha_id: _etag_pagina(request, _estado_ficha(request, ficha_id)),
+    lambda request, ficha_id: _ultima_modificacao(_estado_ficha(request, ficha_id)),
+)
+
+ficha_inventario_condicional = _condicional(
+    lambda request, ficha_id: _etag_pagina(request, _estado_ficha_inventario(request, ficha_id)),
+    lambda request, ficha_id: _ultima_modificacao(_estado_ficha_inventario(request, ficha_id)),
+)
+
+# A URL já leva modelo/cor; a resposta só muda com o catálogo
+catalogo_condicional = _condicional(
+    lambda request, *args, **kwargs: _resumo(catalogo.versao()),
+)
@@ -0,0 +1,306 @@
+# qualidade/estoque.py
+"""
+Posição de estoque da Injetora: soma dos ItemInventario de todas as fichas
+de inventário fora da lixeira, por modelo/cor/tamanho.
+
+A posição inteira sai de uma única consulta agrupada. Com CACHE_COMPARTILHADO
+ela fica no cache até a próxima alteração de item, ficha ou cadastro
+(receivers em qualidade/signals.py); no cache local de cada processo a
+invalidação não alcançaria os outros workers, então a consulta é refeita a
+cada pedido. Filtros e facetas são aplicados sobre a posição já lida, sem
+voltar ao banco.
+
+Também refaz o estoque de uma ficha numa data (itens_em): parte do checkpoint
+mais próximo (CheckpointInventario) e aplica só as movimentações do
+LogMovimentacaoV2 entre o checkpoint e a data, e compara duas fichas item a
+item (comparar_fichas) numa consulta agrupada só.
+"""
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import (
+    CheckpointInventario, ItemInventario, LogMovimentacaoV2, SaldoCheckpoint, TamanhoModelo,
+)
+
+CHAVE_CACHE = 'estoque_posicao'
+# Segurança caso alguma alteração escape dos receivers
+CACHE_SEGUNDOS = 10 * 60
+
+
+def _consultar():
+    linhas = (
+        ItemInventario.objects.filter(ficha__excluido=False)
+        .values('modelo_id', 'modelo__nome', 'cor_id', 'cor__nome', 'tamanho_id', 'tamanho__numero')
+        .annotate(
+            pe_direito=Sum('quantidade_pe_direito'),
+            pe_esquerdo=Sum('quantidade_pe_esquerdo'),
+            fichas=Count('ficha_id', distinct=True),
+        )
+        .order_by('modelo__nome', 'cor__nome', 'tamanho__numero')
+    )
+
+    posicao = []
+    for linha in linhas:
+        pe_direito, pe_esquerdo = linha['pe_direito'], linha['pe_esquerdo']
+        if not pe_direito and not pe_esquerdo:
+            continue
+        # Um pé esquerdo numa ficha forma par com um direito de outra ficha
+        if pe_direito > pe_esquerdo:
+            lado_sobrando = 'Direito'
+        elif pe_esquerdo > pe_direito:
+            lado_sobrando = 'Esquerdo'
+        else:
+            lado_sobrando = None
+        posicao.append({
+            'modelo_id': linha['modelo_id'],
+            'modelo': linha['modelo__nome'],
+            'cor_id': linha['cor_id'],
+            'cor': linha['cor__nome'],
+            'tamanho_id': linha['tamanho_id'],
+            'numero': linha['tamanho__numero'],
+            'pe_direito': pe_direito,
+            'pe_esquerdo': pe_esquerdo,
+            'pares': min(pe_direito, pe_esquerdo),
+            'avulsos': abs(pe_direito - pe_esquerdo),
+            'lado_sobrando': lado_sobrando,
+            'fichas': linha['fichas'],
+        })
+    return posicao
+
+
+def posicao_estoque():
+    """Lista de linhas (dicts) por modelo/cor/tamanho, ordenada por nome"""
+    if not settings.CACHE_COMPARTILHADO:
+        return _consultar()
+    posicao = cache.get(CHAVE_CACHE)
+    if posicao is None:
+        posicao = _consultar()
+        cache.set(CHAVE_CACHE, posicao, CACHE_SEGUNDOS)
+    return posicao
+
+
+def invalidar():
+    """Descarta a posição guardada (depois do commit da alteração)"""
+    transaction.on_commit(lambda: cache.delete(CHAVE_CACHE))
+
+
+def filtrar(posicao, modelo_id=None, cor_id=None, numero=None):
+    return [
+        linha for linha in posicao
+        if (modelo_id is None or linha['modelo_id'] == modelo_id)
+        and (cor_id is None or linha['cor_id'] == cor_id)
+        and (numero is None or linha['numero'] == numero)
+    ]
+
+
+def facetas(posicao, modelo_id=None, cor_id=None):
+    """Opções dos filtros, como nas fichas: as cores dependem do modelo
+    escolhido e os números do modelo e da cor"""
+    modelos, cores, numeros = {}, {}, set()
+    for linha in posicao:
+        modelos[linha['modelo_id']] = linha['modelo']
+        if modelo_id is not None and linha['modelo_id'] != modelo_id:
+            continue
+        cores[linha['cor_id']] = linha['cor']
+        if cor_id is not None and linha['cor_id'] != cor_id:
+            continue
+        numeros.add(linha['numero'])
+
+    return {
+        'modelos': [{'id': i, 'nome': nome} for i, nome in sorted(modelos.items(), key=lambda m: m[1])],
+        'cores': [{'id': i, 'nome': nome} for i, nome in sorted(cores.items(), key=lambda c: c[1])],
+        'numeros': sorted(numeros),
+    }
+
+
+def totais(linhas):
+    return {
+        'pe_direito': sum(l['pe_direito'] for l in linhas),
+        'pe_esquerdo': sum(l['pe_esquerdo'] for l in linhas),
+        'pares': sum(l['pares'] for l in linhas),
+        'avulsos': sum(l['avulsos'] for l in linhas),
+    }
+
+
+# ---------- Estoque numa data ----------
+
+def ler_momento(valor):
+    """Data (AAAA-MM-DD, vale o fim do dia) ou data e hora (AAAA-MM-DDTHH:MM)
+    do parâmetro as_of. Retorna None se vier vazio ou inválido."""
+    if not valor:
+        return None
+    try:
+        if 'T' in valor:
+            momento = datetime.strptime(valor, '%Y-%m-%dT%H:%M')
+        else:
+            momento = datetime.combine(datetime.strptime(valor, '%Y-%m-%d').date(), time.max)
+    except ValueError:
+        return None
+    return timezone.make_aware(momento)
+
+
+def _somar_movimentacoes(saldos, ficha, depois, ate, sinal):
+    """Aplica em ``saldos`` ({tamanho_id: [pd, pe]}) as movimentações da ficha
+    feitas em (depois, ate], somadas por tamanho e lado no banco"""
+    logs = LogMovimentacaoV2.objects.filter(ficha=ficha, tamanho__isnull=False)
+    if depois is not None:
+        logs = logs.filter(criado_em__gt=depois)
+    if ate is not None:
+        logs = logs.filter(criado_em__lte=ate)
+
+    linhas = (
+        logs.values('tamanho_id', 'lado')
+        .annotate(delta=Sum(Case(
+            When(acao='adicionar', then=F('quantidade_movimentada')),
+            default=-F('quantidade_movimentada'),
+        )))
+        .order_by()
+    )
+    for linha in linhas:
+        saldo = saldos.setdefault(linha['tamanho_id'], [0, 0])
+        saldo[0 if linha['lado'] == 'PD' else 1] += sinal * linha['delta']
+
+
+def saldos_em(ficha, momento):
+    """{tamanho_id: (pé direito, pé esquerdo)} da ficha em ``momento``.
+
+    Com um checkpoint até o momento, soma as movimentações feitas depois dele;
+    sem nenhum, parte do checkpoint seguinte (ou dos itens de hoje) e desfaz
+    as movimentações feitas depois do momento.
+    """
+    anterior = CheckpointInventario.objects.filter(momento__lte=momento).order_by('-momento').first()
+    if anterior:
+        saldos = {
+            tamanho_id: [pd, pe]
+            for tamanho_id, pd, pe in SaldoCheckpoint.objects.filter(checkpoint=anterior, ficha=ficha)
+            .values_list('tamanho_id', 'pe_direito', 'pe_esquerdo')
+        }
+        _somar_movimentacoes(saldos, ficha, anterior.momento, momento, 1)
+    else:
+        seguinte = CheckpointInventario.objects.filter(momento__gt=momento).order_by('momento').first()
+        if seguinte:
+            atuais = SaldoCheckpoint.objects.filter(checkpoint=seguinte, ficha=ficha).values_list(
+                'tamanho_id', 'pe_direito', 'pe_esquerdo'
+            )
+        else:
+            atuais = ficha.itens.values_list('tamanho_id', 'quantidade_pe_direito', 'quantidade_pe_esquerdo')
+        saldos = {tamanho_id: [pd, pe] for tamanho_id, pd, pe in atuais}
+        _somar_movimentacoes(saldos, ficha, momento, seguinte.momento if seguinte else None, -1)
+
+    return {tamanho_id: (pd, pe) for tamanho_id, (pd, pe) in saldos.items() if pd or pe}
+
+
+def itens_em(ficha, momento):
+    """Itens da ficha como estavam em ``momento``, como ItemInventario não
+    salvos (mesmos campos e propriedades usados nas telas e no PDF)"""
+    saldos = saldos_em(ficha, momento)
+    tamanhos = TamanhoModelo.objects.filter(id__in=saldos).select_related('modelo', 'cor')
+    itens = [
+        ItemInventario(
+            ficha=ficha, modelo=tamanho.modelo, cor=tamanho.cor, tamanho=tamanho,
+            quantidade_pe_direito=saldos[tamanho.id][0],
+            quantidade_pe_esquerdo=saldos[tamanho.id][1],
+        )
+        for tamanho in tamanhos
+    ]
+    itens.sort(key=lambda item: (item.modelo.nome, item.cor.nome, item.tamanho.numero))
+    return itens
+
+
+def criar_checkpoint():
+    """Grava os saldos atuais de todos os itens (inclusive de fichas na lixeira).
+    Retorna o CheckpointInventario criado."""
+    with transaction.atomic():
+        checkpoint = CheckpointInventario.objects.create(momento=timezone.now())
+        saldos = [
+            SaldoCheckpoint(checkpoint=checkpoint, ficha_id=ficha_id, tamanho_id=tamanho_id,
+                            pe_direito=pd, pe_esquerdo=pe)
+            for ficha_id, tamanho_id, pd, pe in ItemInventario.objects.exclude(
+                quantidade_pe_direito=0, quantidade_pe_esquerdo=0
+            ).values_list('ficha_id', 'tamanho_id', 'quantidade_pe_direito', 'quantidade_pe_esquerdo')
+            .iterator(chunk_size=2000)
+        ]
+        SaldoCheckpoint.objects.bulk_create(saldos, batch_size=1000)
+        checkpoint.itens = len(saldos)
+        checkpoint.save(update_fields=['itens'])
+    return checkpoint
+
+
+# ---------- Comparação entre fichas ----------
+
+def _soma_da_ficha(ficha_id, campo):
+    return Sum(Case(When(ficha_id=ficha_id, then=F(campo)), default=Value(0)))
+
+
+def comparar_fichas(ficha_a, ficha_b, modelo_id=None, cor_id=None, numero=None, so_diferencas=False):
+    """Itens das duas fichas lado a lado por modelo/cor/tamanho, numa consulta só.
+
+    Cada linha (dict) traz pé direito/esquerdo e pares de cada ficha e as
+    diferenças (ficha B menos ficha A). Item que só existe numa das fichas
+    aparece com zero na outra. É um queryset: pagina e itera no banco.
+    """
+    itens = ItemInventario.objects.filter(ficha_id__in=[ficha_a, ficha_b])
+    if modelo_id is not None:
+        itens = itens.filter(modelo_id=modelo_id)
+    if cor_id is not None:
+        itens = itens.filter(cor_id=cor_id)
+    if numero is not None:
+        itens = itens.filter(tamanho__numero=numero)
+
+    linhas = (
+        itens.values('modelo_id', 'modelo__nome', 'cor_id', 'cor__nome', 'tamanho_id', 'tamanho__numero')
+        .annotate(
+            pd_a=_soma_da_ficha(ficha_a, 'quantidade_pe_direito'),
+            pe_a=_soma_da_ficha(ficha_a, 'quantidade_pe_esquerdo'),
+            pd_b=_soma_da_ficha(ficha_b, 'quantidade_pe_direito'),
+            pe_b=_soma_da_ficha(ficha_b, 'quantidade_pe_esquerdo'),
+        )
+        .annotate(
+            pares_a=Least('pd_a', 'pe_a'),
+            pares_b=Least('pd_b', 'pe_b'),
+        )
+        .annotate(
+            delta_pd=F('pd_b') - F('pd_a'),
+            delta_pe=F('pe_b') - F('pe_a'),
+            delta_pares=F('pares_b') - F('pares_a'),
+        )
+        .order_by('modelo__nome', 'cor__nome', 'tamanho__numero')
+    )
+    if so_diferencas:
+        linhas = linhas.exclude(delta_pd=0, delta_pe=0)
+    return linhas
+
+
+def totais_comparacao(linhas):
+    """Totais de cada ficha e das diferenças sobre as linhas filtradas"""
+    campos = ('pd_a', 'pe_a', 'pares_a', 'pd_b', 'pe_b', 'pares_b')
+    # O nome do total não pode repetir o da anotação que ele soma
+    somas = linhas.order_by().aggregate(**{f'total_{campo}': Sum(campo) for campo in campos})
+    totais = {campo: somas[f'total_{campo}'] or 0 for campo in campos}
+    for lado in ('pd', 'pe', 'pares'):
+        totais[f'delta_{lado}'] = totais[f'{lado}_b'] - totais[f'{lado}_a']
+    return totais
+
+
+def facetas_comparacao(ficha_a, ficha_b, modelo_id=None, cor_id=None):
+    """Opções dos filtros sobre os itens das duas fichas (mesma lógica de facetas)"""
+    itens = ItemInventario.objects.filter(ficha_id__in=[ficha_a, ficha_b]).order_by()
+    modelos = itens.values_list('modelo_id', 'modelo__nome').distinct()
+    if modelo_id is not None:
+        itens = itens.filter(modelo_id=modelo_id)
+    cores = itens.values_list('cor_id', 'cor__nome').distinct()
+    if cor_id is not None:
+        itens = itens.filter(cor_id=cor_id)
+    numeros = itens.values_list('tamanho__numero', flat=True).distinct()
+
+    return {
+        'modelos': [{'id': i, 'nome': nome} for i, nome in sorted(modelos, key=lambda m: m[1])],
+        'cores': [{'id': i, 'nome': nome} for i, nome in sorted(cores, key=lambda c: c[1])],
+        'numeros': sorted(numeros),
+    }
@@ -0,0 +1,149 @@
+# qualidade/idempotencia.py
+"""
+Chaves de idempotência para as views que alteram dados.
+
+O cliente manda a chave no cabeçalho ``Idempotency-Key`` (fetch) ou no campo
+oculto ``idempotency_key`` (formulários, ver a tag ``chave_idempotencia``).
+A chave é gravada na mesma transação do efeito da view: um reenvio com a mesma
+chave espera a primeira requisição terminar e recebe a resposta guardada, então
+o lançamento acontece no máximo uma vez. A mesma chave em outra URL ou com
+outro corpo é recusada (422). Sem chave, a view roda normalmente.
+"""
+import hashlib
+import random
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import ChaveIdempotencia
+
+CABECALHO = 'HTTP_IDEMPOTENCY_KEY'
+CAMPO = 'idempotency_key'
+
+# Fração das requisições que aproveita para apagar chaves vencidas
+CHANCE_LIMPEZA = 0.01
+
+
+def _chave_da_requisicao(request):
+    chave = request.META.get(CABECALHO) or request.POST.get(CAMPO)
+    if chave:
+        return chave.strip()[:64]
+    return None
+
+
+def _assinatura(request):
+    """SHA-256 do corpo da requisição. Nos formulários vale o que foi enviado
+    (sem o token CSRF, que muda a cada página), não os bytes do multipart."""
+    if request.content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+        campos = sorted(
+            (nome, valor)
+            for nome, valores in request.POST.lists() if nome != 'csrfmiddlewaretoken'
+            for valor in valores
+        )
+        dados = repr(campos).encode()
+    else:
+        dados = request.body
+    return hashlib.sha256(dados).hexdigest()
+
+
+def _limite_expiracao():
+    return timezone.now() - timedelta(hours=settings.IDEMPOTENCIA_TTL_HORAS)
+
+
+def limpar_chaves_expiradas():
+    """Apaga as respostas guardadas que já passaram do prazo"""
+    return ChaveIdempotencia.objects.filter(criado_em__lt=_limite_expiracao()).delete()[0]
+
+
+def _resposta_guardada(registro):
+    """Reconstrói a resposta original a partir do que foi guardado"""
+    response = HttpResponse(
+        bytes(registro.conteudo or b''),
+        status=registro.status,
+        content_type=registro.content_type or None,
+    )
+    if registro.location:
+        response['Location'] = registro.location
+    response['Idempotent-Replay'] = 'true'
+    return response
+
+
+def _executar(view_func, request, chave, *args, **kwargs):
+    caminho = request.path[:255]
+    assinatura = _assinatura(request)
+
+    if random.random() < CHANCE_LIMPEZA:
+        limpar_chaves_expiradas()
+
+    # Chave vencida do mesmo usuário pode ser reaproveitada
+    ChaveIdempotencia.objects.filter(
+        usuario=request.user, chave=chave, criado_em__lt=_limite_expiracao()
+    ).delete()
+
+    repetida = False
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                registro = ChaveIdempotencia.objects.create(
+                    usuario=request.user, chave=chave, caminho=caminho, assinatura=assinatura
+                )
+        except IntegrityError:
+            repetida = True
+
+        if not repetida:
+            response = view_func(request, *args, **kwargs)
+
+            # Erro do servidor: desfaz tudo para a chave poder ser reenviada
+            if response.status_code >= 500 or getattr(response, 'streaming', False):
+                transaction.set_rollback(True)
+                return response
+
+            registro.status = response.status_code
+            registro.content_type = response.get('Content-Type', '')
+            registro.location = response.get('Location', '')[:255]
+            registro.conteudo = response.content
+            registro.save(update_fields=['status', 'content_type', 'location', 'conteudo'])
+            return response
+
+    # Reenvio: a primeira requisição já terminou (o insert acima esperou por ela)
+    registro = ChaveIdempotencia.objects.filter(usuario=request.user, chave=chave).first()
+    if registro is None or registro.status is None:
+        return JsonResponse({'error': 'Requisição em processamento, tente novamente'}, status=409)
+    # Chaves gravadas antes da assinatura existir só conferem a URL
+    if registro.caminho != caminho or (registro.assinatura and registro.assinatura != assinatura):
+        return JsonResponse({'error': 'Chave de idempotência já usada em outra operação'}, status=422)
+    return _resposta_guardada(registro)
+
+
+def idempotente(view_func):
+    """Decorator: aplica a chave de idempotência à view (síncrona ou assíncrona)"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async(request, *args, **kwargs):
+            if request.method != 'POST':
+                return await view_func(request, *args, **kwargs)
+            chave = _chave_da_requisicao(request)
+            user = await request.auser()
+            if not chave or not user.is_authenticated:
+                return await view_func(request, *args, **kwargs)
+            # O efeito e a chave precisam da mesma transação, então com chave a
+            # view assíncrona roda dentro do thread que abriu a transação
+            return await sync_to_async(_executar)(async_to_sync(view_func), request, chave, *args, **kwargs)
+
+        return _wrapped_async
+
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view_func(request, *args, **kwargs)
+        chave = _chave_da_requisicao(request)
+        if not chave or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+        return _executar(view_func, request, chave, *args, **kwargs)
+
+    return _wrapped
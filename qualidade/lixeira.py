@@ -0,0 +1,309 @@
+# qualidade/lixeira.py
+"""
+Operações em lote das lixeiras (restaurar / excluir permanentemente).
+
+Cada operação vira um UPDATE ou DELETE por conjunto dentro de uma transação,
+em vez de um get/save/delete por objeto. Exclusões permanentes muito grandes
+continuam em segundo plano, em blocos, para não prender a requisição.
+
+Também faz a expiração da lixeira: o que está excluído há mais de
+LIXEIRA_EXPIRACAO_DIAS é apagado em blocos (comando purge_lixeira ou o
+agendador interno, ver iniciar_agendador). Uma trava no banco
+(TravaTarefa) garante uma expiração por vez entre todos os processos.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .catalogo import invalidar as invalidar_catalogo
+from .models import (
+    Ficha, FichaInventario, ModeloCalcado, Cor, ParteCalcado, NomeOperador,
+    ItemInventario, RegistroParte, TravaTarefa,
+)
+
+logger = logging.getLogger(__name__)
+
+# Acima disso a exclusão permanente roda em segundo plano
+LIMITE_SINCRONO = 500
+# Quantos objetos cada transação da exclusão em segundo plano apaga
+TAMANHO_BLOCO = 500
+
+ACOES_LOTE = ('restaurar_lote', 'excluir_permanente_lote')
+
+# Lixeiras de cadastros que entram na versão do catálogo (qualidade/catalogo.py)
+MODELOS_CATALOGO = (ModeloCalcado, Cor, ParteCalcado)
+
+
+def ids_do_post(request, campo='ids'):
+    """Lista de ids (inteiros) marcados no formulário"""
+    ids = []
+    for valor in request.POST.getlist(campo):
+        try:
+            ids.append(int(valor))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def na_lixeira(model, request, campo='ids'):
+    """Queryset dos objetos marcados (ou de toda a lixeira, com todos=1)"""
+    queryset = model.objects.na_lixeira()
+    if request.POST.get('todos') == '1':
+        return queryset
+    return queryset.filter(id__in=ids_do_post(request, campo))
+
+
+def restaurar(queryset, depois=None):
+    """Tira da lixeira por conjunto, numa única transação.
+
+    ``depois(ids)`` é chamado para cada bloco restaurado (ex.: devolver a
+    produção ao resumo diário). Retorna quantos foram restaurados.
+    """
+    model = queryset.model
+    valores = {'excluido': False, 'excluido_em': None}
+    if any(f.name == 'excluido_por' for f in model._meta.fields):
+        valores['excluido_por'] = None
+
+    total = 0
+    with transaction.atomic():
+        ids = list(queryset.filter(excluido=True).values_list('id', flat=True))
+        for inicio in range(0, len(ids), TAMANHO_BLOCO):
+            bloco = ids[inicio:inicio + TAMANHO_BLOCO]
+            total += model.objects.filter(id__in=bloco, excluido=True).update(**valores)
+            if depois:
+                depois(bloco)
+    return total
+
+
+def _apagar(queryset):
+    """DELETE por conjunto (dentro da transação de quem chama). Apagar
+    cadastro troca a versão do catálogo uma vez, e não uma por linha num
+    receiver de post_delete, que impediria o Django de apagar em lote os
+    tamanhos que saem junto em cascata."""
+    resultado = queryset.delete()
+    if queryset.model in MODELOS_CATALOGO and resultado[0]:
+        invalidar_catalogo()
+    return resultado
+
+
+def _excluir_blocos(model, ids):
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        bloco = ids[inicio:inicio + TAMANHO_BLOCO]
+        with transaction.atomic():
+            _apagar(model.objects.filter(id__in=bloco, excluido=True))
+
+
+def _excluir_em_segundo_plano(model, ids):
+    inicio = time.monotonic()
+    try:
+        _excluir_blocos(model, ids)
+        logger.info('lixeira_excluida', extra={
+            'model': model.__name__,
+            'objetos': len(ids),
+            'segundos': round(time.monotonic() - inicio, 2),
+        })
+    except Exception:
+        logger.exception('lixeira_exclusao_falhou', extra={'model': model.__name__, 'objetos': len(ids)})
+    finally:
+        # O thread tem a própria conexão; fecha para não sobrar aberta
+        connection.close()
+
+
+def excluir_permanente(queryset):
+    """Apaga de vez os objetos (e o que depende deles) por conjunto.
+
+    Retorna (quantidade, em_segundo_plano). Até LIMITE_SINCRONO objetos tudo
+    acontece numa única transação; acima disso a exclusão segue num thread,
+    em blocos de TAMANHO_BLOCO.
+    """
+    model = queryset.model
+    ids = list(queryset.filter(excluido=True).values_list('id', flat=True))
+    if not ids:
+        return 0, False
+
+    if len(ids) <= LIMITE_SINCRONO:
+        with transaction.atomic():
+            _apagar(model.objects.filter(id__in=ids, excluido=True))
+        return len(ids), False
+
+    thread = threading.Thread(
+        target=_excluir_em_segundo_plano,
+        args=(model, ids),
+        name=f'lixeira-{model._meta.model_name}',
+        daemon=True,
+    )
+    transaction.on_commit(thread.start)
+    return len(ids), True
+
+
+def processar_lote(request, *lotes):
+    """Trata as ações restaurar_lote / excluir_permanente_lote das lixeiras.
+
+    Cada lote é (queryset, rótulo) ou (queryset, rótulo, depois_restaurar).
+    """
+    acao = request.POST.get('acao')
+    feitos, em_segundo_plano = [], False
+
+    for queryset, rotulo, *depois in lotes:
+        if acao == 'restaurar_lote':
+            total = restaurar(queryset, *depois)
+        else:
+            total, segundo_plano = excluir_permanente(queryset)
+            em_segundo_plano = em_segundo_plano or segundo_plano
+        if total:
+            feitos.append(f'{total} {rotulo}')
+
+    if not feitos:
+        messages.warning(request, 'Nenhum item da lixeira foi selecionado')
+    elif acao == 'restaurar_lote':
+        messages.success(request, f"Restauração concluída: {', '.join(feitos)}")
+    elif em_segundo_plano:
+        messages.info(request, f"Exclusão permanente iniciada ({', '.join(feitos)}); ela continua em segundo plano")
+    else:
+        messages.success(request, f"Exclusão permanente concluída: {', '.join(feitos)}")
+
+
+# ---------- Expiração da lixeira ----------
+
+def _modelos_expiracao():
+    """(model, filtro de "ainda em uso") de cada lixeira.
+
+    Cadastro ainda usado por algum registro/item não expira: apagá-lo levaria
+    junto (CASCADE) a produção das fichas. As fichas vêm primeiro para liberar
+    o que só era usado por fichas da lixeira.
+    """
+    return [
+        (Ficha, None),
+        (FichaInventario, None),
+        (ModeloCalcado, Exists(ItemInventario.objects.filter(modelo=OuterRef('pk')))),
+        (Cor, Exists(ItemInventario.objects.filter(cor=OuterRef('pk')))),
+        (ParteCalcado, Exists(RegistroParte.objects.filter(parte=OuterRef('pk')))),
+        (NomeOperador, None),
+    ]
+
+
+def expirados(model, limite, em_uso=None):
+    """Objetos na lixeira desde antes de ``limite`` (sem data de exclusão não expiram)"""
+    queryset = model.objects.filter(excluido=True, excluido_em__lt=limite)
+    if em_uso is not None:
+        queryset = queryset.exclude(em_uso)
+    return queryset
+
+
+def expirar(model, limite, em_uso=None, tamanho_bloco=TAMANHO_BLOCO, pausa=0):
+    """Apaga os expirados de um model em blocos, cada um na sua transação.
+
+    O filtro é repetido no DELETE, então um objeto restaurado enquanto o
+    bloco era montado não é apagado. Retorna (objetos, linhas), onde linhas
+    inclui o que saiu junto em cascata.
+    """
+    objetos = linhas = 0
+    while True:
+        ids = list(
+            expirados(model, limite, em_uso).order_by('id').values_list('id', flat=True)[:tamanho_bloco]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            apagadas, por_model = _apagar(expirados(model, limite, em_uso).filter(id__in=ids))
+        objetos += por_model.get(model._meta.label, 0)
+        linhas += apagadas
+        if len(ids) < tamanho_bloco:
+            break
+        if pausa:
+            # Deixa as gravações do sistema passarem entre um bloco e outro
+            time.sleep(pausa)
+    return objetos, linhas
+
+
+TRAVA_EXPIRACAO = 'lixeira_expiracao'
+# Segura a próxima rodada do agendador até o fim do intervalo
+TRAVA_AGENDADOR = 'lixeira_expiracao_agendada'
+
+
+def expirar_lixeira(dias=None, tamanho_bloco=TAMANHO_BLOCO, pausa=0, simular=False):
+    """Expira todas as lixeiras. Retorna uma lista de
+    (nome do model, objetos, linhas, segundos), ou None se já estiver rodando."""
+    dias = settings.LIXEIRA_EXPIRACAO_DIAS if dias is None else dias
+    limite = timezone.now() - timedelta(days=dias)
+
+    # Evita duas expirações ao mesmo tempo (comando + agendador, ou os
+    # agendadores de vários workers)
+    dono = None
+    if not simular:
+        dono = TravaTarefa.pegar(TRAVA_EXPIRACAO, 6 * 60 * 60)
+        if dono is None:
+            return None
+    try:
+        relatorio = []
+        for model, em_uso in _modelos_expiracao():
+            inicio = time.monotonic()
+            if simular:
+                objetos, linhas = expirados(model, limite, em_uso).count(), None
+            else:
+                objetos, linhas = expirar(model, limite, em_uso, tamanho_bloco, pausa)
+            relatorio.append((model.__name__, objetos, linhas, time.monotonic() - inicio))
+        return relatorio
+    finally:
+        if dono:
+            TravaTarefa.soltar(TRAVA_EXPIRACAO, dono)
+
+
+_agendador_iniciado = False
+
+
+def rodada_agendada(intervalo):
+    """Uma rodada do agendador. Todo worker tenta, mas só o primeiro de cada
+    intervalo expira a lixeira: a trava TRAVA_AGENDADOR não é solta, vence
+    sozinha. Retorna o relatório ou None se não era a vez deste processo."""
+    if TravaTarefa.pegar(TRAVA_AGENDADOR, intervalo) is None:
+        return None
+    return expirar_lixeira(pausa=0.05)
+
+
+def _rodar_agendador(intervalo):
+    # Espera um pouco antes da primeira rodada para não pesar na subida do servidor
+    time.sleep(random.uniform(60, 300))
+    while True:
+        try:
+            relatorio = rodada_agendada(intervalo)
+            if relatorio:
+                for nome, objetos, linhas, segundos in relatorio:
+                    if objetos:
+                        logger.info('lixeira_expirada', extra={
+                            'model': nome,
+                            'objetos': objetos,
+                            'linhas': linhas,
+                            'segundos': round(segundos, 2),
+                        })
+        except Exception:
+            logger.exception('lixeira_expiracao_falhou')
+        finally:
+            connection.close()
+        # Acorda de novo antes do fim do intervalo: se o worker que pegou a
+        # rodada morrer, outro assume a próxima sem esperar um intervalo a mais
+        time.sleep(min(intervalo, 60 * 60) + random.uniform(0, 60))
+
+
+def iniciar_agendador():
+    """Liga a expiração automática neste processo (LIXEIRA_EXPIRACAO_AUTOMATICA).
+    Pode ser chamado em todos os workers: as travas no banco fazem só um
+    expirar a cada intervalo."""
+    global _agendador_iniciado
+    if _agendador_iniciado or not settings.LIXEIRA_EXPIRACAO_AUTOMATICA:
+        return
+    _agendador_iniciado = True
+    threading.Thread(
+        target=_rodar_agendador,
+        args=(settings.LIXEIRA_EXPIRACAO_INTERVALO_HORAS * 60 * 60,),
+        name='lixeira-expiracao',
+        daemon=True,
+    ).start()
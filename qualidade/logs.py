@@ -0,0 +1,174 @@
+# qualidade/logs.py
+"""
+Logs estruturados (configurados em LOGGING, config/settings.py).
+
+- FormatadorJSON: uma linha JSON por evento. A mensagem é o nome do evento
+  e os campos vêm do ``extra``:
+  ``logger.info('pedido', extra={'caminho': '/', 'ms': 12.5})``
+- FiltroAmostragem: deixa passar só uma fração dos eventos abaixo de WARNING
+  de um logger de caminho quente (ex.: qualidade.tempos); o campo
+  ``amostra`` leva a fração, para quem somar os eventos reponderar.
+- FilaHandler: quem loga só coloca o evento numa fila limitada; uma thread
+  formata e escreve. Fila cheia descarta o evento (e avisa quantos depois),
+  em vez de travar o pedido esperando o stdout/stderr.
+- tempos_middleware: duração de cada pedido em qualidade.tempos (amostrado);
+  pedidos acima de LOG_PEDIDO_LENTO_MS saem sempre, como WARNING.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+# Atributos que todo LogRecord tem; o resto veio do ``extra``
+_ATRIBUTOS_PADRAO = frozenset(
+    logging.LogRecord('', 0, '', 0, '', (), None).__dict__
+) | {'message', 'asctime', 'taskName'}
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por evento: ts, nivel, logger, evento e os campos do extra"""
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'evento': record.getMessage(),
+        }
+        for chave, valor in record.__dict__.items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados['exc'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            dados['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar ``taxa`` (0 a 1) dos eventos abaixo de WARNING"""
+
+    def __init__(self, taxa=1.0):
+        super().__init__()
+        self.taxa = taxa
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.taxa < 1 and random.random() >= self.taxa:
+            return False
+        record.amostra = self.taxa
+        return True
+
+
+class FilaHandler(QueueHandler):
+    """Escreve os eventos no stderr numa thread à parte (ver docstring do módulo)"""
+
+    def __init__(self, tamanho=10000):
+        super().__init__(queue.Queue(tamanho))
+        self.tamanho = tamanho
+        self.destino = logging.StreamHandler()
+        self.descartados = 0
+        self._listener = None
+        self._pid = None
+        self._trava = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # Quem formata é a thread que escreve, não quem logou
+        self.destino.setFormatter(fmt)
+
+    def prepare(self, record):
+        # A mensagem é montada agora, enquanto os argumentos ainda valem; o
+        # JSON e o traceback ficam para a thread
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record):
+        self._iniciar()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+            return
+        if self.descartados:
+            aviso = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0, 'logs_descartados', None, None,
+            )
+            aviso.descartados, self.descartados = self.descartados, 0
+            try:
+                self.queue.put_nowait(aviso)
+            except queue.Full:
+                pass
+
+    def _iniciar(self):
+        """Liga a thread no primeiro evento de cada processo (os workers do
+        gunicorn são criados por fork depois que o logging foi configurado)"""
+        if self._pid == os.getpid():
+            return
+        with self._trava:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Processo filho: a fila e a thread herdadas são do pai
+                self.queue = queue.Queue(self.tamanho)
+            self._listener = QueueListener(self.queue, self.destino)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self._parar)
+
+    def _parar(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+    def close(self):
+        self._parar()
+        self.destino.close()
+        super().close()
+
+
+logger_tempos = logging.getLogger('qualidade.tempos')
+
+
+def _registrar_pedido(request, response, inicio):
+    ms = (time.perf_counter() - inicio) * 1000
+    nivel = logging.WARNING if ms >= settings.LOG_PEDIDO_LENTO_MS else logging.INFO
+    if logger_tempos.isEnabledFor(nivel):
+        logger_tempos.log(nivel, 'pedido', extra={
+            'metodo': request.method,
+            'caminho': request.path,
+            'status': response.status_code,
+            'ms': round(ms, 1),
+        })
+
+
+@sync_and_async_middleware
+def tempos_middleware(get_response):
+    """Loga a duração dos pedidos (até a resposta sair da view; no streaming,
+    sem o tempo de enviar o corpo)"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            inicio = time.perf_counter()
+            response = await get_response(request)
+            _registrar_pedido(request, response, inicio)
+            return response
+    else:
+        def middleware(request):
+            inicio = time.perf_counter()
+            response = get_response(request)
+            _registrar_pedido(request, response, inicio)
+            return response
+    return middleware
@@ -0,0 +1,228 @@
+# qualidade/management/commands/benchmark_carga.py
+"""
+Teste de carga dos endpoints AJAX de produção nos dois perfis de servidor:
+
+- wsgi: gunicorn com workers gthread (views síncronas de views/api.py)
+- asgi: gunicorn com UvicornWorker (views assíncronas de views/api_async.py)
+
+Cada perfil sobe num processo novo com os mesmos dados do banco; N clientes
+em threads fazem pedidos sem pausa durante D segundos, cada um com conexão
+keep-alive. Os pedidos de cada cliente, em ordem:
+
+- get_cores e get_tamanhos de um modelo/cor do catálogo
+- adicionar_quantidade (1) seguido de remover_quantidade na parte de uma
+  ficha de operador: o efeito no banco se anula
+
+Mostra pedidos/s sustentados e as latências p50/p99 por perfil. Os clientes
+rodam neste processo (com o GIL): com muitos clientes o gargalo pode passar
+a ser o próprio gerador de carga, então compare perfis com o mesmo --clients.
+
+Falha (código de saída 1) se algum pedido voltar com erro.
+
+Uso: python manage.py benchmark_carga
+     python manage.py benchmark_carga --profile asgi --clients 50 --duration 30
+     python manage.py benchmark_carga --workers 3 --threads 2
+"""
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils.crypto import get_random_string
+
+from qualidade.models import ModeloCalcado, RegistroParte, TamanhoModelo
+
+PERFIS = ('wsgi', 'asgi')
+
+
+def _comando_servidor(perfil, porta, workers, threads):
+    comando = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{porta}', '--workers', str(workers)]
+    if perfil == 'wsgi':
+        return comando + ['--worker-class', 'gthread', '--threads', str(threads), 'config.wsgi:application']
+    return comando + ['--worker-class', 'uvicorn.workers.UvicornWorker', 'config.asgi:application']
+
+
+def _pedidos():
+    """(usuário, [(nome, método, caminho, corpo)]) com os dados do banco"""
+    tamanho = TamanhoModelo.ativos.filter(ativo=True, modelo__excluido=False).order_by('id').first()
+    if tamanho is None:
+        raise CommandError('Nenhum tamanho ativo no catálogo para get_cores/get_tamanhos')
+    registro = (
+        RegistroParte.objects
+        .filter(ficha__excluido=False, ficha__operador__is_active=True, ficha__operador__perfil__tipo='operador')
+        .select_related('ficha__operador')
+        .order_by('-id')
+        .first()
+    )
+    if registro is None:
+        raise CommandError('Nenhuma ficha de operador com parte lançada para adicionar/remover quantidade')
+    if not ModeloCalcado.ativos.filter(id=tamanho.modelo_id, cores=tamanho.cor_id).exists():
+        raise CommandError(f'A cor {tamanho.cor_id} não está ligada ao modelo {tamanho.modelo_id}')
+
+    ficha, parte = registro.ficha_id, registro.parte_id
+    return registro.ficha.operador, [
+        ('get_cores', 'GET', f'/api/get_cores/{tamanho.modelo_id}/', None),
+        ('get_tamanhos', 'GET', f'/api/get_tamanhos/{tamanho.cor_id}/?modelo_id={tamanho.modelo_id}', None),
+        ('adicionar_quantidade', 'POST', f'/ficha/{ficha}/parte/{parte}/adicionar/', b'{"quantidade": 1}'),
+        ('remover_quantidade', 'POST', f'/ficha/{ficha}/parte/{parte}/remover/', b'{}'),
+    ]
+
+
+def _cabecalhos(usuario):
+    """Cookies de sessão e CSRF de um login, como o navegador mandaria"""
+    cliente = Client()
+    cliente.force_login(usuario)
+    csrf = get_random_string(32)
+    cookies = (
+        f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}; '
+        f'{settings.CSRF_COOKIE_NAME}={csrf}'
+    )
+    return {'Cookie': cookies, 'X-CSRFToken': csrf, 'Content-Type': 'application/json'}
+
+
+def _esperar_servidor(processo, porta, caminho, log, prazo=30):
+    limite = time.monotonic() + prazo
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            log.seek(0)
+            raise CommandError(f'O servidor não subiu:\n{log.read()[-2000:]}')
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+            conexao.request('GET', caminho)
+            conexao.getresponse().read()
+            conexao.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'O servidor não respondeu em {prazo}s')
+
+
+def _cliente(porta, pedidos, cabecalhos, fim, medidas, erros):
+    """Repete os pedidos até ``fim``; guarda (nome, ms) e os erros"""
+    conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+    while time.monotonic() < fim:
+        for nome, metodo, caminho, corpo in pedidos:
+            inicio = time.perf_counter()
+            try:
+                conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                resposta.read()
+            except (OSError, http.client.HTTPException) as erro:
+                erros.append(f'{nome}: {erro}')
+                conexao.close()
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+                continue
+            medidas.append((nome, (time.perf_counter() - inicio) * 1000))
+            if resposta.status != 200:
+                erros.append(f'{nome}: {resposta.status}')
+    conexao.close()
+
+
+def _percentil(valores, p):
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1] if len(valores) > 1 else valores[0]
+
+
+class Command(BaseCommand):
+    help = 'Compara pedidos/s e p99 dos endpoints AJAX servidos por WSGI e por ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile', dest='perfis', choices=PERFIS, action='append',
+            help='Mede só este perfil (pode repetir)',
+        )
+        parser.add_argument(
+            '--clients', dest='clientes', type=int, default=20,
+            help='Clientes simultâneos (padrão: 20)',
+        )
+        parser.add_argument(
+            '--duration', dest='segundos', type=float, default=10,
+            help='Segundos de carga por perfil (padrão: 10)',
+        )
+        parser.add_argument(
+            '--workers', dest='workers', type=int, default=1,
+            help='Workers do gunicorn (padrão: 1)',
+        )
+        parser.add_argument(
+            '--threads', dest='threads', type=int, default=6,
+            help='Threads por worker no perfil wsgi (padrão: 6)',
+        )
+        parser.add_argument(
+            '--port', dest='porta', type=int, default=8765,
+            help='Porta local dos servidores (padrão: 8765)',
+        )
+
+    def handle(self, *args, **options):
+        if options['clientes'] < 1 or options['workers'] < 1 or options['threads'] < 1:
+            raise CommandError('--clients, --workers e --threads devem ser maiores que zero')
+        if options['segundos'] <= 0:
+            raise CommandError('--duration deve ser maior que zero')
+
+        usuario, pedidos = _pedidos()
+        cabecalhos = _cabecalhos(usuario)
+
+        self.stdout.write(
+            f'{options["clientes"]} clientes, {options["segundos"]:g}s por perfil, '
+            f'{options["workers"]} worker(s); pedidos: {", ".join(nome for nome, *_ in pedidos)}'
+        )
+        self.stdout.write(f'{"perfil":<8}{"pedidos":>10}{"pedidos/s":>12}{"p50 ms":>10}{"p99 ms":>10}{"erros":>8}')
+        todos_erros = []
+        for perfil in options['perfis'] or PERFIS:
+            medidas, erros = self._medir(perfil, pedidos, cabecalhos, options)
+            todos_erros += [f'{perfil} {erro}' for erro in erros]
+            tempos = [ms for _, ms in medidas]
+            if not tempos:
+                self.stdout.write(f'{perfil:<8}{0:>10}{"-":>12}{"-":>10}{"-":>10}{len(erros):>8}')
+                continue
+            self.stdout.write(
+                f'{perfil:<8}{len(tempos):>10}{len(tempos) / options["segundos"]:>12.0f}'
+                f'{statistics.median(tempos):>10.1f}{_percentil(tempos, 99):>10.1f}{len(erros):>8}'
+            )
+            if options['verbosity'] > 1:
+                for nome, *_ in pedidos:
+                    do_pedido = [ms for nome_medida, ms in medidas if nome_medida == nome]
+                    if do_pedido:
+                        self.stdout.write(
+                            f'  {nome:<24}{len(do_pedido):>8}'
+                            f'{statistics.median(do_pedido):>10.1f}{_percentil(do_pedido, 99):>10.1f}'
+                        )
+
+        if todos_erros:
+            raise CommandError(f'{len(todos_erros)} pedido(s) com erro, ex.: {"; ".join(todos_erros[:3])}')
+        self.stdout.write(self.style.SUCCESS('Sem erros'))
+
+    def _medir(self, perfil, pedidos, cabecalhos, options):
+        # O perfil escolhe as views (config/asgi.py liga API_ASYNC); DEBUG
+        # desligado como em produção
+        env = dict(os.environ, API_ASYNC=str(perfil == 'asgi'), DEBUG='False')
+        comando = _comando_servidor(perfil, options['porta'], options['workers'], options['threads'])
+        with tempfile.TemporaryFile('w+') as log:
+            processo = subprocess.Popen(
+                comando, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log, text=True,
+            )
+            try:
+                _esperar_servidor(processo, options['porta'], pedidos[0][2], log)
+                medidas, erros = [], []
+                fim = time.monotonic() + options['segundos']
+                clientes = [
+                    threading.Thread(target=_cliente, args=(options['porta'], pedidos, cabecalhos, fim, medidas, erros))
+                    for _ in range(options['clientes'])
+                ]
+                for cliente in clientes:
+                    cliente.start()
+                for cliente in clientes:
+                    cliente.join()
+                return medidas, erros
+            finally:
+                processo.terminate()
+                try:
+                    processo.wait(10)
+                except subprocess.TimeoutExpired:
+                    processo.kill()
+                    processo.wait()
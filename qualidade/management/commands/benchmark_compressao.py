@@ -0,0 +1,92 @@
+# qualidade/management/commands/benchmark_compressao.py
+"""
+Mede bytes transferidos e tempo de resposta das views mais pesadas sem
+compressão, com gzip e com brotli, usando os dados do banco.
+
+Cada view é pedida pelo cliente de teste do Django, logado com um usuário
+da qualidade, mudando só o Accept-Encoding. O tempo é a mediana do pedido
+inteiro (view + compressão + leitura do streaming). Um * marca a resposta
+que não saiu na codificação pedida (abaixo do tamanho mínimo, tipo fora de
+COMPRESSAO_TIPOS ou página com token CSRF e COMPRESSAO_SEM_CSRF).
+
+Uso: python manage.py benchmark_compressao
+     python manage.py benchmark_compressao --repeat 20 --url /modelos/
+"""
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+URLS = (
+    '/',
+    '/modelos/',
+    '/inventario/estoque/',
+    '/inventario/estoque/exportar/',
+    '/api/inventario/estoque/',
+    '/telas/',
+)
+
+# (coluna, Accept-Encoding, Content-Encoding esperado)
+CODIFICACOES = (
+    ('sem', 'identity', '-'),
+    ('gzip', 'gzip', 'gzip'),
+    ('br', 'br', 'br'),
+)
+
+
+def _pedir(cliente, url, aceita):
+    """(bytes no corpo, Content-Encoding, ms) de um pedido"""
+    inicio = time.perf_counter()
+    resposta = cliente.get(url, HTTP_ACCEPT_ENCODING=aceita)
+    corpo = b''.join(resposta.streaming_content) if resposta.streaming else resposta.content
+    ms = (time.perf_counter() - inicio) * 1000
+    if resposta.status_code != 200:
+        raise CommandError(f'{url} respondeu {resposta.status_code}')
+    return len(corpo), resposta.get('Content-Encoding', '-'), ms
+
+
+class Command(BaseCommand):
+    help = 'Mede bytes e tempo das views sem compressão, com gzip e com brotli'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', dest='vezes', type=int, default=10,
+            help='Pedidos por medida (padrão: 10)',
+        )
+        parser.add_argument(
+            '--url', dest='urls', action='append',
+            help='Mede só esta URL (pode repetir)',
+        )
+
+    def handle(self, *args, **options):
+        if options['vezes'] < 1:
+            raise CommandError('--repeat deve ser maior que zero')
+
+        usuario = User.objects.filter(is_active=True, perfil__tipo='qualidade').order_by('id').first()
+        if usuario is None:
+            raise CommandError('Nenhum usuário ativo com perfil qualidade para abrir as telas')
+
+        setup_test_environment()
+        try:
+            cliente = Client()
+            cliente.force_login(usuario)
+            cabecalho = ''.join(f'{rotulo:>18}' for rotulo, _, _ in CODIFICACOES)
+            self.stdout.write(f'{"url":<32}{cabecalho}  (bytes / ms, mediana de {options["vezes"]})')
+            for url in options['urls'] or URLS:
+                self._medir(cliente, url, options['vezes'])
+        finally:
+            teardown_test_environment()
+
+    def _medir(self, cliente, url, vezes):
+        colunas = []
+        for _, aceita, esperado in CODIFICACOES:
+            _pedir(cliente, url, aceita)  # aquece caches da view
+            medidas = [_pedir(cliente, url, aceita) for _ in range(vezes)]
+            tamanho, codificacao, _ = medidas[-1]
+            ms = statistics.median(ms for _, _, ms in medidas)
+            marca = '' if codificacao == esperado else '*'
+            colunas.append(f'{tamanho:>9} {ms:>6.1f}{marca:<1}')
+        self.stdout.write(f'{url:<32}' + ''.join(f'{coluna:>18}' for coluna in colunas))
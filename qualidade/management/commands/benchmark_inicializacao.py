@@ -0,0 +1,118 @@
+# qualidade/management/commands/benchmark_inicializacao.py
+"""
+Mede quanto custa subir um worker: um processo Python novo que faz o que o
+gunicorn faz no boot (get_wsgi_application) mais o carregamento das URLs
+(que acontece no primeiro pedido).
+
+- boot: tempo total do processo, mediana de N execuções
+- importtime: com "python -X importtime", os pacotes que mais pesam na
+  importação (tempo próprio somado por pacote de primeiro nível)
+
+Falha (código de saída 1) se a mediana passar do orçamento ou se algum
+módulo de MODULOS_PESADOS for importado no boot: eles devem ser importados
+só dentro das views que os usam (ex.: ReportLab nos PDFs).
+
+Uso: python manage.py benchmark_inicializacao
+     python manage.py benchmark_inicializacao --repeat 10 --budget-ms 800
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Importados só sob demanda; não podem aparecer no boot
+MODULOS_PESADOS = ('reportlab', 'PIL')
+
+ORCAMENTO_MS = 1000
+
+CODIGO_BOOT = (
+    'from django.core.wsgi import get_wsgi_application\n'
+    'get_wsgi_application()\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().url_patterns\n'
+)
+
+
+def _rodar(*opcoes):
+    """Roda CODIGO_BOOT num processo novo; retorna (ms, stderr)"""
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, *opcoes, '-c', CODIGO_BOOT],
+        cwd=settings.BASE_DIR, env=os.environ.copy(),
+        capture_output=True, text=True,
+    )
+    ms = (time.perf_counter() - inicio) * 1000
+    if processo.returncode != 0:
+        raise CommandError(f'O boot falhou:\n{processo.stderr[-2000:]}')
+    return ms, processo.stderr
+
+
+def _importacoes(saida):
+    """{módulo: (próprio µs, acumulado µs)} da saída do -X importtime"""
+    modulos = {}
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        proprio, acumulado, nome = linha[len('import time:'):].split('|')
+        modulos[nome.strip()] = (int(proprio), int(acumulado))
+    return modulos
+
+
+class Command(BaseCommand):
+    help = 'Mede o boot de um worker (importações e tempo) contra um orçamento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', dest='vezes', type=int, default=5,
+            help='Execuções para a mediana do boot (padrão: 5)',
+        )
+        parser.add_argument(
+            '--budget-ms', dest='orcamento_ms', type=int, default=ORCAMENTO_MS,
+            help=f'Mediana máxima do boot em ms (padrão: {ORCAMENTO_MS})',
+        )
+        parser.add_argument(
+            '--top', dest='top', type=int, default=10,
+            help='Pacotes listados no importtime (padrão: 10)',
+        )
+
+    def handle(self, *args, **options):
+        if options['vezes'] < 1:
+            raise CommandError('--repeat deve ser maior que zero')
+
+        _, saida = _rodar('-X', 'importtime')
+        modulos = _importacoes(saida)
+        por_pacote = Counter()
+        for nome, (proprio, _) in modulos.items():
+            por_pacote[nome.split('.')[0]] += proprio
+
+        self.stdout.write(f'Importações no boot: {len(modulos)} módulos, {sum(por_pacote.values()) / 1000:.1f} ms')
+        for pacote, proprio in por_pacote.most_common(options['top']):
+            self.stdout.write(f'  {pacote:<28}{proprio / 1000:>8.1f} ms')
+        qualidade = [(nome, acumulado) for nome, (_, acumulado) in modulos.items() if nome.startswith('qualidade')]
+        for nome, acumulado in sorted(qualidade, key=lambda m: -m[1])[:5]:
+            self.stdout.write(f'  {nome:<28}{acumulado / 1000:>8.1f} ms (acumulado)')
+
+        tempos = [_rodar()[0] for _ in range(options['vezes'])]
+        mediana = statistics.median(tempos)
+        self.stdout.write(
+            f'Boot do worker: mediana {mediana:.0f} ms (mín. {min(tempos):.0f}, máx. {max(tempos):.0f}, '
+            f'orçamento {options["orcamento_ms"]} ms)'
+        )
+
+        problemas = []
+        pesados = sorted({
+            nome for nome in modulos
+            if nome.split('.')[0] in MODULOS_PESADOS
+        })
+        if pesados:
+            problemas.append(f'módulos pesados importados no boot: {", ".join(pesados[:5])}')
+        if mediana > options['orcamento_ms']:
+            problemas.append(f'boot de {mediana:.0f} ms acima do orçamento de {options["orcamento_ms"]} ms')
+        if problemas:
+            raise CommandError('; '.join(problemas))
+        self.stdout.write(self.style.SUCCESS('Dentro do orçamento'))
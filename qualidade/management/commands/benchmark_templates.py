@@ -0,0 +1,175 @@
+# qualidade/management/commands/benchmark_templates.py
+"""
+Mede o tempo de renderização das telas mais pesadas com os dados do banco.
+
+Cada tela é pedida uma vez pelo cliente de teste do Django, logado com um
+usuário que pode abri-la, só para capturar o template e o contexto que a
+view monta. Depois o template é renderizado várias vezes com esse contexto:
+
+- compilar: ler e compilar o arquivo (o que o loader em cache economiza)
+- frio: renderizar trocando a versão do catálogo antes, sem fragmentos em cache
+- quente: renderizar com os fragmentos já em cache
+
+As consultas são as do pedido inteiro (view e template), sem e com os
+fragmentos em cache. Filtros é quantas vezes um filtro de template foi
+aplicado numa renderização quente; deve acompanhar o número de linhas da
+tela, não crescer com o quadrado (com -v 2 sai a contagem por filtro).
+
+Uso: python manage.py benchmark_templates
+     python manage.py benchmark_templates --repeat 50 --tela modelos
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template import engines
+from django.template.base import FilterExpression
+from django.test import Client
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from qualidade import catalogo
+from qualidade.models import Ficha, FichaInventario
+
+TELAS = ('telas', 'modelos', 'editar_ficha', 'editar_ficha_inventario')
+
+
+def _usuario(tipo):
+    return User.objects.filter(is_active=True, perfil__tipo=tipo).order_by('id').first()
+
+
+def _pedidos():
+    """{tela: (url, usuário, template)} das telas que têm dados para abrir"""
+    pedidos = {}
+    qualidade = _usuario('qualidade')
+    if qualidade:
+        pedidos['telas'] = ('/telas/', qualidade, 'qualidade/telas.html')
+        pedidos['modelos'] = ('/modelos/', qualidade, 'qualidade/gerenciar_modelos.html')
+
+    # As partes e quantidades só aparecem para o operador dono da ficha; a
+    # edição do inventário só abre para operador
+    ficha = Ficha.ativos.filter(operador__perfil__tipo='operador').order_by('-id').first()
+    if ficha:
+        pedidos['editar_ficha'] = (f'/ficha/{ficha.id}/editar/', ficha.operador, 'qualidade/editar_ficha.html')
+    ficha = FichaInventario.ativos.filter(operador__perfil__tipo='operador').order_by('-id').first()
+    if ficha:
+        pedidos['editar_ficha_inventario'] = (
+            f'/inventario/{ficha.id}/editar/', ficha.operador, 'qualidade/editar_ficha_inventario.html',
+        )
+    return pedidos
+
+
+@contextmanager
+def _contando_filtros():
+    """Counter {nome do filtro: aplicações} durante o bloco"""
+    contagem = Counter()
+    original = FilterExpression.resolve
+
+    def resolve(self, context, ignore_failures=False):
+        for funcao, _ in self.filters:
+            contagem[funcao.__name__] += 1
+        return original(self, context, ignore_failures)
+
+    FilterExpression.resolve = resolve
+    try:
+        yield contagem
+    finally:
+        FilterExpression.resolve = original
+
+
+def _ms(inicio):
+    return (time.perf_counter() - inicio) * 1000
+
+
+class Command(BaseCommand):
+    help = 'Mede compilação e renderização (fria e quente) dos templates mais pesados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', dest='vezes', type=int, default=20,
+            help='Renderizações por medida (padrão: 20)',
+        )
+        parser.add_argument(
+            '--tela', dest='telas', choices=TELAS, action='append',
+            help='Mede só esta tela (pode repetir)',
+        )
+
+    def handle(self, *args, **options):
+        if options['vezes'] < 1:
+            raise CommandError('--repeat deve ser maior que zero')
+
+        pedidos = _pedidos()
+        telas = options['telas'] or TELAS
+        faltando = [tela for tela in telas if tela not in pedidos]
+        for tela in faltando:
+            self.stdout.write(self.style.WARNING(f'{tela}: sem usuário ou ficha para abrir, ignorada'))
+
+        setup_test_environment()
+        try:
+            self.stdout.write(
+                f'{"tela":<26}{"compilar":>10}{"frio":>10}{"quente":>10}{"consultas":>12}{"filtros":>9}'
+                f'  (ms, média de {options["vezes"]})'
+            )
+            for tela in telas:
+                if tela in pedidos:
+                    self._medir(tela, *pedidos[tela], options['vezes'], options['verbosity'])
+        finally:
+            teardown_test_environment()
+
+    def _capturar(self, url, usuario, nome):
+        """(template, contexto, consultas frio, consultas quente) ao pedir ``url``
+        duas vezes, a primeira sem os fragmentos em cache"""
+        capturado = {}
+
+        def receber(sender, template, context, **kwargs):
+            if template.name == nome and 'template' not in capturado:
+                capturado['template'], capturado['contexto'] = template, context
+
+        cliente = Client()
+        cliente.force_login(usuario)
+        catalogo.invalidar()
+        template_rendered.connect(receber)
+        try:
+            with CaptureQueriesContext(connection) as frio:
+                resposta = cliente.get(url)
+            with CaptureQueriesContext(connection) as quente:
+                cliente.get(url)
+        finally:
+            template_rendered.disconnect(receber)
+        if resposta.status_code != 200 or 'template' not in capturado:
+            raise CommandError(f'{url} respondeu {resposta.status_code} sem renderizar {nome}')
+        return capturado['template'], capturado['contexto'], len(frio), len(quente)
+
+    def _medir(self, tela, url, usuario, nome, vezes, verbosidade):
+        template, contexto, consultas_frio, consultas_quente = self._capturar(url, usuario, nome)
+        motor = engines['django'].engine
+
+        inicio = time.perf_counter()
+        for _ in range(vezes):
+            motor.from_string(template.source)
+        compilar = _ms(inicio) / vezes
+
+        frio = 0
+        for _ in range(vezes):
+            catalogo.invalidar()
+            inicio = time.perf_counter()
+            template.render(contexto)
+            frio += _ms(inicio)
+
+        with _contando_filtros() as filtros:
+            template.render(contexto)
+        inicio = time.perf_counter()
+        for _ in range(vezes):
+            template.render(contexto)
+        quente = _ms(inicio) / vezes
+
+        self.stdout.write(
+            f'{tela:<26}{compilar:>10.2f}{frio / vezes:>10.2f}{quente:>10.2f}'
+            f'{consultas_frio:>7} -> {consultas_quente:<3}{sum(filtros.values()):>8}'
+        )
+        if verbosidade > 1:
+            for filtro, vezes_aplicado in filtros.most_common():
+                self.stdout.write(f'    {filtro}: {vezes_aplicado}')
@@ -0,0 +1,42 @@
+# qualidade/management/commands/checkpoint_inventario.py
+"""
+Grava um checkpoint com os saldos atuais de todos os itens de inventário.
+
+O estoque de uma data (visualizar_ficha_inventario?as_of=...) é refeito a
+partir do checkpoint mais próximo; rodar periodicamente (ex. todo dia no cron)
+mantém essa reconstrução curta.
+
+Uso: python manage.py checkpoint_inventario
+     python manage.py checkpoint_inventario --keep-days 365
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from qualidade.estoque import criar_checkpoint
+from qualidade.models import CheckpointInventario
+
+
+class Command(BaseCommand):
+    help = 'Grava os saldos atuais do inventário para as consultas de estoque por data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', dest='manter_dias', type=int, default=None,
+            help='Apaga checkpoints mais antigos que N dias (padrão: mantém todos)',
+        )
+
+    def handle(self, *args, **options):
+        if options['manter_dias'] is not None and options['manter_dias'] < 1:
+            raise CommandError('--keep-days deve ser maior que zero')
+
+        checkpoint = criar_checkpoint()
+        self.stdout.write(self.style.SUCCESS(
+            f'Checkpoint de {timezone.localtime(checkpoint.momento):%d/%m/%Y %H:%M} gravado com {checkpoint.itens} item(ns)'
+        ))
+
+        if options['manter_dias'] is not None:
+            limite = timezone.now() - timedelta(days=options['manter_dias'])
+            apagados, _ = CheckpointInventario.objects.filter(momento__lt=limite).delete()
+            self.stdout.write(f'{apagados} linha(s) de checkpoints antigos apagada(s)')
@@ -0,0 +1,33 @@
+# qualidade/management/commands/criar_token_quiosque.py
+"""
+Cria um token de quiosque para um telão e mostra o endereço a abrir na TV.
+
+Uso: python manage.py criar_token_quiosque "Telão Corte"
+     python manage.py criar_token_quiosque "Telão Corte" --desativar
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from qualidade.models import TokenQuiosque
+
+
+class Command(BaseCommand):
+    help = 'Cria (ou desativa) o token de acesso de um telão às telas de produção'
+
+    def add_arguments(self, parser):
+        parser.add_argument('nome', help='Nome do telão')
+        parser.add_argument('--desativar', action='store_true', help='Desativa os tokens com esse nome')
+
+    def handle(self, *args, **options):
+        nome = options['nome'].strip()
+        if not nome:
+            raise CommandError('Informe o nome do telão')
+
+        if options['desativar']:
+            total = TokenQuiosque.objects.filter(nome=nome, ativo=True).update(ativo=False)
+            self.stdout.write(self.style.SUCCESS(f'{total} token(s) desativado(s) para "{nome}"'))
+            return
+
+        token = TokenQuiosque.objects.create(nome=nome)
+        self.stdout.write(self.style.SUCCESS(f'Token criado para "{nome}"'))
+        self.stdout.write(f"{reverse('telas')}?token={token.token}")
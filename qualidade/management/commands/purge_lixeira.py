@@ -0,0 +1,57 @@
+# qualidade/management/commands/purge_lixeira.py
+"""
+Apaga de vez o que está na lixeira há mais de N dias, em blocos.
+
+Uso: python manage.py purge_lixeira --older-than 90
+     python manage.py purge_lixeira --older-than 30 --batch-size 200 --dry-run
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from qualidade.lixeira import TAMANHO_BLOCO, expirar_lixeira
+
+
+class Command(BaseCommand):
+    help = 'Apaga permanentemente os itens que estão na lixeira há mais de N dias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', dest='dias', type=int, default=settings.LIXEIRA_EXPIRACAO_DIAS,
+            help=f'Dias na lixeira para expirar (padrão: {settings.LIXEIRA_EXPIRACAO_DIAS})',
+        )
+        parser.add_argument(
+            '--batch-size', dest='tamanho_bloco', type=int, default=TAMANHO_BLOCO,
+            help=f'Objetos apagados por transação (padrão: {TAMANHO_BLOCO})',
+        )
+        parser.add_argument(
+            '--pause', dest='pausa', type=float, default=0.05,
+            help='Segundos de pausa entre blocos, para não travar o sistema (padrão: 0.05)',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Só mostra quantos itens expirariam')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0:
+            raise CommandError('--older-than não pode ser negativo')
+        if options['tamanho_bloco'] <= 0:
+            raise CommandError('--batch-size deve ser maior que zero')
+
+        relatorio = expirar_lixeira(
+            dias=options['dias'],
+            tamanho_bloco=options['tamanho_bloco'],
+            pausa=options['pausa'],
+            simular=options['dry_run'],
+        )
+        if relatorio is None:
+            raise CommandError('Já existe uma expiração da lixeira em andamento')
+
+        for nome, objetos, linhas, segundos in relatorio:
+            if options['dry_run']:
+                self.stdout.write(f'{nome}: {objetos} expirariam')
+            else:
+                self.stdout.write(f'{nome}: {objetos} apagado(s), {linhas} linha(s) no total, {segundos:.2f}s')
+
+        total = sum(objetos for _, objetos, _, _ in relatorio)
+        verbo = 'expirariam' if options['dry_run'] else 'apagado(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f'Lixeira com mais de {options["dias"]} dia(s): {total} item(ns) {verbo}'
+        ))
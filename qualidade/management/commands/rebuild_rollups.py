@@ -0,0 +1,42 @@
+# qualidade/management/commands/rebuild_rollups.py
+"""
+Refaz o resumo diário de produção (ProducaoDiaria) a partir dos RegistroParte.
+
+Uso: python manage.py rebuild_rollups --from 2026-01-01 --to 2026-12-31
+"""
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from qualidade.models import ProducaoDiaria
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Data inválida: {valor} (use AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Refaz o resumo diário de produção (ProducaoDiaria) de um período'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='data_inicio', help='Data inicial (AAAA-MM-DD); sem ela, desde o início')
+        parser.add_argument('--to', dest='data_fim', help='Data final (AAAA-MM-DD); sem ela, até hoje')
+
+    def handle(self, *args, **options):
+        data_inicio = _data(options['data_inicio']) if options['data_inicio'] else None
+        data_fim = _data(options['data_fim']) if options['data_fim'] else None
+
+        if data_inicio and data_fim and data_inicio > data_fim:
+            raise CommandError('--from deve ser anterior a --to')
+
+        inicio = time.monotonic()
+        linhas = ProducaoDiaria.reconstruir(data_inicio, data_fim)
+        duracao = time.monotonic() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumo diário refeito: {linhas} linha(s) em {duracao:.2f}s'
+        ))
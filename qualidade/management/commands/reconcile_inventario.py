@@ -0,0 +1,75 @@
+# qualidade/management/commands/reconcile_inventario.py
+"""
+Confere o inventário contra o histórico: refaz o saldo de cada item somando
+as movimentações do LogMovimentacaoV2 e lista os itens cujo saldo atual não
+bate (alteração sem log, log perdido, edição direta no banco).
+
+Também aponta quebras na sequência de saldos antes/depois gravados nos logs,
+que mostram quando o item mudou entre duas movimentações.
+
+--fast só compara somas de conferência por ficha (duas consultas agrupadas
+por lote) e lista as fichas divergentes; use sem --fast nelas para ver os itens.
+
+Uso: python manage.py reconcile_inventario
+     python manage.py reconcile_inventario --fast
+     python manage.py reconcile_inventario --ficha 12 --ficha 15
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from qualidade.conciliacao import TAMANHO_LOTE, divergencias, fichas_divergentes
+
+
+class Command(BaseCommand):
+    help = 'Confere os saldos dos itens de inventário refazendo as movimentações do log'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fast', dest='rapido', action='store_true',
+            help='Só compara somas de conferência por ficha (não lista itens)',
+        )
+        parser.add_argument(
+            '--ficha', dest='fichas', type=int, action='append',
+            help='Confere só esta ficha (pode repetir)',
+        )
+        parser.add_argument(
+            '--batch-size', dest='tamanho_lote', type=int, default=TAMANHO_LOTE,
+            help=f'Fichas por lote (padrão: {TAMANHO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero')
+
+        if options['rapido']:
+            divergentes = fichas_divergentes(options['fichas'], options['tamanho_lote'])
+            for ficha_id in divergentes:
+                self.stdout.write(f'Ficha #{ficha_id}: saldo dos itens não bate com o log')
+            self._resumo(len(divergentes), 'ficha(s) divergente(s)')
+            return
+
+        total = 0
+        for linha in divergencias(options['fichas'], options['tamanho_lote']):
+            if 'esperado' not in linha:
+                self.stdout.write(f"{linha['fichas']} ficha(s) e {linha['itens']} item(ns) conferidos")
+                break
+            total += 1
+            self.stdout.write(self._descrever(linha))
+        self._resumo(total, 'item(ns) divergente(s)')
+
+    def _descrever(self, linha):
+        item = linha['item']
+        nome = f'{item.modelo.nome} {item.cor.nome} Nº {item.tamanho.numero}' if item else f"tamanho #{linha['tamanho_id']} (item apagado)"
+        texto = (
+            f"Ficha #{linha['ficha_id']} {nome}: "
+            f"log PD {linha['esperado'][0]} / PE {linha['esperado'][1]}, "
+            f"item PD {linha['atual'][0]} / PE {linha['atual'][1]}"
+        )
+        if linha['quebras']:
+            texto += f" ({linha['quebras']} quebra(s) na sequência de saldos)"
+        return texto
+
+    def _resumo(self, total, rotulo):
+        if total:
+            self.stdout.write(self.style.WARNING(f'{total} {rotulo}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada'))
@@ -0,0 +1,107 @@
+# qualidade/middleware.py
+"""
+Contexto do usuário por requisição (request.ctx).
+
+Quase toda view consulta o tipo do perfil e o grupo (setor) do usuário.
+Em vez de uma query para ``request.user.perfil`` e outra para cada
+``request.user.groups...``, o contexto é carregado numa única query, guardado
+na sessão e invalidado pelos sinais de qualidade/signals.py quando o perfil
+ou os grupos do usuário mudam.
+
+A invalidação é uma versão no cache: só funciona entre os workers do gunicorn
+se o cache for compartilhado (CACHE_COMPARTILHADO, Redis). Com o cache local
+de cada processo, a mudança de permissão só chegaria ao worker que a fez, então
+o contexto é lido do banco a cada requisição (a mesma consulta única).
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+
+from .models import PerfilUsuario
+
+CHAVE_SESSAO = '_ctx_usuario'
+
+
+def chave_versao(user_id):
+    return f'ctx_usuario_versao:{user_id}'
+
+
+class ContextoUsuario:
+    """Tipo do perfil e grupos do usuário logado"""
+
+    def __init__(self, tipo=None, grupos=()):
+        self.tipo = tipo
+        self.grupos = tuple(grupos)
+
+    @property
+    def setor(self):
+        """Nome do primeiro grupo (mesmo resultado de user.groups.first())"""
+        return self.grupos[0] if self.grupos else None
+
+    @property
+    def tipo_display(self):
+        return dict(PerfilUsuario.TIPO_PERFIL).get(self.tipo, '')
+
+    def __repr__(self):
+        return f'<ContextoUsuario tipo={self.tipo!r} grupos={self.grupos!r}>'
+
+
+def _carregar_do_banco(user):
+    linhas = list(
+        User.objects.filter(pk=user.pk)
+        .values_list('perfil__tipo', 'groups__name')
+        .order_by('groups__id')
+    )
+    tipo = linhas[0][0] if linhas else None
+    grupos = [nome for _, nome in linhas if nome]
+    return tipo, grupos
+
+
+def carregar_contexto(request):
+    user = request.user
+    if not user.is_authenticated:
+        return ContextoUsuario()
+    if not settings.CACHE_COMPARTILHADO:
+        return ContextoUsuario(*_carregar_do_banco(user))
+
+    versao = cache.get(chave_versao(user.pk))
+    session = getattr(request, 'session', None)
+    guardado = session.get(CHAVE_SESSAO) if session is not None else None
+
+    if (
+        guardado
+        and guardado.get('user_id') == user.pk
+        and guardado.get('versao') == versao
+        and time.time() - guardado.get('carregado_em', 0) < settings.CTX_USUARIO_TTL
+    ):
+        return ContextoUsuario(guardado['tipo'], guardado['grupos'])
+
+    tipo, grupos = _carregar_do_banco(user)
+    if session is not None:
+        session[CHAVE_SESSAO] = {
+            'user_id': user.pk,
+            'tipo': tipo,
+            'grupos': grupos,
+            'versao': versao,
+            'carregado_em': time.time(),
+        }
+    return ContextoUsuario(tipo, grupos)
+
+
+@sync_and_async_middleware
+def contexto_usuario_middleware(get_response):
+    """Disponibiliza request.ctx (carregado só quando alguma view usa)"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            request.ctx = SimpleLazyObject(lambda: carregar_contexto(request))
+            return await get_response(request)
+    else:
+        def middleware(request):
+            request.ctx = SimpleLazyObject(lambda: carregar_contexto(request))
+            return get_response(request)
+    return middleware
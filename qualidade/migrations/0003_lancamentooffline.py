@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0002_logmovimentacaov2'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LancamentoOffline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(unique=True)),
+                ('quantidade', models.IntegerField()),
+                ('recebido_em', models.DateTimeField(auto_now_add=True)),
+                ('registro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos_offline', to='qualidade.registroparte')),
+            ],
+            options={
+                'verbose_name': 'Lançamento Offline',
+                'verbose_name_plural': 'Lançamentos Offline',
+            },
+        ),
+    ]
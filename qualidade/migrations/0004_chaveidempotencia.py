@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0003_lancamentooffline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64)),
+                ('caminho', models.CharField(max_length=255)),
+                ('status', models.PositiveSmallIntegerField(null=True)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('location', models.CharField(blank=True, max_length=255)),
+                ('conteudo', models.BinaryField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chaves_idempotencia', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chave de Idempotência',
+                'verbose_name_plural': 'Chaves de Idempotência',
+                'unique_together': {('usuario', 'chave')},
+            },
+        ),
+    ]
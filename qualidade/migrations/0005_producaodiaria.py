@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def preencher_producao_diaria(apps, schema_editor):
+    """Calcula o resumo diário da produção já lançada"""
+    RegistroParte = apps.get_model('qualidade', 'RegistroParte')
+    ProducaoDiaria = apps.get_model('qualidade', 'ProducaoDiaria')
+
+    linhas = {}
+    valores = RegistroParte.objects.filter(ficha__excluido=False).values_list(
+        'ficha__data', 'ficha__setor', 'ficha__operador_id', 'ficha__nome_ficha', 'parte_id', 'quantidades'
+    )
+    for data, setor, operador_id, nome_ficha, parte_id, quantidades in valores.iterator(chunk_size=2000):
+        if not quantidades:
+            continue
+        chave = (data, setor or '', operador_id, nome_ficha, parte_id)
+        total, lancamentos = linhas.get(chave, (0, 0))
+        linhas[chave] = (total + sum(quantidades), lancamentos + len(quantidades))
+
+    ProducaoDiaria.objects.bulk_create(
+        [
+            ProducaoDiaria(data=data, setor=setor, operador_id=operador_id, nome_ficha=nome_ficha,
+                           parte_id=parte_id, total=total, lancamentos=lancamentos)
+            for (data, setor, operador_id, nome_ficha, parte_id), (total, lancamentos) in linhas.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0004_chaveidempotencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProducaoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('setor', models.CharField(blank=True, default='', max_length=25)),
+                ('nome_ficha', models.CharField(max_length=200)),
+                ('total', models.IntegerField(default=0)),
+                ('lancamentos', models.IntegerField(default=0)),
+                ('operador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='producao_diaria', to=settings.AUTH_USER_MODEL)),
+                ('parte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='producao_diaria', to='qualidade.partecalcado')),
+            ],
+            options={
+                'verbose_name': 'Produção Diária',
+                'verbose_name_plural': 'Produção Diária',
+                'indexes': [models.Index(fields=['data', 'parte'], name='qualidade_p_data_da5e54_idx')],
+                'unique_together': {('data', 'setor', 'operador', 'nome_ficha', 'parte')},
+            },
+        ),
+        migrations.RunPython(preencher_producao_diaria, migrations.RunPython.noop),
+    ]
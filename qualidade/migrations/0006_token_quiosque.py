@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:45
+
+import django.db.models.deletion
+import qualidade.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0005_producaodiaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenQuiosque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome do Telão')),
+                ('token', models.CharField(default=qualidade.models.gerar_token_quiosque, editable=False, max_length=64, unique=True)),
+                ('ativo', models.BooleanField(default=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('criado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tokens_quiosque', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Token de Quiosque',
+                'verbose_name_plural': 'Tokens de Quiosque',
+                'ordering': ['nome'],
+            },
+        ),
+    ]
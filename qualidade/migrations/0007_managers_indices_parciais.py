@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0006_token_quiosque'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cor',
+            index=models.Index(condition=models.Q(('excluido', False)), fields=['ordem', 'nome'], name='cor_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ficha',
+            index=models.Index(condition=models.Q(('excluido', False)), fields=['-data', '-criada_em'], name='ficha_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ficha',
+            index=models.Index(condition=models.Q(('excluido', False)), fields=['operador', '-data'], name='ficha_operador_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ficha',
+            index=models.Index(condition=models.Q(('excluido', True)), fields=['-excluido_em'], name='ficha_lixeira_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fichainventario',
+            index=models.Index(condition=models.Q(('excluido', False)), fields=['-data', '-criada_em'], name='fichainventario_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fichainventario',
+            index=models.Index(condition=models.Q(('excluido', True)), fields=['-excluido_em'], name='fichainventario_lixeira_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='modelocalcado',
+            index=models.Index(condition=models.Q(('excluido', False)), fields=['nome'], name='modelocalcado_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nomeoperador',
+            index=models.Index(condition=models.Q(('excluido', False)), fields=['ordem', 'nome'], name='nomeoperador_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partecalcado',
+            index=models.Index(condition=models.Q(('excluido', False)), fields=['ordem', 'nome'], name='partecalcado_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tamanhomodelo',
+            index=models.Index(condition=models.Q(('excluido', False)), fields=['modelo', 'cor', 'numero'], name='tamanhomodelo_ativos_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0007_managers_indices_parciais'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LancamentoParte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.IntegerField()),
+                ('lancado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('registro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos', to='qualidade.registroparte')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lançamento de Parte',
+                'verbose_name_plural': 'Lançamentos de Partes',
+                'indexes': [models.Index(fields=['registro', 'lancado_em'], name='qualidade_l_registr_ab8ff7_idx')],
+            },
+        ),
+    ]
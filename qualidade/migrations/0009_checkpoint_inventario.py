@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def preencher_tamanho_logs(apps, schema_editor):
+    """Copia o tamanho do item para os logs existentes (logs de itens já
+    apagados não têm mais o item e ficam sem tamanho)"""
+    LogMovimentacaoV2 = apps.get_model('qualidade', 'LogMovimentacaoV2')
+    ItemInventario = apps.get_model('qualidade', 'ItemInventario')
+    LogMovimentacaoV2.objects.filter(item__isnull=False).update(
+        tamanho=Subquery(ItemInventario.objects.filter(pk=OuterRef('item_id')).values('tamanho_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0008_lancamentoparte'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('momento', models.DateTimeField(unique=True)),
+                ('itens', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Inventário',
+                'verbose_name_plural': 'Checkpoints de Inventário',
+                'ordering': ['-momento'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pe_direito', models.IntegerField(default=0)),
+                ('pe_esquerdo', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='logmovimentacaov2',
+            name='tamanho',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='qualidade.tamanhomodelo'),
+        ),
+        migrations.AddIndex(
+            model_name='logmovimentacaov2',
+            index=models.Index(fields=['ficha', 'criado_em'], name='qualidade_l_ficha_i_834abe_idx'),
+        ),
+        migrations.AddField(
+            model_name='saldocheckpoint',
+            name='checkpoint',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='qualidade.checkpointinventario'),
+        ),
+        migrations.AddField(
+            model_name='saldocheckpoint',
+            name='ficha',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='qualidade.fichainventario'),
+        ),
+        migrations.AddField(
+            model_name='saldocheckpoint',
+            name='tamanho',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='qualidade.tamanhomodelo'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='saldocheckpoint',
+            unique_together={('checkpoint', 'ficha', 'tamanho')},
+        ),
+        migrations.RunPython(preencher_tamanho_logs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0009_checkpoint_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logmovimentacaov2',
+            name='saldo_pd_antes',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='logmovimentacaov2',
+            name='saldo_pd_depois',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='logmovimentacaov2',
+            name='saldo_pe_antes',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='logmovimentacaov2',
+            name='saldo_pe_depois',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
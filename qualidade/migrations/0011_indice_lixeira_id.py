@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0010_saldos_por_lado_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ficha',
+            name='ficha_lixeira_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='fichainventario',
+            name='fichainventario_lixeira_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ficha',
+            index=models.Index(condition=models.Q(('excluido', True)), fields=['-excluido_em', '-id'], name='ficha_lixeira_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fichainventario',
+            index=models.Index(condition=models.Q(('excluido', True)), fields=['-excluido_em', '-id'], name='fichainventario_lixeira_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0011_indice_lixeira_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chaveidempotencia',
+            name='assinatura',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
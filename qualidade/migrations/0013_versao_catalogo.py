@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0012_assinatura_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão do Catálogo',
+                'verbose_name_plural': 'Versões do Catálogo',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualidade', '0013_versao_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TravaTarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, unique=True)),
+                ('dono', models.CharField(blank=True, max_length=32)),
+                ('ate', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Trava de Tarefa',
+                'verbose_name_plural': 'Travas de Tarefas',
+            },
+        ),
+    ]
@@ -1,5 +1,44 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q, Count, Sum
+from django.db.models.functions import TruncHour
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+
+class ExclusaoLogicaQuerySet(models.QuerySet):
+    """QuerySet dos models com lixeira (campo excluido)"""
+
+    def ativos(self):
+        return self.filter(excluido=False)
+
+    def na_lixeira(self):
+        return self.filter(excluido=True)
+
+
+class AtivosManager(models.Manager.from_queryset(ExclusaoLogicaQuerySet)):
+    """Só o que não está na lixeira. ``objects`` continua com todas as linhas
+    (lixeira, admin, relacionamentos); as telas do dia a dia usam ``ativos``."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(excluido=False)
+
+
+def _indice_ativos(nome, *campos):
+    """Índice parcial só com as linhas fora da lixeira (PostgreSQL e SQLite)"""
+    return models.Index(fields=list(campos), condition=Q(excluido=False), name=nome)
+
+
+def _indice_lixeira(nome):
+    """Índice parcial da lixeira, na ordem em que ela é listada (o id desempata
+    as exclusões no mesmo instante e serve de cursor da paginação)"""
+    return models.Index(fields=['-excluido_em', '-id'], condition=Q(excluido=True), name=nome)
 
 
 class NomeOperador(models.Model):
@@ -11,10 +50,14 @@ class NomeOperador(models.Model):
     excluido_em = models.DateTimeField(null=True, blank=True)
     excluido_por = models.ForeignKey('auth.User', null=True, blank=True, on_delete=models.SET_NULL, related_name='operadores_excluidos')
 
+    objects = ExclusaoLogicaQuerySet.as_manager()
+    ativos = AtivosManager()
+
     class Meta:
         verbose_name = 'Nome do Operador'
         verbose_name_plural = 'Nomes dos Operadores'
         ordering = ['ordem', 'nome']
+        indexes = [_indice_ativos('nomeoperador_ativos_idx', 'ordem', 'nome')]
 
     def __str__(self):
         return self.nome
@@ -29,10 +72,14 @@ class ParteCalcado(models.Model):
     excluido_em = models.DateTimeField(null=True, blank=True)
     excluido_por = models.ForeignKey('auth.User', null=True, blank=True, on_delete=models.SET_NULL, related_name='partes_excluidas')
 
+    objects = ExclusaoLogicaQuerySet.as_manager()
+    ativos = AtivosManager()
+
     class Meta:
         verbose_name = 'Parte do Calçado'
         verbose_name_plural = 'Partes do Calçado'
         ordering = ['ordem', 'nome']
+        indexes = [_indice_ativos('partecalcado_ativos_idx', 'ordem', 'nome')]
 
     def __str__(self):
         return self.nome
@@ -55,10 +102,18 @@ class Ficha(models.Model):
     excluido_em = models.DateTimeField(null=True, blank=True)
     excluido_por = models.ForeignKey(User,null=True,blank=True,on_delete=models.SET_NULL,related_name='fichas_excluidas')
 
+    objects = ExclusaoLogicaQuerySet.as_manager()
+    ativos = AtivosManager()
+
     class Meta:
         verbose_name = 'Ficha'
         verbose_name_plural = 'Fichas'
         ordering = ['-data', '-criada_em']
+        indexes = [
+            _indice_ativos('ficha_ativos_idx', '-data', '-criada_em'),
+            _indice_ativos('ficha_operador_ativos_idx', 'operador', '-data'),
+            _indice_lixeira('ficha_lixeira_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome_ficha} - {self.data} - {self.operador.username}"
@@ -67,14 +122,21 @@ class Ficha(models.Model):
     # Preenche o setor automaticamente com o nome do grupo do usuário
         if not self.setor and self.operador:
             grupo = self.operador.groups.first()
-            print(f"DEBUG - Operador: {self.operador.username}")
-            print(f"DEBUG - Grupo encontrado: {grupo.name if grupo else 'Nenhum'}")
             self.setor = grupo.name if grupo else None
+            logger.debug('ficha_setor', extra={'operador': self.operador.username, 'setor': self.setor})
         super().save(*args, **kwargs)
 
+    @classmethod
+    def tocar(cls, ficha_id):
+        """Atualiza atualizada_em sem passar pelo save (registros alterados em
+        lote): é o que as telas usam para saber se a ficha mudou"""
+        cls.objects.filter(pk=ficha_id).update(atualizada_em=timezone.now())
+
     def excluir(self, usuario):
         """Marca a ficha como excluída e registra quem excluiu"""
         from django.utils import timezone
+        # Tira a produção da ficha do resumo diário antes de marcar a exclusão
+        ProducaoDiaria.registrar_ficha(self, -1)
         self.excluido = True
         self.excluido_em = timezone.now()
         self.excluido_por = usuario
@@ -104,12 +166,406 @@ class RegistroParte(models.Model):
         """Retorna o total das quantidades"""
         return sum(self.quantidades) if self.quantidades else 0
 
-    def adicionar_quantidade(self, quantidade):
-        """Adiciona uma nova quantidade à lista"""
+    def delete(self, *args, **kwargs):
+        """Remover a parte altera a ficha (ver ItemInventario.delete)"""
+        resultado = super().delete(*args, **kwargs)
+        Ficha.tocar(self.ficha_id)
+        return resultado
+
+    def adicionar_quantidade(self, quantidade, usuario=None):
+        """Adiciona uma nova quantidade à lista (e guarda a hora do lançamento)"""
         if not self.quantidades:
             self.quantidades = []
         self.quantidades.append(quantidade)
         self.save()
+        LancamentoParte.objects.create(registro=self, quantidade=quantidade, usuario=usuario)
+
+    def remover_ultima(self):
+        """Tira a última quantidade da lista e retorna o valor removido.
+
+        Toda quantidade nova é gravada com um LancamentoParte, então o último
+        lançamento é o da quantidade removida; só as quantidades lançadas
+        antes de existir a tabela não têm lançamento (ficam no começo da
+        lista). O valor é conferido para não apagar o lançamento de outra.
+        """
+        ultimo = self.lancamentos.order_by('-id').values_list('id', 'quantidade').first()
+        removida = self.quantidades.pop()
+        self.save()
+        if ultimo and ultimo[1] == removida:
+            LancamentoParte.objects.filter(id=ultimo[0]).delete()
+        return removida
+
+
+class ProducaoDiaria(models.Model):
+    """Resumo diário da produção (soma dos RegistroParte por dia/ficha/parte).
+
+    Atualizado a cada lançamento para que relatórios de meses não precisem
+    reler todos os registros. Pode ser refeito com o comando rebuild_rollups.
+    Só conta fichas que não estão na lixeira.
+    """
+    data = models.DateField()
+    setor = models.CharField(max_length=25, blank=True, default='')
+    operador = models.ForeignKey(User, on_delete=models.CASCADE, related_name='producao_diaria')
+    nome_ficha = models.CharField(max_length=200)
+    parte = models.ForeignKey(ParteCalcado, on_delete=models.CASCADE, related_name='producao_diaria')
+    total = models.IntegerField(default=0)
+    lancamentos = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Produção Diária'
+        verbose_name_plural = 'Produção Diária'
+        unique_together = ['data', 'setor', 'operador', 'nome_ficha', 'parte']
+        indexes = [models.Index(fields=['data', 'parte'])]
+
+    def __str__(self):
+        return f"{self.data} - {self.nome_ficha} - {self.parte_id}: {self.total}"
+
+    @classmethod
+    def registrar(cls, ficha, parte_id, total, lancamentos):
+        """Soma (ou subtrai, com valores negativos) um lançamento no resumo do dia"""
+        if ficha.excluido or (not total and not lancamentos):
+            return
+        if lancamentos < 0:
+            # Lançamento desfeito ou parte removida: horas já fechadas mudam
+            LancamentoParte.invalidar_horas(ficha.data)
+
+        chave = {
+            'data': ficha.data,
+            'setor': ficha.setor or '',
+            'operador_id': ficha.operador_id,
+            'nome_ficha': ficha.nome_ficha,
+            'parte_id': parte_id,
+        }
+        cls._somar(chave, total, lancamentos)
+
+    @classmethod
+    def _somar(cls, chave, total, lancamentos):
+        incremento = {
+            'total': F('total') + total,
+            'lancamentos': F('lancamentos') + lancamentos,
+        }
+
+        if cls.objects.filter(**chave).update(**incremento):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(**chave, total=total, lancamentos=lancamentos)
+        except IntegrityError:
+            # Outro lançamento criou a linha ao mesmo tempo
+            cls.objects.filter(**chave).update(**incremento)
+
+    @classmethod
+    def reconstruir(cls, data_inicio=None, data_fim=None):
+        """Refaz o resumo do período a partir dos RegistroParte.
+        Retorna a quantidade de linhas gravadas."""
+        registros = RegistroParte.objects.filter(ficha__excluido=False)
+        resumo = cls.objects.all()
+        if data_inicio:
+            registros = registros.filter(ficha__data__gte=data_inicio)
+            resumo = resumo.filter(data__gte=data_inicio)
+        if data_fim:
+            registros = registros.filter(ficha__data__lte=data_fim)
+            resumo = resumo.filter(data__lte=data_fim)
+
+        linhas = {}
+        valores = registros.values_list(
+            'ficha__data', 'ficha__setor', 'ficha__operador_id', 'ficha__nome_ficha', 'parte_id', 'quantidades'
+        )
+        for data, setor, operador_id, nome_ficha, parte_id, quantidades in valores.iterator(chunk_size=2000):
+            quantidades = quantidades or []
+            if not quantidades:
+                continue
+            chave = (data, setor or '', operador_id, nome_ficha, parte_id)
+            total, lancamentos = linhas.get(chave, (0, 0))
+            linhas[chave] = (total + sum(quantidades), lancamentos + len(quantidades))
+
+        with transaction.atomic():
+            resumo.delete()
+            cls.objects.bulk_create(
+                [
+                    cls(data=data, setor=setor, operador_id=operador_id, nome_ficha=nome_ficha,
+                        parte_id=parte_id, total=total, lancamentos=lancamentos)
+                    for (data, setor, operador_id, nome_ficha, parte_id), (total, lancamentos) in linhas.items()
+                ],
+                batch_size=1000,
+            )
+        return len(linhas)
+
+    @classmethod
+    def registrar_fichas(cls, ficha_ids, sinal):
+        """Como registrar_ficha, para várias fichas de uma vez (restauração em
+        lote): soma os registros por chave e faz uma atualização por chave"""
+        somas = {}
+        datas = set()
+        valores = RegistroParte.objects.filter(ficha_id__in=ficha_ids).values_list(
+            'ficha__data', 'ficha__setor', 'ficha__operador_id', 'ficha__nome_ficha', 'parte_id', 'quantidades'
+        )
+        for data, setor, operador_id, nome_ficha, parte_id, quantidades in valores.iterator(chunk_size=2000):
+            quantidades = quantidades or []
+            if not quantidades:
+                continue
+            chave = (data, setor or '', operador_id, nome_ficha, parte_id)
+            total, lancamentos = somas.get(chave, (0, 0))
+            somas[chave] = (total + sum(quantidades), lancamentos + len(quantidades))
+            datas.add(data)
+
+        for data in datas:
+            LancamentoParte.invalidar_horas(data)
+
+        for (data, setor, operador_id, nome_ficha, parte_id), (total, lancamentos) in somas.items():
+            cls._somar({
+                'data': data,
+                'setor': setor,
+                'operador_id': operador_id,
+                'nome_ficha': nome_ficha,
+                'parte_id': parte_id,
+            }, sinal * total, sinal * lancamentos)
+
+    @classmethod
+    def registrar_ficha(cls, ficha, sinal):
+        """Soma (sinal=1) ou tira (sinal=-1) todos os registros de uma ficha,
+        usado quando a ficha vai para a lixeira ou é restaurada"""
+        for registro in ficha.registros.all():
+            quantidades = registro.quantidades or []
+            cls.registrar(ficha, registro.parte_id, sinal * sum(quantidades), sinal * len(quantidades))
+        LancamentoParte.invalidar_horas(ficha.data)
+
+
+class LancamentoParte(models.Model):
+    """Hora (e autor) de cada quantidade lançada num RegistroParte.
+
+    A lista RegistroParte.quantidades continua sendo a fonte das telas; esta
+    tabela existe para as taxas por hora (telão e relatório de produção), que
+    são somadas no banco por hora de lançamento. Quantidades lançadas antes
+    dela não têm hora e só aparecem nos totais.
+    """
+    registro = models.ForeignKey(RegistroParte, on_delete=models.CASCADE, related_name='lancamentos', db_index=False)
+    quantidade = models.IntegerField()
+    lancado_em = models.DateTimeField(default=timezone.now)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    # Uma hora só é considerada fechada (e vai para o cache) um pouco depois de
+    # terminar, para não perder lançamentos que ainda estavam sendo gravados
+    FOLGA_HORA_FECHADA = timedelta(minutes=1)
+    # Tempo que a soma de uma hora fechada fica no cache (só com o cache
+    # compartilhado: no local de cada processo, invalidar_horas não alcançaria
+    # os outros workers, ver CACHE_COMPARTILHADO em config/settings.py)
+    CACHE_HORA_FECHADA = 7 * 24 * 60 * 60
+
+    class Meta:
+        verbose_name = 'Lançamento de Parte'
+        verbose_name_plural = 'Lançamentos de Partes'
+        indexes = [models.Index(fields=['registro', 'lancado_em'])]
+
+    def __str__(self):
+        return f"{self.registro_id} - {self.quantidade} ({self.lancado_em:%d/%m %H:%M})"
+
+    @staticmethod
+    def _chave_versao(data):
+        return f'producao_hora_versao:{data.isoformat()}'
+
+    @classmethod
+    def _versao(cls, data):
+        # Versão aleatória: se a chave sumir do cache, as somas antigas não voltam
+        chave = cls._chave_versao(data)
+        versao = cache.get(chave)
+        if versao is None:
+            cache.add(chave, secrets.token_hex(4), None)
+            versao = cache.get(chave) or secrets.token_hex(4)
+        return versao
+
+    @classmethod
+    def invalidar_horas(cls, data):
+        """Descarta as somas por hora guardadas das fichas de um dia
+        (depois do commit, para ninguém guardar de novo o que vai mudar)"""
+        chave = cls._chave_versao(data)
+        transaction.on_commit(lambda: cache.delete(chave))
+
+    @classmethod
+    def hora_fechada(cls, momento):
+        """Se a hora de ``momento`` já pode estar no cache de por_hora"""
+        hora = timezone.localtime(momento).replace(minute=0, second=0, microsecond=0)
+        return hora + timedelta(hours=1) + cls.FOLGA_HORA_FECHADA <= timezone.now()
+
+    @classmethod
+    def por_hora(cls, data):
+        """Produção das fichas do dia por nome da ficha e hora de lançamento.
+
+        Retorna {nome_ficha: [(hora, total), ...]} com as horas do próprio dia
+        (lançamentos feitos em outro dia ficam só nos totais). Com
+        CACHE_COMPARTILHADO as horas fechadas vêm do cache e só a hora em
+        andamento (e o que faltar no cache) é somada no banco; sem ele o dia
+        todo é somado a cada chamada.
+        """
+        inicio_dia = timezone.make_aware(datetime.combine(data, time.min))
+        agora = timezone.now()
+        horas = [inicio_dia + timedelta(hours=h) for h in range(24)]
+        horas = [h for h in horas if h <= agora]
+        if not horas:
+            return {}
+
+        chaves = {}
+        if settings.CACHE_COMPARTILHADO:
+            fechadas = [h for h in horas if h + timedelta(hours=1) + cls.FOLGA_HORA_FECHADA <= agora]
+            versao = cls._versao(data)
+            chaves = {h: f'producao_hora:{data.isoformat()}:{versao}:{h.hour}' for h in fechadas}
+        somas = {}
+        em_cache = cache.get_many(list(chaves.values())) if chaves else {}
+        for h, chave in chaves.items():
+            if chave in em_cache:
+                somas[h] = em_cache[chave]
+
+        faltando = [h for h in horas if h not in somas]
+        if faltando:
+            linhas = (
+                cls.objects.filter(
+                    registro__ficha__data=data,
+                    registro__ficha__excluido=False,
+                    lancado_em__gte=faltando[0],
+                    lancado_em__lt=faltando[-1] + timedelta(hours=1),
+                )
+                .annotate(hora=TruncHour('lancado_em'))
+                .values('hora', 'registro__ficha__nome_ficha')
+                .annotate(soma=Sum('quantidade'))
+                .order_by()
+            )
+            lidas = {h: {} for h in faltando}
+            for linha in linhas:
+                if linha['hora'] in lidas:
+                    lidas[linha['hora']][linha['registro__ficha__nome_ficha']] = linha['soma']
+            somas.update(lidas)
+            if chaves:
+                cache.set_many(
+                    {chaves[h]: lidas[h] for h in faltando if h in chaves},
+                    cls.CACHE_HORA_FECHADA,
+                )
+
+        resultado = {}
+        for h in horas:
+            for nome_ficha, total in somas[h].items():
+                resultado.setdefault(nome_ficha, []).append((timezone.localtime(h), total))
+        return resultado
+
+    @classmethod
+    def ritmo_por_registro(cls, registro_ids):
+        """{registro_id: peças por hora} contando só as horas com lançamento"""
+        linhas = (
+            cls.objects.filter(registro_id__in=registro_ids)
+            .values('registro_id')
+            .annotate(soma=Sum('quantidade'), horas=Count(TruncHour('lancado_em'), distinct=True))
+            .order_by()
+        )
+        return {linha['registro_id']: round(linha['soma'] / linha['horas']) for linha in linhas if linha['horas']}
+
+
+class LancamentoOffline(models.Model):
+    """Lançamento recebido pela sincronização do modo offline dos tablets.
+
+    Guarda o UUID gerado no tablet para que reenvios do mesmo lote não
+    sejam somados duas vezes no RegistroParte.
+    """
+    uuid = models.UUIDField(unique=True)
+    registro = models.ForeignKey(RegistroParte, on_delete=models.CASCADE, related_name='lancamentos_offline')
+    quantidade = models.IntegerField()
+    recebido_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Lançamento Offline'
+        verbose_name_plural = 'Lançamentos Offline'
+
+    def __str__(self):
+        return f"{self.uuid} - {self.quantidade}"
+
+
+class ChaveIdempotencia(models.Model):
+    """Resposta guardada de uma requisição com chave de idempotência.
+
+    Um reenvio com a mesma chave (Wi-Fi instável, duplo clique) recebe a
+    resposta original em vez de repetir o lançamento. Ver qualidade/idempotencia.py.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chaves_idempotencia')
+    chave = models.CharField(max_length=64)
+    caminho = models.CharField(max_length=255)
+    # SHA-256 do corpo: a mesma chave com outro conteúdo é recusada
+    assinatura = models.CharField(max_length=64, blank=True)
+    status = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=255, blank=True)
+    conteudo = models.BinaryField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Chave de Idempotência'
+        verbose_name_plural = 'Chaves de Idempotência'
+        unique_together = ['usuario', 'chave']
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.chave}"
+
+
+class TravaTarefa(models.Model):
+    """Trava de tarefa de manutenção entre processos (ex.: expiração da lixeira).
+
+    Cada worker do gunicorn/uvicorn tem seu próprio cache local, então a trava
+    fica no banco: pegar é um UPDATE condicional (ou o INSERT da primeira vez),
+    que só um processo consegue. Vale até ``ate``; se o dono morrer no meio,
+    ela se solta sozinha.
+    """
+    nome = models.CharField(max_length=100, unique=True)
+    dono = models.CharField(max_length=32, blank=True)
+    ate = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Trava de Tarefa'
+        verbose_name_plural = 'Travas de Tarefas'
+
+    def __str__(self):
+        return f"{self.nome} - {self.ate}"
+
+    @classmethod
+    def pegar(cls, nome, segundos):
+        """Pega a trava por ``segundos``. Retorna o dono (para soltar) ou None
+        se outro processo estiver com ela."""
+        agora = timezone.now()
+        valores = {'dono': secrets.token_hex(8), 'ate': agora + timedelta(seconds=segundos)}
+        if cls.objects.filter(nome=nome, ate__lte=agora).update(**valores):
+            return valores['dono']
+        try:
+            with transaction.atomic():
+                cls.objects.create(nome=nome, **valores)
+        except IntegrityError:
+            # Já existe e ainda vale
+            return None
+        return valores['dono']
+
+    @classmethod
+    def soltar(cls, nome, dono):
+        cls.objects.filter(nome=nome, dono=dono).update(ate=timezone.now())
+
+
+def gerar_token_quiosque():
+    return secrets.token_urlsafe(32)
+
+
+class TokenQuiosque(models.Model):
+    """Token de leitura para os telões (tela de produção).
+
+    A TV abre /telas/?token=... sem login e sem sessão. O token só dá acesso
+    às telas; para revogar basta desativar. Ver qualidade/quiosque.py.
+    """
+    nome = models.CharField(max_length=100, verbose_name="Nome do Telão")
+    token = models.CharField(max_length=64, unique=True, default=gerar_token_quiosque, editable=False)
+    ativo = models.BooleanField(default=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    criado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='tokens_quiosque')
+
+    class Meta:
+        verbose_name = 'Token de Quiosque'
+        verbose_name_plural = 'Tokens de Quiosque'
+        ordering = ['nome']
+
+    def __str__(self):
+        return self.nome
 
 
 class PerfilUsuario(models.Model):
@@ -143,6 +599,12 @@ class Cor(models.Model):
     criado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='cores_criadas')
     excluido_por = models.ForeignKey(User,null=True,blank=True,on_delete=models.SET_NULL,related_name='cores_excluidas')
 
+    objects = ExclusaoLogicaQuerySet.as_manager()
+    ativos = AtivosManager()
+
+    class Meta:
+        indexes = [_indice_ativos('cor_ativos_idx', 'ordem', 'nome')]
+
     def __str__(self):
         return self.nome
 
@@ -156,11 +618,15 @@ class ModeloCalcado(models.Model):
     criado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='modelos_criados')
     excluido_por = models.ForeignKey(User,null=True,blank=True,on_delete=models.SET_NULL,related_name='modelos_excluidas')
     cores = models.ManyToManyField(Cor, related_name='modelos')
-    
+
+    objects = ExclusaoLogicaQuerySet.as_manager()
+    ativos = AtivosManager()
+
     class Meta:
         verbose_name = 'Modelo de Calçado'
         verbose_name_plural = 'Modelos de Calçado'
         ordering = ['nome']
+        indexes = [_indice_ativos('modelocalcado_ativos_idx', 'nome')]
     
     def __str__(self):
         return self.nome
@@ -172,33 +638,62 @@ class TamanhoModelo(models.Model):
     numero = models.CharField(max_length=10, verbose_name="Número/Tamanho")
     ativo = models.BooleanField(default=True)
     excluido = models.BooleanField(default=False)
-    
+
+    objects = ExclusaoLogicaQuerySet.as_manager()
+    ativos = AtivosManager()
+
     class Meta:
         verbose_name = 'Tamanho do Modelo'
         verbose_name_plural = 'Tamanhos dos Modelos'
         ordering = ['numero']
         unique_together = ['modelo', 'cor', 'numero']
+        indexes = [_indice_ativos('tamanhomodelo_ativos_idx', 'modelo', 'cor', 'numero')]
     
     def __str__(self):
         return f"{self.modelo.nome} - {self.cor.nome} - {self.numero}"
 
 
+class VersaoCatalogo(models.Model):
+    """Contador de alterações do catálogo (linha única, pk=1).
+    Fica no banco para que todos os processos vejam a mesma versão
+    (ver qualidade/catalogo.py)"""
+    versao = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Versão do Catálogo'
+        verbose_name_plural = 'Versões do Catálogo'
+
+    def __str__(self):
+        return str(self.versao)
+
+
+# Nome do grupo (setor) da Injetora, como é criado em signals.GRUPOS_PADRAO
+GRUPO_INJETORA = 'Injetora'
+
+
 class FichaInventario(models.Model):
     """Ficha de inventário para setor INJETORA"""
     operador = models.ForeignKey(User, on_delete=models.CASCADE, related_name='fichas_inventario')
     data = models.DateField()
     nome_ficha = models.CharField(max_length=200)
-    setor = models.CharField(max_length=50, default='Injetora')
+    setor = models.CharField(max_length=50, default=GRUPO_INJETORA)
     criada_em = models.DateTimeField(auto_now_add=True)
     atualizada_em = models.DateTimeField(auto_now=True)
     excluido = models.BooleanField(default=False)
     excluido_em = models.DateTimeField(null=True, blank=True)
     excluido_por = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='fichas_inventario_excluidas')
-    
+
+    objects = ExclusaoLogicaQuerySet.as_manager()
+    ativos = AtivosManager()
+
     class Meta:
         verbose_name = 'Ficha de Inventário'
         verbose_name_plural = 'Fichas de Inventário'
         ordering = ['-data', '-criada_em']
+        indexes = [
+            _indice_ativos('fichainventario_ativos_idx', '-data', '-criada_em'),
+            _indice_lixeira('fichainventario_lixeira_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nome_ficha} - {self.data} - {self.operador.username}"
@@ -206,9 +701,14 @@ class FichaInventario(models.Model):
     def save(self, *args, **kwargs):
         if not self.setor and self.operador:
             grupo = self.operador.groups.first()
-            self.setor = grupo.name if grupo else 'Injetora'
+            self.setor = grupo.name if grupo else GRUPO_INJETORA
         super().save(*args, **kwargs)
 
+    @classmethod
+    def tocar(cls, ficha_id):
+        """Atualiza atualizada_em sem passar pelo save (ver Ficha.tocar)"""
+        cls.objects.filter(pk=ficha_id).update(atualizada_em=timezone.now())
+
     def model_name(self):
         return self._meta.model_name
     @property
@@ -236,6 +736,16 @@ class ItemInventario(models.Model):
     
     def __str__(self):
         return f"{self.modelo.nome} - {self.cor.nome} - Nº{self.tamanho.numero} - {self.quantidade} pares"
+
+    def delete(self, *args, **kwargs):
+        """Apagar um item altera a ficha e a posição de estoque. Fica aqui e
+        não num post_delete: com receiver de delete o Django não apaga os
+        itens em lote quando a ficha inteira é apagada (lixeira)."""
+        from .estoque import invalidar
+        resultado = super().delete(*args, **kwargs)
+        FichaInventario.tocar(self.ficha_id)
+        invalidar()
+        return resultado
     
     @property
     def total_pares(self):
@@ -274,13 +784,81 @@ class LogMovimentacaoV2(models.Model):
     ficha = models.ForeignKey(FichaInventario, on_delete=models.CASCADE, related_name='movimentacoes', null=True)
     
     identificacao_item = models.CharField(max_length=255, blank=True, null=True)
+    # Modelo/cor/número do item: continua preenchido depois que o item é apagado
+    # (o item vira NULL), para refazer o estoque de uma data (qualidade/estoque.py)
+    tamanho = models.ForeignKey(TamanhoModelo, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
 
     operador = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True)
     acao = models.CharField(max_length=10, choices=ACOES)
     lado = models.CharField(max_length=2, choices=LADOS)
     quantidade_movimentada = models.IntegerField()
     saldo_momento = models.IntegerField(help_text="Saldo total do item após a ação")
+    # Saldo de cada lado antes e depois da ação (vazio nos logs antigos), para
+    # refazer e conferir o histórico lado a lado (comando reconcile_inventario)
+    saldo_pd_antes = models.IntegerField(null=True, blank=True)
+    saldo_pe_antes = models.IntegerField(null=True, blank=True)
+    saldo_pd_depois = models.IntegerField(null=True, blank=True)
+    saldo_pe_depois = models.IntegerField(null=True, blank=True)
     criado_em = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-criado_em']   
\ No newline at end of file
+        ordering = ['-criado_em']
+        indexes = [models.Index(fields=['ficha', 'criado_em'])]
+
+    @classmethod
+    def registrar(cls, item, operador, acao, lado, quantidade, antes, **extras):
+        """Grava a movimentação de um lado do item.
+
+        ``antes`` é (pé direito, pé esquerdo) antes da ação; retorna o par
+        depois dela, para encadear os logs de uma mesma operação.
+        """
+        delta = quantidade if acao == 'adicionar' else -quantidade
+        pd, pe = antes
+        depois = (pd + delta, pe) if lado == 'PD' else (pd, pe + delta)
+        cls.objects.create(
+            ficha_id=item.ficha_id,
+            item=item,
+            tamanho_id=item.tamanho_id,
+            operador=operador,
+            acao=acao,
+            lado=lado,
+            quantidade_movimentada=quantidade,
+            saldo_momento=depois[0] + depois[1],
+            saldo_pd_antes=pd,
+            saldo_pe_antes=pe,
+            saldo_pd_depois=depois[0],
+            saldo_pe_depois=depois[1],
+            **extras,
+        )
+        return depois
+
+
+class CheckpointInventario(models.Model):
+    """Foto dos saldos de todos os itens de inventário num momento.
+
+    O estoque de uma data é refeito a partir do checkpoint mais próximo e só
+    das movimentações entre os dois, em vez de todo o histórico. Criado pelo
+    comando checkpoint_inventario (rodar periodicamente, ex. todo dia no cron).
+    """
+    momento = models.DateTimeField(unique=True)
+    itens = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Checkpoint de Inventário'
+        verbose_name_plural = 'Checkpoints de Inventário'
+        ordering = ['-momento']
+
+    def __str__(self):
+        return f"{self.momento:%d/%m/%Y %H:%M} ({self.itens} itens)"
+
+
+class SaldoCheckpoint(models.Model):
+    """Saldo de cada lado de um item (ficha + tamanho) num checkpoint"""
+    checkpoint = models.ForeignKey(CheckpointInventario, on_delete=models.CASCADE, related_name='saldos')
+    ficha = models.ForeignKey(FichaInventario, on_delete=models.CASCADE, related_name='+')
+    tamanho = models.ForeignKey(TamanhoModelo, on_delete=models.CASCADE, related_name='+')
+    pe_direito = models.IntegerField(default=0)
+    pe_esquerdo = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['checkpoint', 'ficha', 'tamanho']   
\ No newline at end of file
@@ -0,0 +1,51 @@
+# qualidade/quiosque.py
+"""
+Acesso dos telões (modo quiosque) por token, sem login e sem sessão.
+
+A TV abre a tela com ``?token=<token>`` (ou o cabeçalho ``X-Quiosque-Token``).
+O token é só de leitura: o decorator ``login_ou_quiosque`` é usado apenas nas
+views das telas. Como a requisição não toca em request.session nem em
+request.user, o telão não cria nem atualiza linhas de sessão a cada refresh.
+"""
+from functools import wraps
+
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+
+from .models import TokenQuiosque
+
+CABECALHO = 'HTTP_X_QUIOSQUE_TOKEN'
+PARAMETRO = 'token'
+
+# Segundos que um token válido fica no cache (desativar um token leva até isso)
+CACHE_TOKEN_SEGUNDOS = 60
+
+
+def _token_da_requisicao(request):
+    token = request.META.get(CABECALHO) or request.GET.get(PARAMETRO)
+    return token.strip()[:64] if token else None
+
+
+def token_valido(token):
+    chave = f'quiosque_token:{token}'
+    valido = cache.get(chave)
+    if valido is None:
+        valido = TokenQuiosque.objects.filter(token=token, ativo=True).exists()
+        cache.set(chave, valido, CACHE_TOKEN_SEGUNDOS)
+    return valido
+
+
+def login_ou_quiosque(view_func):
+    """Como login_required, mas também aceita um token de quiosque ativo"""
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        token = _token_da_requisicao(request)
+        if token and token_valido(token):
+            request.token_quiosque = token
+            return view_func(request, *args, **kwargs)
+        request.token_quiosque = None
+        if request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+
+    return _wrapped
@@ -1,9 +1,17 @@
-from django.db.models.signals import post_migrate
+import logging
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.core.cache import cache
+from django.db.models.signals import post_migrate, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import Group, User
 from django.contrib.auth.hashers import make_password
 from django.apps import apps # Importante para verificar se o model existe
 
+logger = logging.getLogger(__name__)
+
 # removi o "from .models import PerfilUsuario" do topo para evitar importação precoce
 # importar dentro da função para garantir que o Django já carregou tudo.
 
@@ -27,11 +35,12 @@ def criar_dados_iniciais(sender, **kwargs):
     except LookupError:
         return
 
-    print("Iniciando criação de dados padrões...")
+    grupos_criados = usuarios_criados = 0
 
     # 🔹 Criar grupos
     for nome_grupo in GRUPOS_PADRAO:
-        Group.objects.get_or_create(name=nome_grupo)
+        _, created = Group.objects.get_or_create(name=nome_grupo)
+        grupos_criados += created
 
     # 🔹 Criar usuários e perfis
     for user_data in USUARIOS_PADRAO:
@@ -42,6 +51,7 @@ def criar_dados_iniciais(sender, **kwargs):
                 'is_active': True
             }
         )
+        usuarios_criados += created
 
         # 🔹 Adicionar ao grupo
         grupo = Group.objects.get(name=user_data['grupo'])
@@ -50,4 +60,123 @@ def criar_dados_iniciais(sender, **kwargs):
         # 🔹 Perfil (com verificação)
         PerfilUsuario.objects.get_or_create(user=user)
     
-    print("Dados padrões verificados/criados com sucesso!")
\ No newline at end of file
+    # Só avisa quando criou algo; nos outros migrate é DEBUG
+    logger.log(
+        logging.INFO if grupos_criados or usuarios_criados else logging.DEBUG,
+        'dados_iniciais',
+        extra={'grupos_criados': grupos_criados, 'usuarios_criados': usuarios_criados},
+    )
+
+
+@receiver(post_migrate)
+def instalar_busca(sender, using='default', **kwargs):
+    """Cria ou repara os índices da busca global (ver qualidade/busca.py)"""
+    if sender.name != 'qualidade':
+        return
+
+    from django.db import connections
+    from .busca import instalar
+    instalar(connections[using])
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    """Aplica os PRAGMAs do perfil SQLite de produção a cada nova conexão"""
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_OTIMIZADO', False):
+        return
+
+    with connection.cursor() as cursor:
+        # WAL deixa leitores e o escritor trabalharem ao mesmo tempo
+        cursor.execute('PRAGMA journal_mode=WAL;')
+        # Espera o lock em vez de estourar "database is locked" na hora
+        cursor.execute(f'PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)};')
+        # Em WAL, NORMAL é seguro contra corrupção e evita um fsync por commit
+        cursor.execute('PRAGMA synchronous=NORMAL;')
+        cursor.execute(f'PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)};')
+
+
+# 🔹 Invalidação do contexto do usuário (request.ctx, ver qualidade/middleware.py)
+
+def _invalidar_contexto(*user_ids):
+    from .middleware import chave_versao
+    for user_id in user_ids:
+        cache.set(chave_versao(user_id), time.time_ns(), None)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def grupos_usuario_alterados(sender, instance, action, reverse, pk_set, **kwargs):
+    # No clear os vínculos ainda existem antes da ação, depois não há mais como achá-los
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # group.user_set.add(...): instance é o grupo e pk_set os usuários
+        user_ids = pk_set or instance.user_set.values_list('id', flat=True)
+        _invalidar_contexto(*user_ids)
+    else:
+        _invalidar_contexto(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def grupo_alterado(sender, instance, **kwargs):
+    _invalidar_contexto(*instance.user_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender='qualidade.PerfilUsuario')
+@receiver(post_delete, sender='qualidade.PerfilUsuario')
+def perfil_alterado(sender, instance, **kwargs):
+    _invalidar_contexto(instance.user_id)
+
+
+# 🔹 Invalidação da posição de estoque (qualidade/estoque.py)
+
+# Item apagado: ItemInventario.delete (sem post_delete, para a exclusão das
+# fichas continuar em lote)
+@receiver(post_save, sender='qualidade.ItemInventario')
+@receiver(post_save, sender='qualidade.FichaInventario')
+@receiver(post_delete, sender='qualidade.FichaInventario')
+@receiver(post_save, sender='qualidade.ModeloCalcado')
+@receiver(post_save, sender='qualidade.Cor')
+@receiver(post_save, sender='qualidade.TamanhoModelo')
+def estoque_alterado(sender, **kwargs):
+    from .estoque import invalidar
+    invalidar()
+
+
+# 🔹 Versão do catálogo para o cache de fragmentos (qualidade/catalogo.py).
+# Só post_save: o cadastro vai para a lixeira por save (o que já troca a
+# versão) e a exclusão permanente chama invalidar() uma vez (lixeira._apagar
+# e as views das lixeiras). Um receiver de post_delete faria o Django
+# carregar e apagar um a um os tamanhos que saem em cascata.
+
+@receiver(post_save, sender='qualidade.ModeloCalcado')
+@receiver(post_save, sender='qualidade.Cor')
+@receiver(post_save, sender='qualidade.TamanhoModelo')
+@receiver(post_save, sender='qualidade.ParteCalcado')
+def catalogo_alterado(sender, **kwargs):
+    from .catalogo import invalidar
+    invalidar()
+
+
+@receiver(m2m_changed, sender='qualidade.ModeloCalcado_cores')
+def cores_do_modelo_alteradas(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        from .catalogo import invalidar
+        invalidar()
+
+
+# 🔹 Alterar item/registro conta como alteração da ficha (GET condicional,
+# qualidade/condicional.py). Os deletes tocam a ficha em RegistroParte.delete
+# e ItemInventario.delete: um receiver de post_delete faria o Django carregar
+# linha por linha os registros/itens de cada ficha apagada pela lixeira.
+
+@receiver(post_save, sender='qualidade.RegistroParte')
+def registro_alterado(sender, instance, **kwargs):
+    Ficha = apps.get_model('qualidade', 'Ficha')
+    Ficha.tocar(instance.ficha_id)
+
+
+@receiver(post_save, sender='qualidade.ItemInventario')
+def item_inventario_alterado(sender, instance, **kwargs):
+    FichaInventario = apps.get_model('qualidade', 'FichaInventario')
+    FichaInventario.tocar(instance.ficha_id)
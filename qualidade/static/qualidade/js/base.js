@@ -0,0 +1,69 @@
+// Formulários dentro de blocos em cache (tag csrf_fragmento) recebem o token CSRF desta página
+(function () {
+    const campos = document.querySelectorAll('[data-csrf-fragmento]');
+    if (!campos.length) return;
+    const daPagina = document.querySelector('input[name="csrfmiddlewaretoken"]:not([data-csrf-fragmento])');
+    const doCookie = document.cookie.split('; ').find(function (c) { return c.startsWith('csrftoken='); });
+    const token = daPagina ? daPagina.value : (doCookie ? doCookie.split('=')[1] : '');
+    campos.forEach(function (campo) { campo.value = token; });
+})();
+
+// Busca global: consulta a API enquanto digita (com atraso curto)
+(function () {
+    const campo = document.getElementById('busca-global');
+    const lista = document.getElementById('busca-resultados');
+    let espera = null;
+    let controle = null;
+
+    function fechar() {
+        lista.style.display = 'none';
+    }
+
+    function mostrar(dados) {
+        lista.replaceChildren();
+        if (!dados.resultados.length) {
+            const vazio = document.createElement('a');
+            vazio.textContent = 'Nada encontrado';
+            lista.appendChild(vazio);
+        }
+        for (const r of dados.resultados) {
+            const link = document.createElement('a');
+            link.href = r.url;
+            link.textContent = r.nome;
+            const detalhe = document.createElement('small');
+            detalhe.textContent = r.detalhe;
+            link.appendChild(detalhe);
+            lista.appendChild(link);
+        }
+        lista.style.display = 'block';
+    }
+
+    campo.addEventListener('input', function () {
+        clearTimeout(espera);
+        const termo = campo.value.trim();
+        if (termo.length < 2) {
+            fechar();
+            return;
+        }
+        espera = setTimeout(function () {
+            if (controle) controle.abort();
+            controle = new AbortController();
+            fetch(campo.dataset.url + "?q=" + encodeURIComponent(termo), {signal: controle.signal})
+                .then(function (resposta) { return resposta.json(); })
+                .then(mostrar)
+                .catch(function () {});
+        }, 150);
+    });
+
+    campo.addEventListener('keydown', function (evento) {
+        if (evento.key === 'Escape') fechar();
+        if (evento.key === 'Enter') {
+            const primeiro = lista.querySelector('a[href]');
+            if (primeiro) window.location = primeiro.href;
+        }
+    });
+
+    document.addEventListener('click', function (evento) {
+        if (!evento.target.closest('.busca-global')) fechar();
+    });
+})();
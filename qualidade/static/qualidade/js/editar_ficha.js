@@ -0,0 +1,509 @@
+const FICHA_ID = Number(document.currentScript.dataset.fichaId);
+
+// Função melhorada para obter o CSRF token
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+// Obter CSRF token do cookie ou do template
+function getCSRFToken() {
+    let token = getCookie('csrftoken');
+    if (!token) {
+        const csrfInput = document.querySelector('[name=csrfmiddlewaretoken]');
+        if (csrfInput) {
+            token = csrfInput.value;
+        }
+    }
+    return token;
+}
+
+// Chave de idempotência por ação do usuário (ex.: remover a última quantidade
+// da parte 3): a mesma até a ação dar certo. Um toque repetido ou um reenvio
+// depois de uma queda do Wi-Fi leva a mesma chave, e o servidor devolve a
+// resposta da primeira vez em vez de aplicar de novo.
+const chavesPendentes = {};
+
+function chaveDaAcao(acao) {
+    if (!chavesPendentes[acao]) {
+        chavesPendentes[acao] = gerarUUID();
+    }
+    return chavesPendentes[acao];
+}
+
+function concluirAcao(acao) {
+    delete chavesPendentes[acao];
+}
+
+// Adicionar nova parte à ficha
+async function adicionarNovaParte() {
+    const select = document.getElementById('select-nova-parte');
+    const parteId = select.value;
+
+    if (!parteId) {
+        alert('Selecione uma parte');
+        return;
+    }
+
+    const parteNome = select.options[select.selectedIndex].text;
+    const csrfToken = getCSRFToken();
+    const acao = `adicionar-parte:${parteId}`;
+
+    try {
+        const response = await fetch(`/ficha/${FICHA_ID}/adicionar-parte/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken,
+                'Idempotency-Key': chaveDaAcao(acao)
+            },
+            body: JSON.stringify({ parte_id: parteId })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            concluirAcao(acao);
+            // Remover mensagem de "nenhuma parte"
+            const noPartesMsg = document.getElementById('no-partes-message');
+            if (noPartesMsg) {
+                noPartesMsg.remove();
+            }
+
+            // Criar container se não existir
+            let container = document.getElementById('partes-container');
+            if (!container) {
+                container = document.createElement('div');
+                container.id = 'partes-container';
+                container.className = 'partes-container';
+                document.querySelector('.add-parte-section').insertAdjacentElement('afterend', container);
+            }
+
+            // Adicionar card da parte
+            adicionarParteCard(data.parte_id, data.parte_nome);
+
+            // Remover opção do select
+            select.querySelector(`option[value="${parteId}"]`).remove();
+            select.value = '';
+
+            alert(`Parte "${data.parte_nome}" adicionada com sucesso!`);
+        } else {
+            alert(data.error || 'Erro ao adicionar parte');
+        }
+    } catch (error) {
+        console.error('Erro:', error);
+        alert('Erro ao adicionar parte. Verifique sua conexão.');
+    }
+}
+
+// Adicionar card HTML da parte
+function adicionarParteCard(parteId, parteNome) {
+    const container = document.getElementById('partes-container');
+
+    const cardHTML = `
+        <div class="parte-card" id="parte-card-${parteId}">
+            <div class="parte-header">
+                <div class="parte-title-row">
+                    <div class="parte-nome">${parteNome}</div>
+                    <button type="button" class="btn-remove-parte" onclick="removerParteCard(${parteId}, '${parteNome}')">
+                        🗑️ Remover
+                    </button>
+                </div>
+                <div class="parte-total" id="total-${parteId}">
+                    Total: 0
+                </div>
+            </div>
+
+            <div class="quantidades-list" id="lista-${parteId}">
+                <div class="empty-state" id="empty-${parteId}">
+                    Nenhuma quantidade adicionada
+                </div>
+            </div>
+
+            <div class="input-group">
+                <input type="number" 
+                       class="quantidade-input" 
+                       id="input-${parteId}"
+                       placeholder="Digite a quantidade"
+                       min="1"
+                       step="1"
+                       inputmode="numeric">
+                <button type="button" class="btn-add" onclick="adicionarQuantidade(${parteId})">
+                    ➕
+                </button>
+            </div>
+        </div>
+    `;
+
+    container.insertAdjacentHTML('beforeend', cardHTML);
+
+    // Adicionar event listener de Enter no novo input
+    const novoInput = document.getElementById(`input-${parteId}`);
+    if (novoInput) {
+        adicionarEventoEnter(novoInput);
+    }
+}
+
+// Remover parte da ficha
+async function removerParteCard(parteId, parteNome) {
+    if (!confirm(`Tem certeza que deseja remover a parte "${parteNome}"? Todas as quantidades serão perdidas.`)) {
+        return;
+    }
+
+    const csrfToken = getCSRFToken();
+    const acao = `remover-parte:${parteId}`;
+
+    try {
+        const response = await fetch(`/ficha/${FICHA_ID}/remover-parte/${parteId}/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken,
+                'Idempotency-Key': chaveDaAcao(acao)
+            }
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            concluirAcao(acao);
+            // Descartar lançamentos da parte que ainda estavam na fila
+            await outboxRemover((pendentesPorParte[parteId] || []).map(l => l.uuid));
+            delete pendentesPorParte[parteId];
+            delete quantidadesServidor[parteId];
+
+            // Remover card
+            document.getElementById(`parte-card-${parteId}`).remove();
+
+            // Adicionar de volta ao select
+            const select = document.getElementById('select-nova-parte');
+            const option = document.createElement('option');
+            option.value = parteId;
+            option.textContent = parteNome;
+            select.appendChild(option);
+
+            // Verificar se não tem mais partes
+            const container = document.getElementById('partes-container');
+            if (container && container.children.length === 0) {
+                container.remove();
+                const addSection = document.querySelector('.add-parte-section');
+                addSection.insertAdjacentHTML('afterend', `
+                    <div class="no-partes-message" id="no-partes-message">
+                        <div style="font-size: 48px; margin-bottom: 15px;">📦</div>
+                        <h3 style="color: #374151; margin-bottom: 10px;">Nenhuma parte adicionada</h3>
+                        <p>Use o botão "Adicionar Parte" acima para começar</p>
+                    </div>
+                `);
+            }
+        } else {
+            alert(data.error || 'Erro ao remover parte');
+        }
+    } catch (error) {
+        console.error('Erro:', error);
+        alert('Erro ao remover parte. Verifique sua conexão.');
+    }
+}
+
+// =====================================================
+// MODO OFFLINE
+// Cada lançamento vai para uma fila (outbox) no IndexedDB com um UUID
+// gerado no tablet e é enviado em lotes para /sincronizar/. O servidor
+// ignora UUIDs já recebidos, então reenviar o mesmo lote não duplica nada.
+// =====================================================
+const TAMANHO_LOTE = 500;
+const INTERVALO_SINCRONIZACAO = 15000;
+
+// Quantidades já gravadas no servidor, por parte (só existe para quem pode editar)
+const elQuantidadesServidor = document.getElementById('quantidades-servidor');
+const quantidadesServidor = elQuantidadesServidor ? JSON.parse(elQuantidadesServidor.textContent) : {};
+// Lançamentos ainda na fila, por parte (espelho do IndexedDB para desenhar a tela)
+const pendentesPorParte = {};
+let sincronizando = false;
+
+function gerarUUID() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    // crypto.randomUUID só existe em HTTPS; na rede da fábrica usamos getRandomValues
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    bytes[6] = (bytes[6] & 0x0f) | 0x40;
+    bytes[8] = (bytes[8] & 0x3f) | 0x80;
+    const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+// --- Outbox no IndexedDB (com fallback em memória) ---
+let outboxMemoria = [];
+const outboxDB = new Promise(resolve => {
+    if (!window.indexedDB) {
+        resolve(null);
+        return;
+    }
+    const req = indexedDB.open('gestor-producao', 1);
+    req.onupgradeneeded = () => {
+        const store = req.result.createObjectStore('outbox', { keyPath: 'uuid' });
+        store.createIndex('ficha_id', 'ficha_id');
+    };
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => resolve(null);
+});
+
+async function outboxListar() {
+    const db = await outboxDB;
+    if (!db) {
+        return outboxMemoria.filter(l => l.ficha_id === FICHA_ID);
+    }
+    return new Promise((resolve, reject) => {
+        const req = db.transaction('outbox').objectStore('outbox').index('ficha_id').getAll(FICHA_ID);
+        req.onsuccess = () => resolve(req.result.sort((a, b) => a.criado_em - b.criado_em));
+        req.onerror = () => reject(req.error);
+    });
+}
+
+async function outboxGravar(lancamento) {
+    const db = await outboxDB;
+    if (!db) {
+        outboxMemoria.push(lancamento);
+        return;
+    }
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction('outbox', 'readwrite');
+        tx.objectStore('outbox').put(lancamento);
+        tx.oncomplete = () => resolve();
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
+async function outboxRemover(uuids) {
+    const db = await outboxDB;
+    if (!db) {
+        const remover = new Set(uuids);
+        outboxMemoria = outboxMemoria.filter(l => !remover.has(l.uuid));
+        return;
+    }
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction('outbox', 'readwrite');
+        const store = tx.objectStore('outbox');
+        uuids.forEach(uuid => store.delete(uuid));
+        tx.oncomplete = () => resolve();
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
+async function recarregarPendentes() {
+    const lancamentos = await outboxListar();
+    Object.keys(pendentesPorParte).forEach(k => delete pendentesPorParte[k]);
+    lancamentos.forEach(l => {
+        (pendentesPorParte[l.parte_id] = pendentesPorParte[l.parte_id] || []).push(l);
+    });
+    atualizarStatus(lancamentos.length);
+    return lancamentos;
+}
+
+function atualizarStatus(qtdPendentes) {
+    const status = document.getElementById('status-sync');
+    if (!status) return;
+    if (qtdPendentes > 0) {
+        status.classList.add('offline');
+        status.textContent = `⏳ ${qtdPendentes} lançamento(s) aguardando sincronização`;
+    } else {
+        status.classList.remove('offline');
+        status.textContent = '✅ Sincronizado';
+    }
+}
+
+function redesenharParte(parteId) {
+    const servidor = quantidadesServidor[parteId] || [];
+    const pendentes = (pendentesPorParte[parteId] || []).map(l => l.quantidade);
+    atualizarLista(parteId, servidor, null, pendentes);
+}
+
+// Envia a fila em lotes; o que não foi aceito continua na fila para a próxima tentativa
+async function sincronizarOutbox() {
+    if (sincronizando) return;
+    sincronizando = true;
+
+    try {
+        let lancamentos = await recarregarPendentes();
+
+        while (lancamentos.length > 0 && navigator.onLine !== false) {
+            const lote = lancamentos.slice(0, TAMANHO_LOTE);
+            const response = await fetch(`/ficha/${FICHA_ID}/sincronizar/`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCSRFToken()
+                },
+                body: JSON.stringify({
+                    lancamentos: lote.map(l => ({ uuid: l.uuid, parte_id: l.parte_id, quantidade: l.quantidade, criado_em: l.criado_em }))
+                })
+            });
+
+            if (!response.ok) break;
+
+            const data = await response.json();
+            if (data.rejeitados && data.rejeitados.length) {
+                console.warn('Lançamentos rejeitados pelo servidor:', data.rejeitados);
+            }
+            await outboxRemover([...data.aceitos, ...data.rejeitados.filter(Boolean)]);
+
+            Object.entries(data.registros).forEach(([parteId, registro]) => {
+                quantidadesServidor[parteId] = registro.quantidades;
+            });
+
+            lancamentos = lancamentos.slice(TAMANHO_LOTE);
+        }
+    } catch (error) {
+        // Sem conexão: os lançamentos continuam na fila
+        console.log('Sincronização adiada:', error);
+    } finally {
+        await recarregarPendentes();
+        Object.keys(quantidadesServidor).forEach(redesenharParte);
+        Object.keys(pendentesPorParte).forEach(redesenharParte);
+        sincronizando = false;
+    }
+}
+
+async function adicionarQuantidade(parteId) {
+    const input = document.getElementById(`input-${parteId}`);
+    const quantidade = parseInt(input.value);
+
+    if (!quantidade || quantidade <= 0) {
+        alert('Digite uma quantidade válida');
+        return;
+    }
+
+    const lancamento = {
+        uuid: gerarUUID(),
+        ficha_id: FICHA_ID,
+        parte_id: parseInt(parteId),
+        quantidade,
+        criado_em: Date.now()
+    };
+
+    // Grava na fila primeiro: o toque é instantâneo mesmo sem Wi-Fi
+    await outboxGravar(lancamento);
+    (pendentesPorParte[lancamento.parte_id] = pendentesPorParte[lancamento.parte_id] || []).push(lancamento);
+    redesenharParte(lancamento.parte_id);
+    atualizarStatus(Object.values(pendentesPorParte).reduce((n, l) => n + l.length, 0));
+
+    input.value = '';
+    input.focus();
+
+    sincronizarOutbox();
+}
+
+async function removerQuantidade(parteId) {
+    // Se o último lançamento ainda está na fila, desfaz localmente
+    const pendentes = pendentesPorParte[parteId] || [];
+    if (pendentes.length > 0) {
+        const ultimo = pendentes.pop();
+        await outboxRemover([ultimo.uuid]);
+        redesenharParte(parteId);
+        atualizarStatus(Object.values(pendentesPorParte).reduce((n, l) => n + l.length, 0));
+        return;
+    }
+
+    const csrfToken = getCSRFToken();
+
+    if (!csrfToken) {
+        alert('Erro: Token CSRF não encontrado. Recarregue a página.');
+        return;
+    }
+
+    const acao = `remover-quantidade:${parteId}`;
+
+    try {
+        const response = await fetch(`/ficha/${FICHA_ID}/parte/${parteId}/remover/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken,
+                'Idempotency-Key': chaveDaAcao(acao)
+            }
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            concluirAcao(acao);
+            quantidadesServidor[parteId] = data.quantidades;
+            redesenharParte(parteId);
+        } else {
+            alert(data.error || 'Erro ao remover quantidade');
+        }
+    } catch (error) {
+        console.error('Erro:', error);
+        alert('Erro ao remover quantidade. Verifique sua conexão.');
+    }
+}
+
+function atualizarLista(parteId, quantidades, total, pendentes = []) {
+    const lista = document.getElementById(`lista-${parteId}`);
+    const totalEl = document.getElementById(`total-${parteId}`);
+    if (!lista || !totalEl) return;
+
+    if (total === null) {
+        total = quantidades.reduce((soma, qtd) => soma + qtd, 0);
+    }
+    total += pendentes.reduce((soma, qtd) => soma + qtd, 0);
+
+    // Atualizar total
+    totalEl.textContent = `Total: ${total}`;
+
+    // Atualizar lista
+    if (quantidades.length === 0 && pendentes.length === 0) {
+        lista.innerHTML = '<div class="empty-state">Nenhuma quantidade adicionada</div>';
+    } else {
+        const item = (qtd, classe) => `
+            <div class="quantidade-item ${classe}">
+                <span class="quantidade-valor">${qtd}</span>
+                <button class="btn-remove" onclick="removerQuantidade(${parteId})">✕</button>
+            </div>
+        `;
+        lista.innerHTML = quantidades.map(qtd => item(qtd, '')).join('')
+            + pendentes.map(qtd => item(qtd, 'pendente')).join('');
+    }
+}
+
+// Função auxiliar para adicionar event listener de Enter em um input
+function adicionarEventoEnter(input) {
+    // Remover listeners antigos (se existirem)
+    const novoInput = input.cloneNode(true);
+    input.parentNode.replaceChild(novoInput, input);
+
+    // Adicionar novo listener
+    novoInput.addEventListener('keypress', function(e) {
+        if (e.key === 'Enter' || e.keyCode === 13) {
+            e.preventDefault();
+            e.stopPropagation();
+            const parteId = this.id.replace('input-', '');
+            adicionarQuantidade(parteId);
+        }
+    });
+}
+
+// Inicializar event listeners quando a página carregar
+document.addEventListener('DOMContentLoaded', function() {
+    const inputs = document.querySelectorAll('.quantidade-input');
+    inputs.forEach(input => {
+        adicionarEventoEnter(input);
+    });
+
+    if (!elQuantidadesServidor) return;
+
+    // Envia o que ficou na fila (inclusive de antes de recarregar a página)
+    sincronizarOutbox();
+    window.addEventListener('online', sincronizarOutbox);
+    setInterval(sincronizarOutbox, INTERVALO_SINCRONIZACAO);
+});
@@ -0,0 +1,57 @@
+const selectModelo = document.getElementById("selectModelo");
+const selectCor = document.getElementById("selectCor");
+const selectTamanho = document.getElementById("selectTamanho");
+
+selectModelo.addEventListener("change", function () {
+    const idModelo = this.value;
+
+    selectCor.innerHTML = "<option>Carregando...</option>";
+    selectCor.disabled = true;
+
+    selectTamanho.innerHTML = "<option>Primeiro selecione a cor</option>";
+    selectTamanho.disabled = true;
+
+    if (!idModelo) return;
+
+    fetch(`/api/get_cores/${idModelo}/`)
+        .then(response => response.json())
+        .then(data => {
+            selectCor.innerHTML = '<option value="">Selecione a cor</option>';
+
+            data.cores.forEach(cor => {
+                selectCor.innerHTML += `<option value="${cor.id}">${cor.nome}</option>`;
+            });
+
+            selectCor.disabled = false;
+        });
+});
+
+selectCor.addEventListener("change", function () {
+    const corId = this.value;
+    const modeloId = document.getElementById("selectModelo").value;
+
+    if (!corId || !modeloId) {
+        return;
+    }
+
+    fetch(`/api/get_tamanhos/${corId}/?modelo_id=${modeloId}`)
+        .then(response => response.json())
+        .then(data => {
+            const selectTamanho = document.getElementById("selectTamanho");
+            selectTamanho.innerHTML = "";
+
+            if (data.tamanhos && data.tamanhos.length > 0) {
+                data.tamanhos.forEach(t => {
+                    selectTamanho.innerHTML += `
+                        <option value="${t.id}">${t.numero}</option>
+                    `;
+                });
+
+                selectTamanho.disabled = false;
+            } else {
+                selectTamanho.innerHTML = `<option value="">Nenhum tamanho encontrado</option>`;
+                selectTamanho.disabled = true;
+            }
+        })
+        .catch(err => console.error("Erro ao carregar tamanhos:", err));
+});
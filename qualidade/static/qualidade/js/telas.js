@@ -0,0 +1,145 @@
+// Dados do gráfico ({nome da ficha: total}), montados na view; só existem no modo gráfico
+const elDadosGrafico = document.getElementById('dados-grafico');
+if (elDadosGrafico) {
+    const dadosGrafico = JSON.parse(elDadosGrafico.textContent);
+
+    const labels = Object.keys(dadosGrafico);
+    const valores = Object.values(dadosGrafico);
+
+    // Gerar cores vibrantes para cada barra
+    const cores = [
+        'rgba(102, 126, 234, 0.8)',
+        'rgba(118, 75, 162, 0.8)',
+        'rgba(237, 100, 166, 0.8)',
+        'rgba(255, 154, 158, 0.8)',
+        'rgba(255, 183, 77, 0.8)',
+        'rgba(129, 212, 250, 0.8)',
+        'rgba(102, 187, 106, 0.8)',
+        'rgba(255, 138, 101, 0.8)',
+    ];
+
+    const coresBorda = [
+        'rgba(102, 126, 234, 1)',
+        'rgba(118, 75, 162, 1)',
+        'rgba(237, 100, 166, 1)',
+        'rgba(255, 154, 158, 1)',
+        'rgba(255, 183, 77, 1)',
+        'rgba(129, 212, 250, 1)',
+        'rgba(102, 187, 106, 1)',
+        'rgba(255, 138, 101, 1)',
+    ];
+
+    // Criar gráfico
+    const ctx = document.getElementById('graficoProducao').getContext('2d');
+    const grafico = new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: labels,
+            datasets: [{
+                label: 'Peças Produzidas',
+                data: valores,
+                backgroundColor: cores.slice(0, labels.length),
+                borderColor: coresBorda.slice(0, labels.length),
+                borderWidth: 2,
+                borderRadius: 8,
+                barPercentage: 0.7,
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: true,
+            plugins: {
+                legend: {
+                    display: false
+                },
+                title: {
+                    display: true,
+                    text: 'Produção por Ficha',
+                    font: {
+                        size: 24,
+                        weight: 'bold'
+                    },
+                    color: '#1e3c72',
+                    padding: 20
+                },
+                tooltip: {
+                    backgroundColor: 'rgba(0, 0, 0, 0.8)',
+                    titleFont: {
+                        size: 16,
+                        weight: 'bold'
+                    },
+                    bodyFont: {
+                        size: 14
+                    },
+                    padding: 12,
+                    cornerRadius: 8,
+                    callbacks: {
+                        label: function(context) {
+                            return context.parsed.y + ' peças';
+                        }
+                    }
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    ticks: {
+                        font: {
+                            size: 14,
+                            weight: '600'
+                        },
+                        color: '#374151',
+                        callback: function(value) {
+                            return value.toLocaleString('pt-BR');
+                        }
+                    },
+                    grid: {
+                        color: 'rgba(0, 0, 0, 0.05)',
+                        drawBorder: false
+                    },
+                    title: {
+                        display: true,
+                        text: 'Quantidade de Peças',
+                        font: {
+                            size: 16,
+                            weight: 'bold'
+                        },
+                        color: '#6b7280'
+                    }
+                },
+                x: {
+                    ticks: {
+                        font: {
+                            size: 14,
+                            weight: '600'
+                        },
+                        color: '#374151',
+                        maxRotation: 45,
+                        minRotation: 0
+                    },
+                    grid: {
+                        display: false,
+                        drawBorder: false
+                    }
+                }
+            },
+            animation: {
+                duration: 1500,
+                easing: 'easeInOutQuart'
+            }
+        }
+    });
+}
+
+// Auto-refresh a cada 50 segundos
+setTimeout(function() {
+    location.reload();
+}, 50000);
+
+// Adicionar animação ao carregar
+document.addEventListener('DOMContentLoaded', function() {
+    const cards = document.querySelectorAll('.card');
+    cards.forEach((card, index) => {
+        card.style.animationDelay = `${index * 0.1}s`;
+    });
+});
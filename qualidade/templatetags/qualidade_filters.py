@@ -1,6 +1,14 @@
 from django import template
+from django.utils.safestring import mark_safe
+import uuid
+
+from .. import catalogo
 register = template.Library()
 
+# Os filtros abaixo ficam só como alternativa para templates avulsos: as
+# telas recebem da view os totais e listas já prontos, sem recalcular a
+# cada item do loop.
+
 @register.filter(name='lookup')
 def lookup(dictionary, key):
     """Obtém um item de um dicionário"""
@@ -10,13 +18,10 @@ def lookup(dictionary, key):
 
 @register.filter(name='get_registro_total')
 def get_registro_total(registro):
-    """Obtém o total de um registro"""
+    """Obtém o total de um registro (RegistroParte)"""
     if registro is None:
         return 0
-    try:
-        return registro.total()
-    except:
-        return 0
+    return registro.total()
 
 @register.filter
 def sum_values(value):
@@ -30,23 +35,33 @@ def sum_values(value):
 @register.filter
 def map_attr(value, attr):
     """Retorna lista com o valor de um atributo ou chave em cada item"""
-    try:
-        return [v.get(attr) if isinstance(v, dict) else getattr(v, attr, None) for v in value]
-    except Exception:
+    if value is None:
         return []
+    return [v.get(attr) if isinstance(v, dict) else getattr(v, attr, None) for v in value]
 
 @register.filter
 def unique(value):
     """Remove duplicatas de uma lista mantendo a ordem"""
-    seen = set()
-    result = []
-    for item in value:
-        if item not in seen:
-            seen.add(item)
-            result.append(item)
-    return result
+    return list(dict.fromkeys(value or []))
 
-@register.filter
-def range(start, end):
+@register.filter(name='range')
+def intervalo(start, end):
+    """range(start, end) para loops no template"""
     return range(start, end)
 
+@register.simple_tag
+def chave_idempotencia():
+    """Gera uma chave nova para o campo oculto idempotency_key dos formulários"""
+    return uuid.uuid4().hex
+
+@register.simple_tag
+def versao_catalogo():
+    """Versão do catálogo, para a chave do {% cache %} dos blocos de modelos/cores/tamanhos"""
+    return catalogo.versao()
+
+@register.simple_tag
+def csrf_fragmento():
+    """Campo CSRF para formulários dentro de {% cache %}: o token de quem
+    renderizou primeiro não vale para os outros, então o valor é preenchido
+    no navegador com o token da página (ver base.html)"""
+    return mark_safe('<input type="hidden" name="csrfmiddlewaretoken" value="" data-csrf-fragmento>')
@@ -1,3 +1,828 @@
-from django.test import TestCase
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.template.base import FilterExpression
+from django.http import HttpResponse, JsonResponse
+from django.test import AsyncRequestFactory, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalogo, estoque, lixeira
+from .idempotencia import idempotente
+from .views import api_async
+from .models import (
+    GRUPO_INJETORA, ChaveIdempotencia, Cor, Ficha, FichaInventario, ItemInventario, LancamentoOffline, LancamentoParte,
+    ModeloCalcado, ParteCalcado, PerfilUsuario, ProducaoDiaria, RegistroParte, TamanhoModelo, TravaTarefa,
+    VersaoCatalogo,
+)
+
+
+def criar_usuario(username, tipo='operador', grupo=None):
+    """Usuário com perfil (e grupo, se informado) para os testes"""
+    user = User.objects.create_user(username=username, password='senha-teste')
+    PerfilUsuario.objects.update_or_create(user=user, defaults={'tipo': tipo})
+    if grupo:
+        user.groups.add(Group.objects.get_or_create(name=grupo)[0])
+    return user
+
+
+@contextmanager
+def perfil_sqlite_otimizado():
+    """Liga o perfil SQLITE_OTIMIZADO nas conexões abertas dentro do bloco
+    (as das threads dos testes de concorrência); em outro banco não faz nada"""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    opcoes = {'timeout': 20, 'transaction_mode': 'IMMEDIATE'}
+    with override_settings(SQLITE_OTIMIZADO=True), \
+            mock.patch.dict(connections.settings['default']['OPTIONS'], opcoes):
+        yield
+
+
+# As telas usam {% static %}; nos testes não há manifest do collectstatic
+SEM_MANIFEST = override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+class RemoverUltimaTests(TestCase):
+    """RegistroParte.remover_ultima e os lançamentos com hora (LancamentoParte)"""
+
+    def setUp(self):
+        self.operador = criar_usuario('operador_teste', grupo='Corte')
+        self.parte = ParteCalcado.objects.create(nome='Gáspea')
+        self.ficha = Ficha.objects.create(nome_ficha='Banca 1', operador=self.operador, data=date.today())
+
+    def test_desfazer_lancamento_novo_em_registro_com_quantidades_antigas(self):
+        # Quantidades de antes da tabela LancamentoParte: sem lançamento
+        registro = RegistroParte.objects.create(ficha=self.ficha, parte=self.parte, quantidades=[10, 20])
+        registro.adicionar_quantidade(5, self.operador)
+
+        self.assertEqual(registro.remover_ultima(), 5)
+
+        registro.refresh_from_db()
+        self.assertEqual(registro.quantidades, [10, 20])
+        self.assertFalse(LancamentoParte.objects.filter(registro=registro).exists())
+
+    def test_desfazer_quantidade_antiga_nao_apaga_lancamento(self):
+        registro = RegistroParte.objects.create(ficha=self.ficha, parte=self.parte, quantidades=[10, 20])
+
+        self.assertEqual(registro.remover_ultima(), 20)
+        self.assertEqual(registro.quantidades, [10])
+
+    def test_desfazer_apaga_so_o_ultimo_lancamento(self):
+        registro = RegistroParte.objects.create(ficha=self.ficha, parte=self.parte, quantidades=[])
+        registro.adicionar_quantidade(7, self.operador)
+        registro.adicionar_quantidade(9, self.operador)
+
+        self.assertEqual(registro.remover_ultima(), 9)
+
+        self.assertEqual(
+            list(LancamentoParte.objects.filter(registro=registro).values_list('quantidade', flat=True)),
+            [7],
+        )
+
+
+@SEM_MANIFEST
+class PermissaoEstoqueTests(TestCase):
+    """Tela, exportação e API do estoque: qualidade e Injetora veem, os outros não"""
+
+    URLS_TELA = ('estoque_inventario', 'exportar_estoque_csv')
+
+    def _abrir(self, user):
+        self.client.force_login(user)
+        telas = {nome: self.client.get(reverse(nome)).status_code for nome in self.URLS_TELA}
+        return telas, self.client.get(reverse('api_estoque_inventario')).status_code
+
+    def test_qualidade_ve_o_estoque(self):
+        telas, api = self._abrir(criar_usuario('qualidade_teste', tipo='qualidade', grupo='Qualidade'))
+        self.assertEqual(telas, {nome: 200 for nome in self.URLS_TELA})
+        self.assertEqual(api, 200)
+
+    def test_operador_da_injetora_ve_o_estoque(self):
+        telas, api = self._abrir(criar_usuario('injetora_teste', grupo=GRUPO_INJETORA))
+        self.assertEqual(telas, {nome: 200 for nome in self.URLS_TELA})
+        self.assertEqual(api, 200)
+
+    def test_operador_de_outro_setor_nao_ve_o_estoque(self):
+        telas, api = self._abrir(criar_usuario('corte_teste', grupo='Corte'))
+        self.assertEqual(telas, {nome: 302 for nome in self.URLS_TELA})
+        self.assertEqual(api, 403)
+
+    def test_loja_nao_ve_o_estoque(self):
+        telas, api = self._abrir(criar_usuario('loja_teste', tipo='loja'))
+        self.assertEqual(telas, {nome: 302 for nome in self.URLS_TELA})
+        self.assertEqual(api, 403)
+
+
+class PaginaLixeiraFichasTests(TestCase):
+    """Paginação por posição da lixeira de fichas (views/fichas.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        operador = criar_usuario('operador_lixeira', grupo='Corte')
+        agora = timezone.now()
+        # Exclusões no mesmo instante nas duas tabelas e fichas antigas sem data
+        Ficha.objects.bulk_create([
+            Ficha(nome_ficha=f'F{i}', operador=operador, data=date.today(), setor='Corte', excluido=True,
+                  excluido_em=agora - timedelta(minutes=i // 3) if i % 5 else None)
+            for i in range(23)
+        ])
+        FichaInventario.objects.bulk_create([
+            FichaInventario(nome_ficha=f'I{i}', operador=operador, data=date.today(), excluido=True,
+                            excluido_em=agora - timedelta(minutes=i // 2) if i % 4 else None)
+            for i in range(17)
+        ])
+        Ficha.objects.create(nome_ficha='Ativa', operador=operador, data=date.today())
+
+    def _percorrer(self):
+        from .views.fichas import _pagina_lixeira_fichas
+        vistos, apos = [], None
+        while True:
+            linhas, apos = _pagina_lixeira_fichas(apos)
+            vistos += [(linha['tipo'], linha['id']) for linha in linhas]
+            if not apos:
+                return vistos
+
+    def test_percorre_a_lixeira_inteira_na_ordem(self):
+        epoca = timezone.now().replace(year=1970)
+        todas = [
+            (ficha.excluido_em is not None, ficha.excluido_em or epoca, tipo, ficha.id)
+            for model, tipo in ((Ficha, 'Ficha'), (FichaInventario, 'Inventario'))
+            for ficha in model.objects.na_lixeira()
+        ]
+        esperado = [(tipo, id_) for _, _, tipo, id_ in sorted(todas, reverse=True)]
+
+        with mock.patch('qualidade.views.fichas.LIXEIRA_POR_PAGINA', 4):
+            self.assertEqual(self._percorrer(), esperado)
+
+    @skipUnless(connection.vendor == 'sqlite', 'plano de consulta do SQLite')
+    def test_cada_tabela_e_lida_pelo_indice_sem_ordenar_tudo(self):
+        from .views.fichas import _pagina_lixeira_fichas
+        with mock.patch('qualidade.views.fichas.LIXEIRA_POR_PAGINA', 4):
+            _, apos = _pagina_lixeira_fichas()
+            with CaptureQueriesContext(connection) as consultas:
+                _pagina_lixeira_fichas(apos)
+
+        self.assertTrue(consultas.captured_queries)
+        with connection.cursor() as cursor:
+            for consulta in consultas.captured_queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + consulta['sql'])
+                plano = ' '.join(linha[-1] for linha in cursor.fetchall())
+                self.assertIn('_lixeira_idx', plano)
+                self.assertNotIn('TEMP B-TREE', plano)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'perfil SQLITE_OTIMIZADO')
+class LancamentosConcorrentesSQLiteTests(TransactionTestCase):
+    """Vários tablets lançando na mesma parte ao mesmo tempo com o perfil
+    SQLite de produção (WAL, busy_timeout e BEGIN IMMEDIATE)"""
+
+    THREADS = 8
+    LANCAMENTOS_POR_THREAD = 25
+
+    def setUp(self):
+        self.operador = criar_usuario('operador_concorrencia', grupo='Corte')
+        self.parte = ParteCalcado.objects.create(nome='Gáspea')
+        self.ficha = Ficha.objects.create(nome_ficha='Banca 1', operador=self.operador, data=date.today())
+
+    def _lancar(self, numero, erros, modos):
+        url = reverse('adicionar_quantidade', args=[self.ficha.id, self.parte.id])
+        cliente = Client()
+        cliente.force_login(self.operador)
+        try:
+            for _ in range(self.LANCAMENTOS_POR_THREAD):
+                resposta = cliente.post(url, {'quantidade': numero}, content_type='application/json')
+                if resposta.status_code != 200:
+                    erros.append(resposta.content.decode())
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                modos.add(cursor.fetchone()[0])
+        except Exception as e:
+            erros.append(repr(e))
+        finally:
+            connections.close_all()
+
+    def test_lancamentos_simultaneos_nao_travam_nem_se_perdem(self):
+        erros, modos = [], set()
+        with perfil_sqlite_otimizado():
+            threads = [
+                threading.Thread(target=self._lancar, args=(numero, erros, modos))
+                for numero in range(1, self.THREADS + 1)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(erros, [])
+        self.assertEqual(modos, {'wal'})
+        esperado = self.THREADS * self.LANCAMENTOS_POR_THREAD
+        soma = sum(range(1, self.THREADS + 1)) * self.LANCAMENTOS_POR_THREAD
+        registro = RegistroParte.objects.get(ficha=self.ficha, parte=self.parte)
+        self.assertEqual(len(registro.quantidades), esperado)
+        self.assertEqual(sum(registro.quantidades), soma)
+        self.assertEqual(LancamentoParte.objects.filter(registro=registro).count(), esperado)
+        resumo = ProducaoDiaria.objects.get(parte=self.parte)
+        self.assertEqual((resumo.total, resumo.lancamentos), (soma, esperado))
+
+
+class IdempotenciaTests(TestCase):
+    """Chave de idempotência nas views de lançamento (qualidade/idempotencia.py)"""
+
+    def setUp(self):
+        self.operador = criar_usuario('operador_idempotencia', grupo='Corte')
+        self.parte = ParteCalcado.objects.create(nome='Gáspea')
+        self.ficha = Ficha.objects.create(nome_ficha='Banca 1', operador=self.operador, data=date.today())
+        self.url = reverse('adicionar_quantidade', args=[self.ficha.id, self.parte.id])
+        self.client.force_login(self.operador)
+
+    def _lancar(self, quantidade, chave):
+        return self.client.post(
+            self.url, {'quantidade': quantidade}, content_type='application/json', HTTP_IDEMPOTENCY_KEY=chave,
+        )
+
+    def _quantidades(self):
+        return RegistroParte.objects.get(ficha=self.ficha, parte=self.parte).quantidades
+
+    def test_reenvio_com_a_mesma_chave_recebe_a_resposta_guardada(self):
+        primeira = self._lancar(5, 'chave-1')
+        reenvio = self._lancar(5, 'chave-1')
+
+        self.assertEqual(primeira.status_code, 200)
+        self.assertEqual(reenvio.status_code, 200)
+        self.assertEqual(reenvio.content, primeira.content)
+        self.assertEqual(reenvio['Idempotent-Replay'], 'true')
+        self.assertEqual(self._quantidades(), [5])
+        self.assertEqual(LancamentoParte.objects.count(), 1)
+
+    def test_chaves_diferentes_lancam_de_novo(self):
+        self._lancar(5, 'chave-1')
+        self._lancar(5, 'chave-2')
+
+        self.assertEqual(self._quantidades(), [5, 5])
+
+    def test_mesma_chave_com_outro_corpo_e_recusada(self):
+        self._lancar(5, 'chave-1')
+        outra = self._lancar(7, 'chave-1')
+
+        self.assertEqual(outra.status_code, 422)
+        self.assertEqual(self._quantidades(), [5])
+
+    def test_mesma_chave_em_outra_url_e_recusada(self):
+        self._lancar(5, 'chave-1')
+        url = reverse('remover_quantidade', args=[self.ficha.id, self.parte.id])
+        outra = self.client.post(url, content_type='application/json', HTTP_IDEMPOTENCY_KEY='chave-1')
+
+        self.assertEqual(outra.status_code, 422)
+        self.assertEqual(self._quantidades(), [5])
+
+    def test_erro_do_servidor_desfaz_o_efeito_e_libera_a_chave(self):
+        respostas = [HttpResponse(status=500), JsonResponse({'success': True})]
+
+        @idempotente
+        def view(request):
+            ParteCalcado.objects.create(nome=f'Parte {len(respostas)}')
+            return respostas.pop(0)
+
+        def pedir():
+            request = RequestFactory().post(
+                '/teste/', {'quantidade': 1}, content_type='application/json', HTTP_IDEMPOTENCY_KEY='chave-5xx',
+            )
+            request.user = self.operador
+            return view(request)
+
+        self.assertEqual(pedir().status_code, 500)
+        self.assertFalse(ChaveIdempotencia.objects.filter(chave='chave-5xx').exists())
+        self.assertFalse(ParteCalcado.objects.filter(nome__startswith='Parte ').exists())
+
+        self.assertEqual(pedir().status_code, 200)
+        self.assertEqual(ChaveIdempotencia.objects.get(chave='chave-5xx').status, 200)
+        self.assertEqual(ParteCalcado.objects.filter(nome__startswith='Parte ').count(), 1)
+
+
+class IdempotenciaConcorrenteTests(TransactionTestCase):
+    """Dois pedidos com a mesma chave ao mesmo tempo (toque duplo, reenvio do
+    tablet antes da primeira resposta chegar)"""
+
+    def setUp(self):
+        self.operador = criar_usuario('operador_idempotencia', grupo='Corte')
+        self.parte = ParteCalcado.objects.create(nome='Gáspea')
+        self.ficha = Ficha.objects.create(nome_ficha='Banca 1', operador=self.operador, data=date.today())
+
+    def _lancar(self, barreira, respostas):
+        cliente = Client()
+        cliente.force_login(self.operador)
+        url = reverse('adicionar_quantidade', args=[self.ficha.id, self.parte.id])
+        try:
+            barreira.wait()
+            respostas.append(cliente.post(
+                url, {'quantidade': 5}, content_type='application/json', HTTP_IDEMPOTENCY_KEY='chave-dupla',
+            ))
+        finally:
+            connections.close_all()
+
+    def test_mesma_chave_ao_mesmo_tempo_lanca_uma_vez(self):
+        registrar = ProducaoDiaria.registrar
+
+        def registrar_devagar(*args, **kwargs):
+            # Segura a primeira transação aberta enquanto a segunda chega
+            time.sleep(0.3)
+            return registrar(*args, **kwargs)
+
+        barreira = threading.Barrier(2)
+        respostas = []
+        with perfil_sqlite_otimizado(), mock.patch.object(ProducaoDiaria, 'registrar', registrar_devagar):
+            threads = [threading.Thread(target=self._lancar, args=(barreira, respostas)) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(sorted(r.status_code for r in respostas), [200, 200])
+        self.assertEqual(sum(r.has_header('Idempotent-Replay') for r in respostas), 1)
+        self.assertEqual(respostas[0].content, respostas[1].content)
+        registro = RegistroParte.objects.get(ficha=self.ficha, parte=self.parte)
+        self.assertEqual(registro.quantidades, [5])
+        self.assertEqual(LancamentoParte.objects.filter(registro=registro).count(), 1)
+
+
+class SincronizacaoOfflineTests(TestCase):
+    """Reenvio de lotes do modo offline (LancamentoOffline por UUID)"""
+
+    def setUp(self):
+        self.operador = criar_usuario('operador_offline', grupo='Corte')
+        self.parte = ParteCalcado.objects.create(nome='Gáspea')
+        self.ficha = Ficha.objects.create(nome_ficha='Banca 1', operador=self.operador, data=date.today())
+        self.url = reverse('sincronizar_lancamentos', args=[self.ficha.id])
+        self.client.force_login(self.operador)
+
+    def _sincronizar(self, lancamentos):
+        resposta = self.client.post(self.url, json.dumps({'lancamentos': lancamentos}), content_type='application/json')
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def test_reenvio_do_lote_nao_duplica_lancamentos(self):
+        lote = [{'uuid': str(uuid.uuid4()), 'parte_id': self.parte.id, 'quantidade': q} for q in (3, 4, 5)]
+
+        primeira = self._sincronizar(lote)
+        # O tablet não recebeu a resposta e manda o lote de novo, com um lançamento a mais
+        novo = {'uuid': str(uuid.uuid4()), 'parte_id': self.parte.id, 'quantidade': 6}
+        reenvio = self._sincronizar(lote + [novo])
+
+        self.assertEqual(primeira['aplicados'], 3)
+        self.assertEqual(reenvio['aplicados'], 1)
+        self.assertEqual(len(reenvio['aceitos']), 4)
+        self.assertEqual(reenvio['registros'][str(self.parte.id)]['quantidades'], [3, 4, 5, 6])
+        self.assertEqual(LancamentoOffline.objects.count(), 4)
+        self.assertEqual(LancamentoParte.objects.count(), 4)
+        self.assertEqual(ProducaoDiaria.objects.get(parte=self.parte).total, 18)
+
+    def test_uuid_repetido_no_mesmo_lote_conta_uma_vez(self):
+        lancamento = {'uuid': str(uuid.uuid4()), 'parte_id': self.parte.id, 'quantidade': 3}
+
+        resposta = self._sincronizar([lancamento, lancamento])
+
+        self.assertEqual(resposta['aplicados'], 1)
+        self.assertEqual(resposta['registros'][str(self.parte.id)]['quantidades'], [3])
+
+
+class ExclusaoEmCascataTests(TestCase):
+    """Apagar a ficha apaga registros/itens em lote; apagar um registro ou
+    item sozinho toca a ficha (GET condicional)"""
+
+    def setUp(self):
+        self.operador = criar_usuario('operador_cascata', grupo=GRUPO_INJETORA)
+
+    def _ficha_com_registros(self, quantidade):
+        ficha = Ficha.objects.create(nome_ficha='Banca', operador=self.operador, data=date.today(), setor='Corte')
+        partes = ParteCalcado.objects.bulk_create([
+            ParteCalcado(nome=f'Parte {ficha.id}-{i}') for i in range(quantidade)
+        ])
+        registros = RegistroParte.objects.bulk_create([
+            RegistroParte(ficha=ficha, parte=parte, quantidades=[1, 2, 3]) for parte in partes
+        ])
+        LancamentoParte.objects.bulk_create([LancamentoParte(registro=r, quantidade=3) for r in registros])
+        return ficha
+
+    def _ficha_inventario_com_itens(self, quantidade):
+        ficha = FichaInventario.objects.create(nome_ficha='Inventário', operador=self.operador, data=date.today())
+        modelo = ModeloCalcado.objects.create(nome=f'Modelo {ficha.id}')
+        cor = Cor.objects.create(nome=f'Cor {ficha.id}')
+        ItemInventario.objects.bulk_create([
+            ItemInventario(
+                ficha=ficha, modelo=modelo, cor=cor,
+                tamanho=TamanhoModelo.objects.create(modelo=modelo, cor=cor, numero=str(30 + i)),
+                quantidade_pe_direito=2, quantidade_pe_esquerdo=2,
+            )
+            for i in range(quantidade)
+        ])
+        return ficha
+
+    def test_apagar_ficha_nao_carrega_os_registros(self):
+        consultas = []
+        for quantidade in (3, 30):
+            ficha = self._ficha_com_registros(quantidade)
+            with CaptureQueriesContext(connection) as capturadas:
+                Ficha.objects.filter(id=ficha.id).delete()
+            consultas.append(capturadas.captured_queries)
+
+        self.assertEqual(len(consultas[0]), len(consultas[1]))
+        # Só os ids dos registros são lidos, não a lista de quantidades
+        self.assertFalse(any('"quantidades"' in consulta['sql'] for consulta in consultas[1]))
+        self.assertFalse(RegistroParte.objects.exists())
+        self.assertFalse(LancamentoParte.objects.exists())
+
+    def test_apagar_ficha_de_inventario_invalida_o_estoque_uma_vez(self):
+        callbacks = []
+        for quantidade in (3, 30):
+            ficha = self._ficha_inventario_com_itens(quantidade)
+            with self.captureOnCommitCallbacks() as registrados:
+                FichaInventario.objects.filter(id=ficha.id).delete()
+            callbacks.append(len(registrados))
+
+        self.assertEqual(callbacks[0], callbacks[1])
+        self.assertFalse(ItemInventario.objects.exists())
+
+    def test_apagar_um_registro_toca_a_ficha(self):
+        ficha = self._ficha_com_registros(2)
+        Ficha.objects.filter(id=ficha.id).update(atualizada_em=timezone.now() - timedelta(days=1))
+
+        ficha.registros.first().delete()
+
+        ficha.refresh_from_db()
+        self.assertGreater(ficha.atualizada_em, timezone.now() - timedelta(minutes=1))
+
+    def test_apagar_um_item_toca_a_ficha_e_invalida_o_estoque(self):
+        ficha = self._ficha_inventario_com_itens(2)
+        FichaInventario.objects.filter(id=ficha.id).update(atualizada_em=timezone.now() - timedelta(days=1))
+
+        with self.captureOnCommitCallbacks() as registrados:
+            ficha.itens.first().delete()
+
+        ficha.refresh_from_db()
+        self.assertGreater(ficha.atualizada_em, timezone.now() - timedelta(minutes=1))
+        self.assertTrue(registrados)
+
+
+class ContextoUsuarioTests(TestCase):
+    """request.ctx: mudança de grupo feita em outro worker (sem passar pelos
+    sinais deste processo) tem de valer já, a menos que o cache seja
+    compartilhado e a invalidação alcance todos os workers"""
+
+    def setUp(self):
+        self.user = criar_usuario('injetora_ctx', grupo=GRUPO_INJETORA)
+        self.client.force_login(self.user)
+        self.url = reverse('api_estoque_inventario')
+
+    def _tirar_grupo_em_outro_worker(self):
+        # Delete direto na tabela de ligação: nenhum sinal deste processo dispara
+        User.groups.through.objects.filter(user=self.user).delete()
+
+    @override_settings(CACHE_COMPARTILHADO=False)
+    def test_sem_cache_compartilhado_le_as_permissoes_do_banco(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self._tirar_grupo_em_outro_worker()
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(CACHE_COMPARTILHADO=True)
+    def test_com_cache_compartilhado_a_invalidacao_vale_na_hora(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.user.groups.clear()
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(CACHE_COMPARTILHADO=True)
+    def test_com_cache_compartilhado_o_contexto_vem_da_sessao(self):
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(self.url)
+
+        self.assertFalse(any('auth_user_groups' in consulta['sql'] for consulta in consultas.captured_queries))
+
+
+class VersaoCatalogoTests(TestCase):
+    """A versão do catálogo vem do banco: a troca feita por um worker vale
+    nos outros, que não compartilham o cache local"""
+
+    def test_workers_sem_cache_em_comum_veem_a_mesma_versao(self):
+        antes = catalogo.versao()
+        cache.clear()  # outro worker: nada do cache deste processo
+
+        self.assertEqual(catalogo.versao(), antes)
+
+    def test_alteracao_troca_a_versao_sem_depender_do_cache(self):
+        antes = catalogo.versao()
+
+        Cor.objects.create(nome='Azul')
+        cache.clear()
+
+        depois = catalogo.versao()
+        self.assertNotEqual(depois, antes)
+        cache.clear()
+        self.assertEqual(catalogo.versao(), depois)
+
+    def test_alteracao_desfeita_nao_troca_a_versao(self):
+        antes = catalogo.versao()
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Cor.objects.create(nome='Verde')
+            raise RuntimeError
+
+        self.assertEqual(catalogo.versao(), antes)
+
+    def test_restaurar_partes_em_lote_troca_a_versao(self):
+        usuario = criar_usuario('qualidade_catalogo', tipo='qualidade')
+        parte = ParteCalcado.objects.create(nome='Sola', excluido=True, excluido_em=timezone.now())
+        self.client.force_login(usuario)
+        antes = catalogo.versao()
+
+        self.client.post(reverse('lixeira_partes'), {'acao': 'restaurar_lote', 'ids': [parte.id]})
+
+        parte.refresh_from_db()
+        self.assertFalse(parte.excluido)
+        self.assertNotEqual(catalogo.versao(), antes)
+        self.assertEqual(VersaoCatalogo.objects.count(), 1)
+
+
+class ExpiracaoLixeiraTests(TestCase):
+    """Uma expiração por vez entre todos os processos: a trava fica no banco,
+    não no cache local de cada worker"""
+
+    def setUp(self):
+        self.ficha = Ficha.objects.create(
+            operador=criar_usuario('operador_expiracao'), data=date.today(), nome_ficha='Velha',
+            excluido=True, excluido_em=timezone.now() - timedelta(days=400),
+        )
+
+    def test_outro_processo_expirando_bloqueia(self):
+        TravaTarefa.pegar(lixeira.TRAVA_EXPIRACAO, 60)
+        cache.clear()  # outro worker: nada do cache deste processo
+
+        self.assertIsNone(lixeira.expirar_lixeira(dias=90))
+        self.assertTrue(Ficha.objects.filter(id=self.ficha.id).exists())
+
+    def test_trava_solta_depois_da_expiracao(self):
+        self.assertIsNotNone(lixeira.expirar_lixeira(dias=90))
+        self.assertFalse(Ficha.objects.filter(id=self.ficha.id).exists())
+
+        self.assertIsNotNone(lixeira.expirar_lixeira(dias=90))
+
+    def test_trava_vencida_pode_ser_pega(self):
+        TravaTarefa.objects.create(nome=lixeira.TRAVA_EXPIRACAO, dono='morto', ate=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNotNone(lixeira.expirar_lixeira(dias=90))
+
+    def test_agendador_roda_uma_vez_por_intervalo_entre_os_workers(self):
+        self.assertIsNotNone(lixeira.rodada_agendada(60 * 60))
+        cache.clear()
+
+        self.assertIsNone(lixeira.rodada_agendada(60 * 60))
+
+
+class CatalogoCondicionalAsyncTests(TestCase):
+    """get_cores/get_tamanhos assíncronas (API_ASYNC) respondem 304 como as síncronas"""
+
+    def setUp(self):
+        self.cor = Cor.objects.create(nome='Preto')
+        self.modelo = ModeloCalcado.objects.create(nome='Tênis')
+        self.modelo.cores.add(self.cor)
+        TamanhoModelo.objects.create(modelo=self.modelo, cor=self.cor, numero=38)
+        self.fabrica = AsyncRequestFactory()
+
+    async def _pedir(self, view, caminho, *args, etag=None):
+        cabecalhos = {'If-None-Match': etag} if etag else {}
+        return await view(self.fabrica.get(caminho, headers=cabecalhos), *args)
+
+    async def test_get_cores_responde_304_com_o_mesmo_etag(self):
+        caminho = f'/api/get_cores/{self.modelo.id}/'
+        resposta = await self._pedir(api_async.get_cores, caminho, self.modelo.id)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('private', resposta['Cache-Control'])
+
+        repetida = await self._pedir(api_async.get_cores, caminho, self.modelo.id, etag=resposta['ETag'])
+
+        self.assertEqual(repetida.status_code, 304)
+
+    async def test_get_tamanhos_muda_o_etag_quando_o_catalogo_muda(self):
+        caminho = f'/api/get_tamanhos/{self.cor.id}/?modelo_id={self.modelo.id}'
+        resposta = await self._pedir(api_async.get_tamanhos, caminho, self.cor.id)
+        self.assertEqual(resposta.status_code, 200)
+
+        await TamanhoModelo.objects.acreate(modelo=self.modelo, cor=self.cor, numero=39)
+        nova = await self._pedir(api_async.get_tamanhos, caminho, self.cor.id, etag=resposta['ETag'])
+
+        self.assertEqual(nova.status_code, 200)
+        self.assertEqual(len(json.loads(nova.content)['tamanhos']), 2)
+
+
+@contextmanager
+def contando_filtros():
+    """Lista que recebe o nome de cada filtro de template aplicado no bloco"""
+    aplicados = []
+    original = FilterExpression.resolve
+
+    def resolve(self, context, ignore_failures=False):
+        aplicados.extend(funcao.__name__ for funcao, _ in self.filters)
+        return original(self, context, ignore_failures)
+
+    with mock.patch.object(FilterExpression, 'resolve', resolve):
+        yield aplicados
+
+
+@SEM_MANIFEST
+class FiltrosTemplateTests(TestCase):
+    """editar_ficha e telas aplicam o mesmo número de filtros com 1 ou com
+    muitas linhas: o que é por linha já vem pronto da view"""
+
+    FILTROS_POR_TELA = 3
+
+    def setUp(self):
+        cache.clear()
+        self.operador = criar_usuario('operador_filtros', grupo='Corte')
+
+    def _ficha(self, nome, partes):
+        ficha = Ficha.objects.create(operador=self.operador, data=date.today(), nome_ficha=nome, setor='Corte')
+        for i in range(partes):
+            parte, _ = ParteCalcado.objects.get_or_create(nome=f'Parte {i}')
+            registro = RegistroParte.objects.create(ficha=ficha, parte=parte, quantidades=[])
+            registro.adicionar_quantidade(10 + i, self.operador)
+        return ficha
+
+    def _filtros(self, url):
+        self.client.get(url)  # fragmentos em cache, como numa renderização quente
+        with contando_filtros() as aplicados:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return aplicados
+
+    def test_editar_ficha_nao_cresce_com_as_partes(self):
+        self.client.force_login(self.operador)
+        for partes in (1, 6):
+            ficha = self._ficha(f'Banca {partes}', partes)
+            aplicados = self._filtros(reverse('editar_ficha', args=[ficha.id]))
+            self.assertEqual(len(aplicados), self.FILTROS_POR_TELA, aplicados)
+
+    def test_telas_nao_cresce_com_as_fichas(self):
+        self.client.force_login(criar_usuario('qualidade_filtros', tipo='qualidade'))
+        self._ficha('Banca 0', 2)
+        com_uma = self._filtros(reverse('telas'))
+        for i in range(1, 6):
+            self._ficha(f'Banca {i}', 2)
+
+        self.assertEqual(len(com_uma), self.FILTROS_POR_TELA, com_uma)
+        self.assertEqual(self._filtros(reverse('telas')), com_uma)
+
+
+class BuscaPermissaoTests(TestCase):
+    """Busca global: a permissão vale antes do limite de candidatos, então
+    as fichas do usuário aparecem mesmo com centenas de outras casando"""
+
+    def setUp(self):
+        outro = criar_usuario('operador_costura', grupo='Costura')
+        Ficha.objects.bulk_create(
+            Ficha(operador=outro, data=date.today(), nome_ficha=f'Bota {i}', setor='Costura')
+            for i in range(250)
+        )
+        self.operador = criar_usuario('operador_busca', grupo='Corte')
+        for i in range(3):
+            Ficha.objects.create(
+                operador=self.operador, data=date.today(), nome_ficha=f'Bota de couro do corte {i}', setor='Corte',
+            )
+
+    def test_operador_acha_as_fichas_do_setor(self):
+        self.client.force_login(self.operador)
+
+        dados = self.client.get(reverse('api_busca'), {'q': 'bota', 'tipo': 'ficha'}).json()
+
+        self.assertEqual(dados['totais'], {'ficha': 3})
+        self.assertEqual(len(dados['resultados']), 3)
+
+    def test_total_conta_todas_as_fichas_visiveis(self):
+        self.client.force_login(criar_usuario('qualidade_busca', tipo='qualidade'))
+
+        dados = self.client.get(reverse('api_busca'), {'q': 'bota', 'tipo': 'ficha', 'limite': 5}).json()
+
+        self.assertEqual(dados['totais'], {'ficha': 253})
+        self.assertEqual([r['nome'] for r in dados['resultados']], ['Bota 0', 'Bota 1', 'Bota 2', 'Bota 3', 'Bota 4'])
+
+    def test_limite_menor_que_um_e_recusado(self):
+        self.client.force_login(self.operador)
+
+        for limite in ('0', '-1'):
+            for termo in ('bo', 'bota'):
+                resposta = self.client.get(reverse('api_busca'), {'q': termo, 'limite': limite})
+                self.assertEqual(resposta.status_code, 400, (termo, limite))
+
+
+class ProducaoPorHoraTests(TestCase):
+    """Somas por hora do telão: horas fechadas só ficam no cache quando ele é
+    compartilhado; no cache local um desfazer feito em outro worker não
+    chegaria a este processo"""
+
+    def setUp(self):
+        cache.clear()
+        self.lancado_em = timezone.now() - timedelta(hours=3)
+        self.data = timezone.localtime(self.lancado_em).date()
+        operador = criar_usuario('operador_hora')
+        ficha = Ficha.objects.create(operador=operador, data=self.data, nome_ficha='Banca hora')
+        registro = RegistroParte.objects.create(
+            ficha=ficha, parte=ParteCalcado.objects.create(nome='Forro'), quantidades=[10],
+        )
+        LancamentoParte.objects.create(registro=registro, quantidade=10, lancado_em=self.lancado_em)
+
+    def _desfazer_em_outro_worker(self):
+        # Delete direto: a invalidação deste processo não é chamada
+        LancamentoParte.objects.all().delete()
+
+    @override_settings(CACHE_COMPARTILHADO=False)
+    def test_sem_cache_compartilhado_le_as_horas_do_banco(self):
+        self.assertEqual(LancamentoParte.por_hora(self.data)['Banca hora'][0][1], 10)
+
+        self._desfazer_em_outro_worker()
+
+        self.assertEqual(LancamentoParte.por_hora(self.data), {})
+
+    @override_settings(CACHE_COMPARTILHADO=True)
+    def test_com_cache_compartilhado_horas_fechadas_vem_do_cache(self):
+        LancamentoParte.por_hora(self.data)
+
+        self._desfazer_em_outro_worker()
+
+        self.assertEqual(LancamentoParte.por_hora(self.data)['Banca hora'][0][1], 10)
+
+
+class PosicaoEstoqueTests(TestCase):
+    """A posição de estoque só fica no cache quando ele é compartilhado: no
+    local, a invalidação de um worker não chegaria aos outros"""
+
+    def setUp(self):
+        cache.clear()
+        ficha = FichaInventario.objects.create(
+            nome_ficha='Inventário', operador=criar_usuario('operador_estoque', grupo=GRUPO_INJETORA), data=date.today(),
+        )
+        modelo = ModeloCalcado.objects.create(nome='Chinelo')
+        cor = Cor.objects.create(nome='Branco')
+        ItemInventario.objects.create(
+            ficha=ficha, modelo=modelo, cor=cor, tamanho=TamanhoModelo.objects.create(modelo=modelo, cor=cor, numero='37'),
+            quantidade_pe_direito=4, quantidade_pe_esquerdo=4,
+        )
+
+    def _alterar_em_outro_worker(self):
+        # UPDATE direto: nenhum receiver deste processo dispara
+        ItemInventario.objects.update(quantidade_pe_direito=10, quantidade_pe_esquerdo=10)
+
+    @override_settings(CACHE_COMPARTILHADO=False)
+    def test_sem_cache_compartilhado_le_a_posicao_do_banco(self):
+        self.assertEqual(estoque.totais(estoque.posicao_estoque())['pares'], 4)
+
+        self._alterar_em_outro_worker()
+
+        self.assertEqual(estoque.totais(estoque.posicao_estoque())['pares'], 10)
+
+    @override_settings(CACHE_COMPARTILHADO=True)
+    def test_com_cache_compartilhado_a_posicao_vem_do_cache(self):
+        estoque.posicao_estoque()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(estoque.totais(estoque.posicao_estoque())['pares'], 4)
+
+
+class ExclusaoCatalogoTests(TestCase):
+    """Exclusão permanente de cadastros: os tamanhos saem em lote e a versão
+    do catálogo troca uma vez, não uma por linha apagada"""
+
+    def _modelo_na_lixeira(self, tamanhos):
+        modelo = ModeloCalcado.objects.create(nome=f'Modelo {tamanhos}', excluido=True, excluido_em=timezone.now())
+        cor = Cor.objects.create(nome=f'Cor {tamanhos}')
+        TamanhoModelo.objects.bulk_create([
+            TamanhoModelo(modelo=modelo, cor=cor, numero=str(20 + i)) for i in range(tamanhos)
+        ])
+        return modelo
+
+    def test_apagar_modelo_nao_carrega_os_tamanhos(self):
+        consultas = []
+        for tamanhos in (3, 30):
+            modelo = self._modelo_na_lixeira(tamanhos)
+            antes = int(catalogo.versao())
+            with CaptureQueriesContext(connection) as capturadas:
+                lixeira.excluir_permanente(ModeloCalcado.objects.filter(id=modelo.id))
+            consultas.append(len(capturadas))
+            self.assertEqual(int(catalogo.versao()), antes + 1)
+
+        self.assertEqual(consultas[0], consultas[1])
+        self.assertFalse(TamanhoModelo.objects.exists())
@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.urls import path
 from . import views
+from .views import api_async
+
+# Endpoints AJAX: versões assíncronas quando servido por ASGI
+api = api_async if settings.API_ASYNC else views
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -18,10 +23,11 @@ urlpatterns = [
     path('ficha/<int:ficha_id>/excluir/', views.excluir_ficha, name='excluir_ficha'),
     path('ficha/<int:ficha_id>/visualizar/', views.visualizar_ficha, name='visualizar_ficha'),
     path('ficha/<int:ficha_id>/relatorio/', views.gerar_relatorio, name='gerar_relatorio'),
-    path('ficha/<int:ficha_id>/adicionar-parte/', views.adicionar_parte_ficha, name='adicionar_parte_ficha'),
-    path('ficha/<int:ficha_id>/remover-parte/<int:parte_id>/', views.remover_parte_ficha, name='remover_parte_ficha'),
-    path('ficha/<int:ficha_id>/parte/<int:parte_id>/adicionar/', views.adicionar_quantidade, name='adicionar_quantidade'),
-    path('ficha/<int:ficha_id>/parte/<int:parte_id>/remover/', views.remover_quantidade, name='remover_quantidade'),
+    path('ficha/<int:ficha_id>/adicionar-parte/', api.adicionar_parte_ficha, name='adicionar_parte_ficha'),
+    path('ficha/<int:ficha_id>/remover-parte/<int:parte_id>/', api.remover_parte_ficha, name='remover_parte_ficha'),
+    path('ficha/<int:ficha_id>/parte/<int:parte_id>/adicionar/', api.adicionar_quantidade, name='adicionar_quantidade'),
+    path('ficha/<int:ficha_id>/parte/<int:parte_id>/remover/', api.remover_quantidade, name='remover_quantidade'),
+    path('ficha/<int:ficha_id>/sincronizar/', views.sincronizar_lancamentos, name='sincronizar_lancamentos'),
     # URLs de Inventário (INJETORA)
     path('inventario/criar/', views.inventario.criar_ficha_inventario, name='criar_ficha_inventario'),
     path('inventario/<int:ficha_id>/editar/', views.editar_ficha_inventario, name='editar_ficha_inventario'),
@@ -34,9 +40,19 @@ urlpatterns = [
     path("inventario/item/<int:item_id>/atualizar/", views.atualizar_quantidade_item, name="atualizar_quantidade_item"),
     path("inventario/<int:ficha_id>/relatorio/",views.gerar_relatorio_ficha_inventario,name="gerar_relatorio_ficha_inventario",),
     path("inventario/<int:ficha_id>/historico/",views.historico_inventario,name="relatorio_inventario"),
+    path('inventario/estoque/', views.estoque_inventario, name='estoque_inventario'),
+    path('inventario/estoque/exportar/', views.exportar_estoque_csv, name='exportar_estoque_csv'),
+    path('inventario/comparar/', views.comparar_fichas_inventario, name='comparar_fichas_inventario'),
+    path('inventario/comparar/exportar/', views.exportar_comparacao_csv, name='exportar_comparacao_csv'),
+    # Busca global (JSON)
+    path('api/busca/', views.api_busca, name='api_busca'),
+    # Análise da produção (JSON)
+    path('api/analise/producao/', views.api_analise_producao, name='api_analise_producao'),
     # APIs para inventário
-    path('api/get_cores/<int:id_modelo>/', views.get_cores, name='api_cores'),
-    path('api/get_tamanhos/<int:id_cor>/', views.get_tamanhos, name='api_tamanhos'),
+    path('api/inventario/estoque/', views.api_estoque_inventario, name='api_estoque_inventario'),
+    path('api/inventario/comparar/', views.api_comparar_fichas_inventario, name='api_comparar_fichas_inventario'),
+    path('api/get_cores/<int:id_modelo>/', api.get_cores, name='api_cores'),
+    path('api/get_tamanhos/<int:id_cor>/', api.get_tamanhos, name='api_tamanhos'),
     # Gerenciamento de modelos (apenas qualidade)
     path('modelos/', views.inventario.gerenciar_modelos, name='gerenciar_modelos'),
 ]
@@ -11,6 +11,9 @@ from .api import *
 from .relatorios import *
 from .dashboard import *
 from .inventario import *
+from .analise import *
+from .estoque import *
+from .busca import *
 
 __all__ = [
     # Auth
@@ -38,28 +41,44 @@ __all__ = [
     'remover_parte_ficha',
     'adicionar_quantidade',
     'remover_quantidade',
-    'api_cores_por_modelo',
-    'api_tamanhos_por_modelo_e_cor',
-    'api_remover_item',
+    'sincronizar_lancamentos',
     'api_atualizar_item',
-    'api_adicionar_item_inventario',
     'get_cores',
     'get_tamanhos',
     
-    # Relatórios
-    'relatorios',
+    # Relatórios (o ReportLab só é importado quando um PDF é gerado)
+    'relatorio_producao',
     'gerar_relatorio',
-    'gerar_relatorio_periodo',
+    'gerar_pdf_producao',
+    'gerar_relatorio_ficha_inventario',
+    'historico_inventario',
     
     # Dashboard
     'telas',
 
+    # Análise
+    'api_analise_producao',
+
+    # Estoque
+    'estoque_inventario',
+    'exportar_estoque_csv',
+    'api_estoque_inventario',
+    'comparar_fichas_inventario',
+    'exportar_comparacao_csv',
+    'api_comparar_fichas_inventario',
+
+    # Busca
+    'api_busca',
+
     #Inventário
     'criar_ficha_inventario',
     'editar_ficha_inventario',
-    'get_cores_modelo',
-    'get_tamanhos_modelo',
-    'adicionar_item_inventario',
+    'visualizar_ficha_inventario',
+    'excluir_ficha_inventario',
+    'gerenciar_modelos',
+    'lixeira_modelos',
+    'gerenciar_cores',
+    'lixeira_cores',
     'atualizar_quantidade_item',
     'remover_item_inventario',
 ]
\ No newline at end of file
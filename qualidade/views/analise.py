@@ -0,0 +1,163 @@
+# qualidade/views/analise.py
+"""
+API de análise da produção (JSON) para os supervisores.
+
+Séries por período (dia/semana/mês) agrupadas por ficha, setor, operador ou
+parte, somadas no banco a partir do resumo diário (ProducaoDiaria).
+"""
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.http import JsonResponse
+
+from ..models import ProducaoDiaria
+
+# Tamanho de cada período, em dias (aproximado no mês), para o limite de períodos
+PERIODOS = {
+    'dia': 1,
+    'semana': 7,
+    'mes': 30,
+}
+
+# Campo do agrupamento -> campos lidos do resumo (o primeiro é a chave)
+AGRUPAMENTOS = {
+    'nome_ficha': ('nome_ficha',),
+    'setor': ('setor',),
+    'operador': ('operador_id', 'operador__username', 'operador__first_name', 'operador__last_name'),
+    'parte': ('parte_id', 'parte__nome'),
+}
+
+# Mais que isso de pontos por série deixa a consulta e o gráfico lentos
+MAX_PERIODOS = 400
+
+# Segundos que uma resposta fica no cache: períodos que incluem hoje mudam a
+# cada lançamento, o passado só muda com lixeira/restauração
+CACHE_HOJE = 60
+CACHE_PASSADO = 15 * 60
+
+
+def _data(valor, padrao):
+    if not valor:
+        return padrao
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def _rotulo(linha, agrupar):
+    if agrupar == 'operador':
+        nome = f"{linha['operador__first_name'] or ''} {linha['operador__last_name'] or ''}".strip()
+        return nome or linha['operador__username']
+    if agrupar == 'parte':
+        return linha['parte__nome']
+    return linha[agrupar] or 'Sem setor'
+
+
+def _series(data_inicio, data_fim, periodo, agrupar, filtros):
+    resumo = ProducaoDiaria.objects.filter(data__range=[data_inicio, data_fim], **filtros)
+
+    # O resumo já é diário; semana e mês são truncados no banco
+    campo_periodo = 'data'
+    if periodo == 'semana':
+        resumo = resumo.annotate(periodo=TruncWeek('data'))
+        campo_periodo = 'periodo'
+    elif periodo == 'mes':
+        resumo = resumo.annotate(periodo=TruncMonth('data'))
+        campo_periodo = 'periodo'
+    campos = AGRUPAMENTOS[agrupar]
+
+    linhas = (
+        resumo.values(campo_periodo, *campos)
+        .annotate(soma=Sum('total'), soma_lancamentos=Sum('lancamentos'))
+        .order_by(campos[0], campo_periodo)
+    )
+
+    series = {}
+    for linha in linhas:
+        chave = linha[campos[0]]
+        serie = series.setdefault(chave, {
+            'chave': chave,
+            'rotulo': _rotulo(linha, agrupar),
+            'total': 0,
+            'pontos': [],
+        })
+        periodo_linha = linha[campo_periodo]
+        if isinstance(periodo_linha, datetime):
+            periodo_linha = periodo_linha.date()
+        serie['pontos'].append({
+            'periodo': periodo_linha.isoformat(),
+            'total': linha['soma'],
+            'lancamentos': linha['soma_lancamentos'],
+        })
+        serie['total'] += linha['soma']
+
+    return sorted(series.values(), key=lambda s: s['total'], reverse=True)
+
+
+@login_required
+def api_analise_producao(request):
+    """Produção por período e agrupamento.
+
+    GET: data_inicio, data_fim (AAAA-MM-DD), periodo (dia|semana|mes),
+    agrupar (nome_ficha|setor|operador|parte) e os filtros opcionais
+    setor, operador_id, parte_id e nome_ficha.
+    """
+    if request.ctx.tipo != 'qualidade':
+        return JsonResponse({'error': 'Sem permissão'}, status=403)
+
+    periodo = request.GET.get('periodo', 'dia')
+    agrupar = request.GET.get('agrupar', 'nome_ficha')
+    if periodo not in PERIODOS:
+        return JsonResponse({'error': f"periodo deve ser um de: {', '.join(PERIODOS)}"}, status=400)
+    if agrupar not in AGRUPAMENTOS:
+        return JsonResponse({'error': f"agrupar deve ser um de: {', '.join(AGRUPAMENTOS)}"}, status=400)
+
+    hoje = date.today()
+    try:
+        data_fim = _data(request.GET.get('data_fim'), hoje)
+        data_inicio = _data(request.GET.get('data_inicio'), data_fim - timedelta(days=30))
+    except ValueError:
+        return JsonResponse({'error': 'Data inválida (use AAAA-MM-DD)'}, status=400)
+    if data_inicio > data_fim:
+        return JsonResponse({'error': 'data_inicio deve ser anterior a data_fim'}, status=400)
+
+    dias = (data_fim - data_inicio).days + 1
+    if dias / PERIODOS[periodo] > MAX_PERIODOS:
+        return JsonResponse({
+            'error': f'Intervalo grande demais para periodo={periodo} '
+                     f'(máximo de {MAX_PERIODOS} períodos); use um período maior'
+        }, status=400)
+
+    filtros = {}
+    try:
+        for parametro, campo in (('operador_id', 'operador_id'), ('parte_id', 'parte_id')):
+            if request.GET.get(parametro):
+                filtros[campo] = int(request.GET[parametro])
+    except ValueError:
+        return JsonResponse({'error': 'operador_id e parte_id devem ser números'}, status=400)
+    for campo in ('setor', 'nome_ficha'):
+        if request.GET.get(campo):
+            filtros[campo] = request.GET[campo]
+
+    # Cache pela combinação de filtros
+    parametros = {
+        'inicio': data_inicio.isoformat(), 'fim': data_fim.isoformat(),
+        'periodo': periodo, 'agrupar': agrupar, **filtros,
+    }
+    chave = 'analise_producao:' + hashlib.sha1(
+        json.dumps(parametros, sort_keys=True).encode()
+    ).hexdigest()
+    resposta = cache.get(chave)
+    if resposta is None:
+        series = _series(data_inicio, data_fim, periodo, agrupar, filtros)
+        resposta = {
+            **parametros,
+            'total': sum(s['total'] for s in series),
+            'series': series,
+        }
+        cache.set(chave, resposta, CACHE_HOJE if data_fim >= hoje else CACHE_PASSADO)
+
+    return JsonResponse(resposta)
@@ -5,12 +5,38 @@ Endpoints AJAX/API para manipulação de dados
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
+import uuid
 
-from ..models import Ficha, ParteCalcado, RegistroParte, ModeloCalcado, Cor, ItemInventario, FichaInventario, TamanhoModelo
+from ..condicional import catalogo_condicional
+from ..idempotencia import idempotente
+from ..models import Ficha, ParteCalcado, RegistroParte, ModeloCalcado, Cor, ItemInventario, FichaInventario, TamanhoModelo, LancamentoOffline, LancamentoParte, ProducaoDiaria
+
+# Máximo de lançamentos aceitos num único lote de sincronização
+MAX_LOTE_SINCRONIZACAO = 1000
+
+# Hora de lançamento enviada pelo tablet mais antiga que isso (relógio errado)
+# é trocada pela hora em que o lote chegou
+ATRASO_MAXIMO_OFFLINE = timedelta(days=7)
+
+
+def _momento_lancamento(valor, agora):
+    """Hora do lançamento no tablet (milissegundos desde 1970) ou, se não vier
+    ou estiver fora da janela aceita, a hora do servidor"""
+    try:
+        momento = datetime.fromtimestamp(int(valor) / 1000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return agora
+    if momento > agora or momento < agora - ATRASO_MAXIMO_OFFLINE:
+        return agora
+    return momento
 
 
 @login_required
+@idempotente
 def adicionar_parte_ficha(request, ficha_id):
     """API para adicionar uma parte à ficha via AJAX"""
     if request.method != 'POST':
@@ -19,7 +45,7 @@ def adicionar_parte_ficha(request, ficha_id):
     ficha = get_object_or_404(Ficha, id=ficha_id)
     
     # Verificar permissão
-    if request.user.perfil.tipo == 'operador' and ficha.operador != request.user:
+    if request.ctx.tipo == 'operador' and ficha.operador_id != request.user.id:
         return JsonResponse({'error': 'Sem permissão'}, status=403)
     
     try:
@@ -34,7 +60,7 @@ def adicionar_parte_ficha(request, ficha_id):
         if not parte_id:
             return JsonResponse({'error': 'ID da parte não fornecido'}, status=400)
         
-        parte = get_object_or_404(ParteCalcado, id=parte_id, ativo=True, excluido=False)
+        parte = get_object_or_404(ParteCalcado.ativos, id=parte_id, ativo=True)
         
         # Verificar se já existe
         if RegistroParte.objects.filter(ficha=ficha, parte=parte).exists():
@@ -58,6 +84,7 @@ def adicionar_parte_ficha(request, ficha_id):
 
 
 @login_required
+@idempotente
 def remover_parte_ficha(request, ficha_id, parte_id):
     """API para remover uma parte da ficha via AJAX"""
     if request.method != 'POST':
@@ -66,13 +93,16 @@ def remover_parte_ficha(request, ficha_id, parte_id):
     ficha = get_object_or_404(Ficha, id=ficha_id)
     
     # Verificar permissão
-    if request.user.perfil.tipo == 'operador' and ficha.operador != request.user:
+    if request.ctx.tipo == 'operador' and ficha.operador_id != request.user.id:
         return JsonResponse({'error': 'Sem permissão'}, status=403)
     
     try:
-        registro = RegistroParte.objects.get(ficha=ficha, parte_id=parte_id)
-        parte_nome = registro.parte.nome
-        registro.delete()
+        with transaction.atomic():
+            registro = RegistroParte.objects.select_for_update().get(ficha=ficha, parte_id=parte_id)
+            parte_nome = registro.parte.nome
+            quantidades = registro.quantidades or []
+            ProducaoDiaria.registrar(ficha, registro.parte_id, -sum(quantidades), -len(quantidades))
+            registro.delete()
         
         return JsonResponse({
             'success': True,
@@ -86,6 +116,7 @@ def remover_parte_ficha(request, ficha_id, parte_id):
 
 
 @login_required
+@idempotente
 def adicionar_quantidade(request, ficha_id, parte_id):
     """API para adicionar quantidade via AJAX"""
     if request.method != 'POST':
@@ -95,7 +126,7 @@ def adicionar_quantidade(request, ficha_id, parte_id):
     parte = get_object_or_404(ParteCalcado, id=parte_id)
     
     # Verificar permissão
-    if request.user.perfil.tipo == 'operador' and ficha.operador != request.user:
+    if request.ctx.tipo == 'operador' and ficha.operador_id != request.user.id:
         return JsonResponse({'error': 'Sem permissão'}, status=403)
     
     try:
@@ -105,15 +136,19 @@ def adicionar_quantidade(request, ficha_id, parte_id):
         if quantidade <= 0:
             return JsonResponse({'error': 'Quantidade deve ser maior que zero'}, status=400)
         
-        # Buscar ou criar registro
-        registro, created = RegistroParte.objects.get_or_create(
-            ficha=ficha,
-            parte=parte,
-            defaults={'quantidades': []}
-        )
-        
-        # Adicionar quantidade
-        registro.adicionar_quantidade(quantidade)
+        # Lê e grava a lista na mesma transação para não perder lançamentos
+        # de tablets que gravam ao mesmo tempo
+        with transaction.atomic():
+            # Buscar ou criar registro
+            registro, created = RegistroParte.objects.select_for_update().get_or_create(
+                ficha=ficha,
+                parte=parte,
+                defaults={'quantidades': []}
+            )
+            
+            # Adicionar quantidade
+            registro.adicionar_quantidade(quantidade, request.user)
+            ProducaoDiaria.registrar(ficha, parte.id, quantidade, 1)
         
         return JsonResponse({
             'success': True,
@@ -126,6 +161,7 @@ def adicionar_quantidade(request, ficha_id, parte_id):
 
 
 @login_required
+@idempotente
 def remover_quantidade(request, ficha_id, parte_id):
     """API para remover última quantidade via AJAX"""
     if request.method != 'POST':
@@ -134,15 +170,16 @@ def remover_quantidade(request, ficha_id, parte_id):
     ficha = get_object_or_404(Ficha, id=ficha_id)
     
     # Verificar permissão
-    if request.user.perfil.tipo == 'operador' and ficha.operador != request.user:
+    if request.ctx.tipo == 'operador' and ficha.operador_id != request.user.id:
         return JsonResponse({'error': 'Sem permissão'}, status=403)
     
     try:
-        registro = RegistroParte.objects.get(ficha=ficha, parte_id=parte_id)
-        
-        if registro.quantidades:
-            registro.quantidades.pop()
-            registro.save()
+        with transaction.atomic():
+            registro = RegistroParte.objects.select_for_update().get(ficha=ficha, parte_id=parte_id)
+            
+            if registro.quantidades:
+                removida = registro.remover_ultima()
+                ProducaoDiaria.registrar(ficha, registro.parte_id, -removida, -1)
         
         return JsonResponse({
             'success': True,
@@ -156,6 +193,135 @@ def remover_quantidade(request, ficha_id, parte_id):
         return JsonResponse({'error': str(e)}, status=400)
 
 
+@login_required
+def sincronizar_lancamentos(request, ficha_id):
+    """API de sincronização do modo offline: aplica um lote de lançamentos
+    numa única transação, ignorando UUIDs que já foram recebidos"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+
+    ficha = get_object_or_404(Ficha, id=ficha_id)
+
+    # Verificar permissão
+    if request.ctx.tipo == 'operador' and ficha.operador_id != request.user.id:
+        return JsonResponse({'error': 'Sem permissão'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        lancamentos = data.get('lancamentos', [])
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    if not isinstance(lancamentos, list):
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    if len(lancamentos) > MAX_LOTE_SINCRONIZACAO:
+        return JsonResponse({'error': f'Máximo de {MAX_LOTE_SINCRONIZACAO} lançamentos por lote'}, status=400)
+
+    # Validação de cada lançamento (mantém a ordem em que foram feitos no tablet)
+    validos = []
+    rejeitados = []
+    vistos = set()
+    momentos = {}
+    agora = timezone.now()
+    for lancamento in lancamentos:
+        try:
+            chave = uuid.UUID(str(lancamento.get('uuid')))
+            parte_id = int(lancamento.get('parte_id'))
+            quantidade = int(lancamento.get('quantidade', 0))
+        except (AttributeError, TypeError, ValueError):
+            rejeitados.append(str(lancamento.get('uuid')) if isinstance(lancamento, dict) else None)
+            continue
+
+        if quantidade <= 0:
+            rejeitados.append(str(chave))
+            continue
+
+        # Mesmo UUID repetido dentro do lote
+        if chave in vistos:
+            continue
+        vistos.add(chave)
+        validos.append((chave, parte_id, quantidade))
+        momentos[chave] = _momento_lancamento(lancamento.get('criado_em'), agora)
+
+    partes_validas = set(
+        ParteCalcado.objects.filter(id__in={p for _, p, _ in validos}).values_list('id', flat=True)
+    )
+    for chave, parte_id, _ in validos:
+        if parte_id not in partes_validas:
+            rejeitados.append(str(chave))
+    validos = [l for l in validos if l[1] in partes_validas]
+
+    try:
+        with transaction.atomic():
+            ja_recebidos = set(
+                LancamentoOffline.objects.filter(uuid__in=[c for c, _, _ in validos])
+                .values_list('uuid', flat=True)
+            )
+            novos = [l for l in validos if l[0] not in ja_recebidos]
+
+            registros = {
+                r.parte_id: r
+                for r in RegistroParte.objects.select_for_update().filter(
+                    ficha=ficha, parte_id__in={p for _, p, _ in novos}
+                )
+            }
+
+            novos_lancamentos = []
+            com_hora = []
+            alterados = {}
+            for chave, parte_id, quantidade in novos:
+                registro = registros.get(parte_id)
+                if registro is None:
+                    registro = RegistroParte.objects.create(ficha=ficha, parte_id=parte_id, quantidades=[])
+                    registros[parte_id] = registro
+                if not registro.quantidades:
+                    registro.quantidades = []
+                registro.quantidades.append(quantidade)
+                alterados[parte_id] = registro
+                novos_lancamentos.append(
+                    LancamentoOffline(uuid=chave, registro=registro, quantidade=quantidade)
+                )
+                com_hora.append(LancamentoParte(
+                    registro=registro, quantidade=quantidade,
+                    lancado_em=momentos[chave], usuario=request.user,
+                ))
+
+            RegistroParte.objects.bulk_update(alterados.values(), ['quantidades'])
+            # bulk_update não dispara post_save: a ficha é tocada aqui
+            Ficha.tocar(ficha.id)
+            LancamentoOffline.objects.bulk_create(novos_lancamentos)
+            LancamentoParte.objects.bulk_create(com_hora)
+
+            # Lançamentos feitos offline podem cair em horas que já estão no cache
+            if any(LancamentoParte.hora_fechada(l.lancado_em) for l in com_hora):
+                LancamentoParte.invalidar_horas(ficha.data)
+
+            # Resumo diário: uma atualização por parte, não por lançamento
+            for parte_id in alterados:
+                do_lote = [q for _, p, q in novos if p == parte_id]
+                ProducaoDiaria.registrar(ficha, parte_id, sum(do_lote), len(do_lote))
+
+    except IntegrityError:
+        # Outro envio do mesmo lote gravou antes; o tablet reenvia e cai na deduplicação
+        return JsonResponse({'error': 'Lote em processamento, tente novamente'}, status=409)
+
+    # Estado atual das partes tocadas para o tablet redesenhar as listas
+    partes_tocadas = {p for _, p, _ in validos}
+    estado = {
+        str(r.parte_id): {'quantidades': r.quantidades, 'total': r.total()}
+        for r in RegistroParte.objects.filter(ficha=ficha, parte_id__in=partes_tocadas)
+    }
+
+    return JsonResponse({
+        'success': True,
+        'aceitos': [str(c) for c, _, _ in validos],
+        'aplicados': len(novos_lancamentos),
+        'rejeitados': rejeitados,
+        'registros': estado,
+    })
+
+
 ## API'S DAS FICHAS DE INVENTÁRIO ##
 
 @login_required
@@ -175,10 +341,11 @@ def api_atualizar_item(request, item_id):
     return JsonResponse({'success': True})
 
 
+@catalogo_condicional
 def get_cores(request, id_modelo):
-    modelo = get_object_or_404(ModeloCalcado, id=id_modelo, excluido=False)
+    modelo = get_object_or_404(ModeloCalcado.ativos, id=id_modelo)
     
-    cores = modelo.cores.filter(excluido=False).order_by('nome')
+    cores = modelo.cores.ativos().order_by('nome')
 
     data = [
         {"id": cor.id, "nome": cor.nome}
@@ -187,17 +354,17 @@ def get_cores(request, id_modelo):
 
     return JsonResponse({"cores": data})
 
+@catalogo_condicional
 def get_tamanhos(request, id_cor):
     modelo_id = request.GET.get("modelo_id")
 
     if not modelo_id:
         return JsonResponse({"error": "modelo_id é obrigatório"}, status=400)
 
-    tamanhos = TamanhoModelo.objects.filter(
+    tamanhos = TamanhoModelo.ativos.filter(
         modelo_id=modelo_id,
         cor_id=id_cor,
         ativo=True,
-        excluido=False
     ).order_by("numero")
 
     data = [{"id": t.id, "numero": t.numero} for t in tamanhos]
@@ -0,0 +1,226 @@
+# qualidade/views/api_async.py
+"""
+Versões assíncronas (ASGI) dos endpoints AJAX de produção.
+
+Mesmo contrato de resposta de api.py, mas usando o ORM assíncrono. São
+ligadas nas urls quando settings.API_ASYNC está ativo (padrão em config/asgi.py).
+"""
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, Http404
+from django.db import transaction
+from django.db.models import Manager
+from asgiref.sync import sync_to_async
+import json
+
+from ..condicional import catalogo_condicional
+from ..idempotencia import idempotente
+from ..models import Ficha, ParteCalcado, RegistroParte, ModeloCalcado, TamanhoModelo, ProducaoDiaria
+
+
+async def _aget_or_404(model, **filtros):
+    """Equivalente assíncrono do get_object_or_404 (aceita o model ou um manager, ex. Model.ativos)"""
+    manager = model if isinstance(model, Manager) else model._default_manager
+    try:
+        return await manager.aget(**filtros)
+    except manager.model.DoesNotExist:
+        raise Http404(f'{manager.model._meta.object_name} não encontrado')
+
+
+async def _sem_permissao(request, ficha):
+    """Operador só mexe na própria ficha (mesma regra das views síncronas)"""
+    user = await request.auser()
+    # request.ctx vem da sessão (ou de uma única query), ver qualidade/middleware.py
+    tipo = await sync_to_async(lambda: request.ctx.tipo)()
+    return tipo == 'operador' and ficha.operador_id != user.id
+
+
+@login_required
+@idempotente
+async def adicionar_parte_ficha(request, ficha_id):
+    """API para adicionar uma parte à ficha via AJAX"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+
+    ficha = await _aget_or_404(Ficha, id=ficha_id)
+
+    if await _sem_permissao(request, ficha):
+        return JsonResponse({'error': 'Sem permissão'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    parte_id = data.get('parte_id')
+
+    if not parte_id:
+        return JsonResponse({'error': 'ID da parte não fornecido'}, status=400)
+
+    try:
+        parte = await _aget_or_404(ParteCalcado.ativos, id=parte_id, ativo=True)
+
+        # Verificar se já existe
+        if await RegistroParte.objects.filter(ficha=ficha, parte=parte).aexists():
+            return JsonResponse({'error': 'Esta parte já foi adicionada'}, status=400)
+
+        await RegistroParte.objects.acreate(ficha=ficha, parte=parte, quantidades=[])
+
+        return JsonResponse({
+            'success': True,
+            'parte_id': parte.id,
+            'parte_nome': parte.nome
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@login_required
+@idempotente
+async def remover_parte_ficha(request, ficha_id, parte_id):
+    """API para remover uma parte da ficha via AJAX"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+
+    ficha = await _aget_or_404(Ficha, id=ficha_id)
+
+    if await _sem_permissao(request, ficha):
+        return JsonResponse({'error': 'Sem permissão'}, status=403)
+
+    try:
+        parte_nome = await _remover_registro(ficha, parte_id)
+
+        return JsonResponse({
+            'success': True,
+            'parte_nome': parte_nome
+        })
+
+    except RegistroParte.DoesNotExist:
+        return JsonResponse({'error': 'Parte não encontrada nesta ficha'}, status=404)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+# O ORM assíncrono ainda não abre transações, então a parte que lê e grava
+# a lista de quantidades roda num thread com transaction.atomic().
+
+@sync_to_async
+def _lancar_quantidade(ficha, parte, quantidade, usuario):
+    with transaction.atomic():
+        registro, created = RegistroParte.objects.select_for_update().get_or_create(
+            ficha=ficha,
+            parte=parte,
+            defaults={'quantidades': []}
+        )
+        registro.adicionar_quantidade(quantidade, usuario)
+        ProducaoDiaria.registrar(ficha, parte.id, quantidade, 1)
+    return registro
+
+
+@sync_to_async
+def _desfazer_quantidade(ficha, parte_id):
+    with transaction.atomic():
+        registro = RegistroParte.objects.select_for_update().get(ficha=ficha, parte_id=parte_id)
+        if registro.quantidades:
+            removida = registro.remover_ultima()
+            ProducaoDiaria.registrar(ficha, registro.parte_id, -removida, -1)
+    return registro
+
+
+@sync_to_async
+def _remover_registro(ficha, parte_id):
+    with transaction.atomic():
+        registro = RegistroParte.objects.select_for_update(of=('self',)).select_related('parte').get(ficha=ficha, parte_id=parte_id)
+        quantidades = registro.quantidades or []
+        ProducaoDiaria.registrar(ficha, registro.parte_id, -sum(quantidades), -len(quantidades))
+        registro.delete()
+    return registro.parte.nome
+
+
+@login_required
+@idempotente
+async def adicionar_quantidade(request, ficha_id, parte_id):
+    """API para adicionar quantidade via AJAX"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+
+    ficha = await _aget_or_404(Ficha, id=ficha_id)
+    parte = await _aget_or_404(ParteCalcado, id=parte_id)
+
+    if await _sem_permissao(request, ficha):
+        return JsonResponse({'error': 'Sem permissão'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        quantidade = int(data.get('quantidade', 0))
+
+        if quantidade <= 0:
+            return JsonResponse({'error': 'Quantidade deve ser maior que zero'}, status=400)
+
+        registro = await _lancar_quantidade(ficha, parte, quantidade, await request.auser())
+
+        return JsonResponse({
+            'success': True,
+            'quantidades': registro.quantidades,
+            'total': registro.total()
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@login_required
+@idempotente
+async def remover_quantidade(request, ficha_id, parte_id):
+    """API para remover última quantidade via AJAX"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+
+    ficha = await _aget_or_404(Ficha, id=ficha_id)
+
+    if await _sem_permissao(request, ficha):
+        return JsonResponse({'error': 'Sem permissão'}, status=403)
+
+    try:
+        registro = await _desfazer_quantidade(ficha, parte_id)
+
+        return JsonResponse({
+            'success': True,
+            'quantidades': registro.quantidades,
+            'total': registro.total()
+        })
+
+    except RegistroParte.DoesNotExist:
+        return JsonResponse({'error': 'Registro não encontrado'}, status=404)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@catalogo_condicional
+async def get_cores(request, id_modelo):
+    modelo = await _aget_or_404(ModeloCalcado.ativos, id=id_modelo)
+
+    data = [
+        {"id": cor.id, "nome": cor.nome}
+        async for cor in modelo.cores.ativos().order_by('nome')
+    ]
+
+    return JsonResponse({"cores": data})
+
+
+@catalogo_condicional
+async def get_tamanhos(request, id_cor):
+    modelo_id = request.GET.get("modelo_id")
+
+    if not modelo_id:
+        return JsonResponse({"error": "modelo_id é obrigatório"}, status=400)
+
+    tamanhos = TamanhoModelo.ativos.filter(
+        modelo_id=modelo_id,
+        cor_id=id_cor,
+        ativo=True,
+    ).order_by("numero")
+
+    data = [{"id": t.id, "numero": t.numero} async for t in tamanhos]
+
+    return JsonResponse({"tamanhos": data})
@@ -0,0 +1,101 @@
+# qualidade/views/busca.py
+"""
+Busca global (caixa de busca do cabeçalho): fichas, fichas de inventário,
+modelos, cores e operadores por nome. Os índices ficam em qualidade/busca.py.
+"""
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.urls import reverse
+
+from ..busca import FONTES, buscar
+from ..models import GRUPO_INJETORA, Cor, Ficha, FichaInventario, ModeloCalcado, NomeOperador
+
+MIN_CARACTERES = 2
+LIMITE_PADRAO = 8
+LIMITE_MAXIMO = 50
+
+
+def _visiveis(request):
+    """{tipo: queryset} do que o usuário pode ver, com as mesmas regras da home"""
+    ctx = request.ctx
+    grupo_nome = ctx.setor
+    querysets = {}
+
+    if grupo_nome != GRUPO_INJETORA:
+        fichas = Ficha.ativos.all()
+        if ctx.tipo == 'operador':
+            fichas = fichas.filter(setor=grupo_nome) if grupo_nome else fichas.filter(operador=request.user)
+        querysets['ficha'] = fichas
+
+    if grupo_nome in [GRUPO_INJETORA, 'Qualidade']:
+        fichas_inventario = FichaInventario.ativos.all()
+        if ctx.tipo == 'operador':
+            fichas_inventario = fichas_inventario.filter(operador=request.user)
+        querysets['ficha_inventario'] = fichas_inventario
+
+    # Cadastros só aparecem para quem pode gerenciá-los
+    if ctx.tipo == 'qualidade':
+        querysets['modelo'] = ModeloCalcado.ativos.all()
+        querysets['cor'] = Cor.ativos.all()
+        querysets['operador'] = NomeOperador.ativos.all()
+
+    return querysets
+
+
+def _resultado(tipo, objeto):
+    if tipo == 'ficha':
+        detalhe = f"{objeto.data:%d/%m/%Y}" + (f" · {objeto.setor}" if objeto.setor else '')
+        url = reverse('visualizar_ficha', args=[objeto.id])
+        nome = objeto.nome_ficha
+    elif tipo == 'ficha_inventario':
+        detalhe = f"Inventário · {objeto.data:%d/%m/%Y}"
+        url = reverse('visualizar_ficha_inventario', args=[objeto.id])
+        nome = objeto.nome_ficha
+    elif tipo == 'modelo':
+        detalhe, nome = 'Modelo', objeto.nome
+        url = f"{reverse('estoque_inventario')}?modelo={objeto.id}"
+    elif tipo == 'cor':
+        detalhe, nome = 'Cor', objeto.nome
+        url = f"{reverse('estoque_inventario')}?cor={objeto.id}"
+    else:
+        detalhe, nome = 'Operador', objeto.nome
+        url = reverse('gerenciar_operadores')
+    return {'tipo': tipo, 'id': objeto.id, 'nome': nome, 'detalhe': detalhe, 'url': url}
+
+
+@login_required
+def api_busca(request):
+    """Resultados para a busca do cabeçalho.
+
+    GET: q (mínimo de 2 caracteres), tipo (opcional, um de ficha,
+    ficha_inventario, modelo, cor, operador) e limite por tipo (1 a 50, padrão 8).
+    Retorna os totais por tipo (facetas) e os resultados mais relevantes.
+    """
+    termo = request.GET.get('q', '').strip()
+    tipo = request.GET.get('tipo') or None
+    if tipo is not None and tipo not in FONTES:
+        return JsonResponse({'error': f"tipo deve ser um de: {', '.join(FONTES)}"}, status=400)
+    try:
+        limite = min(int(request.GET.get('limite', LIMITE_PADRAO)), LIMITE_MAXIMO)
+    except ValueError:
+        return JsonResponse({'error': 'limite deve ser um número'}, status=400)
+    if limite < 1:
+        return JsonResponse({'error': 'limite deve ser maior que zero'}, status=400)
+
+    if len(termo) < MIN_CARACTERES:
+        return JsonResponse({'q': termo, 'totais': {}, 'resultados': []})
+
+    querysets = _visiveis(request)
+    if tipo is not None:
+        querysets = {tipo: querysets[tipo]} if tipo in querysets else {}
+
+    encontrados = buscar(termo, querysets, limite)
+    return JsonResponse({
+        'q': termo,
+        'totais': {t: total for t, (total, _) in encontrados.items()},
+        'resultados': [
+            _resultado(t, objeto)
+            for t, (_, objetos) in encontrados.items()
+            for objeto in objetos
+        ],
+    })
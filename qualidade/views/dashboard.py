@@ -3,13 +3,14 @@
 Views para dashboard/telão de produção
 """
 from django.shortcuts import render
-from django.contrib.auth.decorators import login_required
+from django.utils import timezone
 from datetime import date, datetime
 
-from ..models import Ficha
+from ..models import Ficha, LancamentoParte, ProducaoDiaria
+from ..quiosque import login_ou_quiosque
 
 
-@login_required
+@login_ou_quiosque
 def telas(request):
     """Tela para exibição em telão como um dashboard da produção"""
     # Busca a data selecionada ou usar hoje
@@ -24,10 +25,41 @@ def telas(request):
     else:
         data_obj = date.today()
     
+    # Dias anteriores (modo histórico) vêm do resumo diário; o dia de hoje
+    # é montado a partir das fichas para refletir cada lançamento
+    if data_obj < date.today():
+        dados_telao = _dados_telao_resumo(data_obj)
+    else:
+        dados_telao = _dados_telao_fichas(data_obj)
+    
+    # Produção por hora de cada banca: somada no banco, horas fechadas vêm do cache
+    for nome_ficha, horas in LancamentoParte.por_hora(data_obj).items():
+        if nome_ficha in dados_telao:
+            # Rótulo da hora já no fuso local: sem um |date por linha no template
+            dados_telao[nome_ficha]['por_hora'] = [(f'{timezone.localtime(hora):%H}', total) for hora, total in horas]
+            dados_telao[nome_ficha]['ritmo'] = round(sum(total for _, total in horas) / len(horas))
+
+    # Calcular total geral do dia
+    total_dia = sum(item['total'] for item in dados_telao.values())
+    
+    context = {
+        'dados_telao': dados_telao,
+        # Modo gráfico: {nome da ficha: total}, serializado de uma vez no template
+        'dados_grafico': {dados['nome']: dados['total'] for dados in dados_telao.values()} if modo == 'grafico' else None,
+        'data_selecionada': data_obj,
+        'total_dia': total_dia,
+        'data_hoje': date.today(),
+        'modo': modo,
+        # Telão logado por token: os links precisam levar o token adiante
+        'token_quiosque': request.token_quiosque,
+    }
+    return render(request, 'qualidade/telas.html', context)
+
+def _dados_telao_fichas(data_obj):
+    """Agrupa por nome da ficha a produção do dia lendo os registros"""
     # Buscar fichas do dia
-    fichas = Ficha.objects.filter(
+    fichas = Ficha.ativos.filter(
         data=data_obj,
-        excluido=False
     ).select_related('operador').prefetch_related('registros__parte')
     
     # Agrupar por nome da ficha
@@ -55,15 +87,30 @@ def telas(request):
             
             dados_telao[nome_ficha]['partes'][parte_nome] += total_parte
             dados_telao[nome_ficha]['total'] += total_parte
-    
-    # Calcular total geral do dia
-    total_dia = sum(item['total'] for item in dados_telao.values())
-    
-    context = {
-        'dados_telao': dados_telao,
-        'data_selecionada': data_obj,
-        'total_dia': total_dia,
-        'data_hoje': date.today(),
-        'modo': modo,
-    }
-    return render(request, 'qualidade/telas.html', context)
\ No newline at end of file
+
+    return dados_telao
+
+
+def _dados_telao_resumo(data_obj):
+    """Mesmo agrupamento de _dados_telao_fichas, lido do resumo diário (ProducaoDiaria)"""
+    linhas = ProducaoDiaria.objects.filter(
+        data=data_obj,
+        lancamentos__gt=0
+    ).select_related('operador', 'parte').order_by('nome_ficha', 'parte__ordem', 'parte__nome')
+
+    dados_telao = {}
+
+    for linha in linhas:
+        if linha.nome_ficha not in dados_telao:
+            dados_telao[linha.nome_ficha] = {
+                'nome': linha.nome_ficha,
+                'operador': linha.operador.get_full_name() or linha.operador.username,
+                'partes': {},
+                'total': 0
+            }
+
+        partes = dados_telao[linha.nome_ficha]['partes']
+        partes[linha.parte.nome] = partes.get(linha.parte.nome, 0) + linha.total
+        dados_telao[linha.nome_ficha]['total'] += linha.total
+
+    return dados_telao
@@ -0,0 +1,259 @@
+# qualidade/views/estoque.py
+"""
+Posição de estoque da Injetora (todas as fichas de inventário somadas) e
+comparação entre duas fichas: tela, exportação CSV e API JSON de cada uma.
+O cálculo fica em qualidade/estoque.py.
+"""
+import csv
+from datetime import date
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+
+from ..estoque import (
+    comparar_fichas, facetas, facetas_comparacao, filtrar, posicao_estoque, totais, totais_comparacao,
+)
+from ..models import GRUPO_INJETORA, FichaInventario
+
+
+def _pode_ver_estoque(request):
+    return request.ctx.tipo == 'qualidade' or GRUPO_INJETORA in request.ctx.grupos
+
+
+def _filtros(request):
+    """(modelo_id, cor_id, numero) vindos da query string; ids inválidos são ignorados"""
+    def _id(valor):
+        try:
+            return int(valor) if valor else None
+        except ValueError:
+            return None
+
+    return _id(request.GET.get('modelo')), _id(request.GET.get('cor')), request.GET.get('numero') or None
+
+
+@login_required
+def estoque_inventario(request):
+    """Estoque atual por modelo/cor/tamanho somando todas as fichas de inventário"""
+    if not _pode_ver_estoque(request):
+        messages.error(request, 'Você não tem permissão para ver o estoque')
+        return redirect('home')
+
+    modelo_id, cor_id, numero = _filtros(request)
+    posicao = posicao_estoque()
+    linhas = filtrar(posicao, modelo_id, cor_id, numero)
+
+    paginator = Paginator(linhas, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Filtros atuais para os links de paginação e de exportação
+    query = request.GET.copy()
+    query.pop('page', None)
+
+    context = {
+        'page_obj': page_obj,
+        'totais': totais(linhas),
+        'facetas': facetas(posicao, modelo_id, cor_id),
+        'modelo_selecionado': modelo_id,
+        'cor_selecionada': cor_id,
+        'numero_selecionado': numero,
+        'query': query.urlencode(),
+    }
+    return render(request, 'qualidade/estoque_inventario.html', context)
+
+
+@login_required
+def exportar_estoque_csv(request):
+    """Mesmas linhas da tela (com os filtros), em CSV para planilha"""
+    if not _pode_ver_estoque(request):
+        messages.error(request, 'Você não tem permissão para ver o estoque')
+        return redirect('home')
+
+    linhas = filtrar(posicao_estoque(), *_filtros(request))
+
+    # BOM e ponto e vírgula: é o que o Excel em português abre direto
+    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="estoque_{date.today():%Y%m%d}.csv"'
+    response.write('\ufeff')
+    writer = csv.writer(response, delimiter=';')
+    writer.writerow(['Modelo', 'Cor', 'Tamanho', 'Pé Esquerdo', 'Pé Direito', 'Pares', 'Avulsos', 'Lado Sobrando', 'Fichas'])
+    for linha in linhas:
+        writer.writerow([
+            linha['modelo'], linha['cor'], linha['numero'],
+            linha['pe_esquerdo'], linha['pe_direito'], linha['pares'],
+            linha['avulsos'], linha['lado_sobrando'] or '', linha['fichas'],
+        ])
+    return response
+
+
+@login_required
+def api_estoque_inventario(request):
+    """Posição de estoque em JSON.
+
+    GET: modelo, cor (ids) e numero, opcionais. Retorna as linhas, os
+    totais e as facetas (opções de cada filtro).
+    """
+    if not _pode_ver_estoque(request):
+        return JsonResponse({'error': 'Sem permissão'}, status=403)
+
+    modelo_id, cor_id, numero = _filtros(request)
+    posicao = posicao_estoque()
+    linhas = filtrar(posicao, modelo_id, cor_id, numero)
+
+    return JsonResponse({
+        'filtros': {'modelo': modelo_id, 'cor': cor_id, 'numero': numero},
+        'totais': totais(linhas),
+        'facetas': facetas(posicao, modelo_id, cor_id),
+        'linhas': linhas,
+    })
+
+
+# ---------- Comparação entre duas fichas ----------
+
+COLUNAS_COMPARACAO = ('pd_a', 'pe_a', 'pares_a', 'pd_b', 'pe_b', 'pares_b', 'delta_pd', 'delta_pe', 'delta_pares')
+
+
+def _fichas_comparadas(request):
+    """(ficha A, ficha B) dos parâmetros a e b, ou None se faltar/for inválida"""
+    try:
+        ids = int(request.GET.get('a', '')), int(request.GET.get('b', ''))
+    except ValueError:
+        return None
+    fichas = FichaInventario.ativos.in_bulk(ids)
+    if len(fichas) != len(set(ids)) or ids[0] == ids[1]:
+        return None
+    return fichas[ids[0]], fichas[ids[1]]
+
+
+def _comparacao(request, fichas):
+    modelo_id, cor_id, numero = _filtros(request)
+    so_diferencas = request.GET.get('diferencas') == '1'
+    linhas = comparar_fichas(fichas[0].id, fichas[1].id, modelo_id, cor_id, numero, so_diferencas)
+    return linhas, modelo_id, cor_id, numero, so_diferencas
+
+
+@login_required
+def comparar_fichas_inventario(request):
+    """Duas fichas de inventário lado a lado (ex. contagem desta semana contra
+    a da semana passada), com a diferença de cada item"""
+    if not _pode_ver_estoque(request):
+        messages.error(request, 'Você não tem permissão para ver o estoque')
+        return redirect('home')
+
+    context = {
+        'fichas_disponiveis': FichaInventario.ativos.only('id', 'nome_ficha', 'data'),
+        'ficha_a_id': request.GET.get('a', ''),
+        'ficha_b_id': request.GET.get('b', ''),
+    }
+
+    fichas = _fichas_comparadas(request)
+    if fichas is None:
+        if 'a' in request.GET or 'b' in request.GET:
+            messages.error(request, 'Escolha duas fichas de inventário diferentes')
+        return render(request, 'qualidade/comparar_fichas_inventario.html', context)
+
+    linhas, modelo_id, cor_id, numero, so_diferencas = _comparacao(request, fichas)
+    paginator = Paginator(linhas, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    query = request.GET.copy()
+    query.pop('page', None)
+
+    context.update({
+        'ficha_a': fichas[0],
+        'ficha_b': fichas[1],
+        'page_obj': page_obj,
+        'totais': totais_comparacao(linhas),
+        'facetas': facetas_comparacao(fichas[0].id, fichas[1].id, modelo_id, cor_id),
+        'modelo_selecionado': modelo_id,
+        'cor_selecionada': cor_id,
+        'numero_selecionado': numero,
+        'so_diferencas': so_diferencas,
+        'query': query.urlencode(),
+    })
+    return render(request, 'qualidade/comparar_fichas_inventario.html', context)
+
+
+class _Eco:
+    """Arquivo de mentira para o csv.writer: devolve a linha em vez de guardar"""
+    def write(self, valor):
+        return valor
+
+
+@login_required
+def exportar_comparacao_csv(request):
+    """Comparação em CSV, gerada em streaming (fichas grandes não ficam na memória)"""
+    if not _pode_ver_estoque(request):
+        messages.error(request, 'Você não tem permissão para ver o estoque')
+        return redirect('home')
+
+    fichas = _fichas_comparadas(request)
+    if fichas is None:
+        messages.error(request, 'Escolha duas fichas de inventário diferentes')
+        return redirect('comparar_fichas_inventario')
+
+    linhas = _comparacao(request, fichas)[0]
+
+    def _csv():
+        writer = csv.writer(_Eco(), delimiter=';')
+        yield '\ufeff'
+        yield writer.writerow([
+            'Modelo', 'Cor', 'Tamanho',
+            'Pé Direito A', 'Pé Esquerdo A', 'Pares A',
+            'Pé Direito B', 'Pé Esquerdo B', 'Pares B',
+            'Dif. Pé Direito', 'Dif. Pé Esquerdo', 'Dif. Pares',
+        ])
+        for linha in linhas.iterator(chunk_size=2000):
+            yield writer.writerow([
+                linha['modelo__nome'], linha['cor__nome'], linha['tamanho__numero'],
+                *(linha[coluna] for coluna in COLUNAS_COMPARACAO),
+            ])
+
+    response = StreamingHttpResponse(_csv(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="comparacao_{fichas[0].id}_{fichas[1].id}_{date.today():%Y%m%d}.csv"'
+    )
+    return response
+
+
+@login_required
+def api_comparar_fichas_inventario(request):
+    """Comparação entre duas fichas em JSON.
+
+    GET: a e b (ids das fichas, obrigatórios), modelo, cor, numero,
+    diferencas=1 (só itens que mudaram) e page (50 linhas por página).
+    As diferenças são sempre da ficha b menos a ficha a.
+    """
+    if not _pode_ver_estoque(request):
+        return JsonResponse({'error': 'Sem permissão'}, status=403)
+
+    fichas = _fichas_comparadas(request)
+    if fichas is None:
+        return JsonResponse({'error': 'Informe a e b: ids de duas fichas de inventário diferentes'}, status=400)
+
+    linhas, modelo_id, cor_id, numero, so_diferencas = _comparacao(request, fichas)
+    page_obj = Paginator(linhas, 50).get_page(request.GET.get('page'))
+
+    return JsonResponse({
+        'fichas': {
+            lado: {'id': ficha.id, 'nome': ficha.nome_ficha, 'data': ficha.data.isoformat()}
+            for lado, ficha in zip(('a', 'b'), fichas)
+        },
+        'filtros': {'modelo': modelo_id, 'cor': cor_id, 'numero': numero, 'diferencas': so_diferencas},
+        'totais': totais_comparacao(linhas),
+        'facetas': facetas_comparacao(fichas[0].id, fichas[1].id, modelo_id, cor_id),
+        'pagina': page_obj.number,
+        'paginas': page_obj.paginator.num_pages,
+        'total_linhas': page_obj.paginator.count,
+        'linhas': [
+            {
+                'modelo_id': linha['modelo_id'], 'modelo': linha['modelo__nome'],
+                'cor_id': linha['cor_id'], 'cor': linha['cor__nome'],
+                'tamanho_id': linha['tamanho_id'], 'numero': linha['tamanho__numero'],
+                **{coluna: linha[coluna] for coluna in COLUNAS_COMPARACAO},
+            }
+            for linha in page_obj
+        ],
+    })
@@ -8,23 +8,26 @@ from django.contrib import messages
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils import timezone
 from django.core.paginator import Paginator
-from datetime import date
-from django.db.models import Sum, F, Q
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.db.models import Sum, F, Q, Value, CharField
+from django.db import transaction
 
-from ..models import Ficha, ParteCalcado, NomeOperador, FichaInventario, ItemInventario
+from .. import lixeira
+from ..condicional import ficha_condicional
+from ..estoque import invalidar as invalidar_estoque
+from ..models import GRUPO_INJETORA, Ficha, ParteCalcado, NomeOperador, FichaInventario, ItemInventario, ProducaoDiaria
 
 
 @login_required
 def home(request):
-    perfil = request.user.perfil
+    perfil = request.ctx
     data_filtro = request.GET.get('data')
 
     # Grupo do usuário
-    grupo_usuario = request.user.groups.first()
-    grupo_nome = grupo_usuario.name if grupo_usuario else None
+    grupo_nome = request.ctx.setor
 
     # ----- FICHAS NORMAIS -----
-    fichas = Ficha.objects.filter(excluido=False).select_related(
+    fichas = Ficha.ativos.select_related(
         'operador'
     ).prefetch_related('registros')
 
@@ -53,13 +56,11 @@ def home(request):
     # ----- FICHAS DE INVENTÁRIO -----
     if grupo_nome in ["Injetora", "Qualidade"]:
         if perfil.tipo == "operador":
-            fichas_inventario = FichaInventario.objects.filter(
-                operador=request.user,excluido=False
+            fichas_inventario = FichaInventario.ativos.filter(
+                operador=request.user
             ).order_by("-data")
         else:
-            fichas_inventario = FichaInventario.objects.filter(
-                excluido=False
-            ).order_by("-data")
+            fichas_inventario = FichaInventario.ativos.order_by("-data")
     else:
         fichas_inventario = None  # não mostra inventário
     #--Filtro de Data--#    
@@ -106,12 +107,12 @@ def home(request):
 def criar_ficha(request):
 
     # Apenas operadores podem criar ficha
-    if request.user.perfil.tipo != 'operador':
+    if request.ctx.tipo != 'operador':
         messages.error(request, 'Apenas operadores podem criar fichas')
         return redirect('home')
 
     # --- SE FOR INJETORA ---
-    if request.user.groups.filter(name='Injetora').exists():
+    if GRUPO_INJETORA in request.ctx.grupos:
 
         if request.method == 'POST':
             nome_ficha = request.POST.get('nome_ficha')
@@ -135,8 +136,8 @@ def criar_ficha(request):
         })
 
     # --- OUTROS SETORES ---
-    nomes_operador = NomeOperador.objects.filter(
-        ativo=True, excluido=False
+    nomes_operador = NomeOperador.ativos.filter(
+        ativo=True
     ).order_by('ordem', 'nome')
 
     if request.method == 'POST':
@@ -146,6 +147,7 @@ def criar_ficha(request):
         if data and nome_ficha:
             ficha = Ficha.objects.create(
                 operador=request.user,
+                setor=request.ctx.setor,
                 data=data,
                 nome_ficha=nome_ficha,
             )
@@ -168,40 +170,38 @@ def editar_ficha(request, ficha_id):
     ficha = get_object_or_404(Ficha, id=ficha_id)
     
     # Verificar permissão
-    if request.user.perfil.tipo == 'operador' and ficha.operador != request.user:
+    if request.ctx.tipo == 'operador' and ficha.operador_id != request.user.id:
         messages.error(request, 'Você não tem permissão para editar esta ficha')
         return redirect('home')
     
-    # Buscar todas as partes ativas E NÃO EXCLUÍDAS
-    partes_disponiveis = ParteCalcado.objects.filter(ativo=True, excluido=False).order_by('nome' ,'ordem')
-    
-    # Buscar registros existentes desta ficha
-    registros_existentes = ficha.registros.all().select_related('parte')
-    
-    # IDs das partes já adicionadas
-    partes_adicionadas_ids = list(registros_existentes.values_list('parte_id', flat=True))
-    
-    # Preparar dados dos registros
-    registros = {}
+    # Registros desta ficha, lidos uma vez: o template só percorre listas prontas
+    registros_existentes = list(ficha.registros.all().select_related('parte'))
     for registro in registros_existentes:
-        registros[registro.parte.id] = {
-            'registro': registro,
-            'quantidades': registro.quantidades or [],
-            'parte_nome': registro.parte.nome
-        }
-    
+        registro.quantidades = registro.quantidades or []
+        registro.total_quantidades = sum(registro.quantidades)
+
+    # Partes ativas E NÃO EXCLUÍDAS que ainda não estão na ficha
+    partes_adicionadas_ids = {registro.parte_id for registro in registros_existentes}
+    partes_para_adicionar = [
+        parte for parte in ParteCalcado.ativos.filter(ativo=True).order_by('nome', 'ordem')
+        if parte.id not in partes_adicionadas_ids
+    ]
+
     context = {
         'ficha': ficha,
-        'partes_disponiveis': partes_disponiveis,
-        'registros': registros,
+        'partes_para_adicionar': partes_para_adicionar,
         'registros_existentes': registros_existentes,
-        'partes_adicionadas_ids': partes_adicionadas_ids,
-        'pode_editar': request.user.perfil.tipo == 'operador' and ficha.operador == request.user,
+        # Estado do servidor usado pelo modo offline para redesenhar as listas
+        'quantidades_por_parte': {
+            registro.parte_id: registro.quantidades for registro in registros_existentes
+        },
+        'pode_editar': request.ctx.tipo == 'operador' and ficha.operador_id == request.user.id,
     }
     return render(request, 'qualidade/editar_ficha.html', context)
 
 
 @login_required
+@ficha_condicional
 def visualizar_ficha(request, ficha_id):
     """Visualizar ficha (apenas leitura)"""
     ficha = get_object_or_404(Ficha, id=ficha_id)
@@ -222,17 +222,20 @@ def visualizar_ficha(request, ficha_id):
 
 @login_required
 def excluir_ficha(request, ficha_id):
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem excluir fichas')
         return redirect('home')
 
     if request.method == 'POST':
-        ficha = get_object_or_404(Ficha, id=ficha_id, excluido=False)
-
-        ficha.excluido = True
-        ficha.excluido_em = timezone.now()
-        ficha.excluido_por = request.user
-        ficha.save()
+        ficha = get_object_or_404(Ficha.ativos, id=ficha_id)
+
+        with transaction.atomic():
+            # Tira a produção da ficha do resumo diário antes de marcar a exclusão
+            ProducaoDiaria.registrar_ficha(ficha, -1)
+            ficha.excluido = True
+            ficha.excluido_em = timezone.now()
+            ficha.excluido_por = request.user
+            ficha.save()
         messages.success(request, f'Ficha de inventário "{ficha.nome_ficha}" movida para a lixeira!')
     return redirect('home')
 
@@ -240,7 +243,7 @@ def excluir_ficha(request, ficha_id):
 @login_required
 def lixeira_fichas(request):
     """Lixeira de fichas (Ficha e FichaInventario)"""
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem acessar a lixeira')
         return redirect('home')
 
@@ -249,6 +252,18 @@ def lixeira_fichas(request):
         ficha_id = request.POST.get('ficha_id')
         tipo = request.POST.get('tipo')
 
+        if acao in lixeira.ACOES_LOTE:
+            lixeira.processar_lote(
+                request,
+                # A produção das fichas restauradas volta a contar no resumo diário
+                (lixeira.na_lixeira(Ficha, request, 'ids_ficha'), 'ficha(s)',
+                 lambda ids: ProducaoDiaria.registrar_fichas(ids, 1)),
+                # Restauração em lote é um UPDATE (sem signals): a posição de estoque é refeita
+                (lixeira.na_lixeira(FichaInventario, request, 'ids_inventario'), 'ficha(s) de inventário',
+                 lambda ids: invalidar_estoque()),
+            )
+            return redirect(request.get_full_path())
+
         try:
             if tipo == 'Inventario':
                 ficha = FichaInventario.objects.get(id=ficha_id, excluido=True)
@@ -256,10 +271,14 @@ def lixeira_fichas(request):
                 ficha = Ficha.objects.get(id=ficha_id, excluido=True)
 
             if acao == 'restaurar':
-                ficha.excluido = False
-                ficha.excluido_em = None
-                ficha.excluido_por = None
-                ficha.save()
+                with transaction.atomic():
+                    ficha.excluido = False
+                    ficha.excluido_em = None
+                    ficha.excluido_por = None
+                    ficha.save()
+                    # A produção da ficha volta a contar no resumo diário
+                    if tipo != 'Inventario':
+                        ProducaoDiaria.registrar_ficha(ficha, 1)
                 messages.success(request, f'{ficha.tipo_ficha} "{ficha.nome_ficha}" restaurada com sucesso!')
 
             elif acao == 'excluir_permanente':
@@ -270,17 +289,108 @@ def lixeira_fichas(request):
         except (Ficha.DoesNotExist, FichaInventario.DoesNotExist):
             messages.error(request, 'Ficha não encontrada na lixeira')
 
-        return redirect('lixeira_fichas')
+        return redirect(request.get_full_path())
 
-    # GET → listar fichas excluídas
-    fichas_excluidas = list(Ficha.objects.filter(excluido=True)) + list(
-        FichaInventario.objects.filter(excluido=True)
-    )
-
-    # Ordenar pela data de exclusão (mais recente primeiro)
-    fichas_excluidas.sort(key=lambda f: f.excluido_em or 0, reverse=True)
+    # GET → uma página da lixeira, ordenada e paginada no banco
+    fichas_excluidas, proxima = _pagina_lixeira_fichas(request.GET.get('apos'))
 
     context = {
         'fichas': fichas_excluidas,
+        'proxima_pagina': proxima,
+        'primeira_pagina': not request.GET.get('apos'),
     }
-    return render(request, 'qualidade/lixeira_fichas.html', context)
\ No newline at end of file
+    return render(request, 'qualidade/lixeira_fichas.html', context)
+
+
+# Lixeira de fichas: as duas tabelas são listadas juntas, por (excluido_em,
+# tipo, id) decrescente, e paginadas por posição, sem OFFSET. Cada tabela é
+# lida com ORDER BY excluido_em DESC, id DESC LIMIT n no índice parcial da
+# lixeira e as duas listas são intercaladas aqui (o SQLite não aceita LIMIT
+# dentro de um UNION ALL), então cada página custa o mesmo independente do
+# tamanho da lixeira. Fichas antigas sem excluido_em vêm num trecho final.
+LIXEIRA_POR_PAGINA = 30
+_TIPOS_LIXEIRA = ((Ficha, 'Ficha'), (FichaInventario, 'Inventario'))
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_CAMPOS_LIXEIRA = (
+    'id', 'tipo', 'nome_ficha', 'data', 'excluido_em',
+    'operador__username', 'operador__first_name', 'operador__last_name',
+    'excluido_por__username', 'excluido_por__first_name', 'excluido_por__last_name',
+)
+
+
+def _nome_usuario(linha, prefixo):
+    nome = f"{linha[prefixo + '__first_name'] or ''} {linha[prefixo + '__last_name'] or ''}".strip()
+    return nome or linha[prefixo + '__username']
+
+
+def _posicao(linha):
+    """Chave da ordem da lixeira (decrescente); as sem data ficam por último"""
+    return linha['excluido_em'] is not None, linha['excluido_em'] or _EPOCA, linha['tipo'], linha['id']
+
+
+def _lixeira_tabela(model, tipo, com_data, cursor, limite):
+    """Até ``limite`` linhas de uma tabela depois do cursor, num trecho
+    (com ou sem excluido_em)"""
+    queryset = model.objects.na_lixeira().filter(excluido_em__isnull=not com_data)
+    if cursor:
+        data, tipo_cursor, id_cursor = cursor
+        if com_data:
+            # Na mesma data, os tipos "maiores" já saíram nas páginas anteriores
+            if tipo > tipo_cursor:
+                queryset = queryset.filter(excluido_em__lt=data)
+            else:
+                queryset = queryset.filter(excluido_em__lte=data)
+                if tipo == tipo_cursor:
+                    queryset = queryset.exclude(excluido_em=data, id__gte=id_cursor)
+        elif tipo > tipo_cursor:
+            return []
+        elif tipo == tipo_cursor:
+            queryset = queryset.filter(id__lt=id_cursor)
+    ordem = ('-excluido_em', '-id') if com_data else ('-id',)
+    queryset = queryset.annotate(tipo=Value(tipo, output_field=CharField()))
+    return list(queryset.order_by(*ordem).values(*_CAMPOS_LIXEIRA)[:limite])
+
+
+def _cursor(linha):
+    """Posição de uma linha como texto para a URL (microssegundos|tipo|id;
+    microssegundos vazio no trecho sem data)"""
+    micros = '' if linha['excluido_em'] is None else (linha['excluido_em'] - _EPOCA) // timedelta(microseconds=1)
+    return f"{micros}|{linha['tipo']}|{linha['id']}"
+
+
+def _ler_cursor(valor):
+    try:
+        micros, tipo, id_ = valor.split('|')
+        data = _EPOCA + timedelta(microseconds=int(micros)) if micros else None
+        return data, tipo, int(id_)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def _pagina_lixeira_fichas(apos=None):
+    """Uma página da lixeira (Ficha + FichaInventario) e o cursor da próxima"""
+    cursor = _ler_cursor(apos)
+    limite = LIXEIRA_POR_PAGINA + 1
+    linhas = []
+    if cursor is None or cursor[0] is not None:
+        for model, tipo in _TIPOS_LIXEIRA:
+            linhas += _lixeira_tabela(model, tipo, True, cursor, limite)
+    if len(linhas) < limite:
+        # Página não encheu com as datadas: continua nas sem excluido_em
+        cursor_sem_data = cursor if cursor and cursor[0] is None else None
+        for model, tipo in _TIPOS_LIXEIRA:
+            linhas += _lixeira_tabela(model, tipo, False, cursor_sem_data, limite)
+
+    linhas = sorted(linhas, key=_posicao, reverse=True)[:limite]
+    proxima = None
+    if len(linhas) > LIXEIRA_POR_PAGINA:
+        linhas = linhas[:LIXEIRA_POR_PAGINA]
+        proxima = _cursor(linhas[-1])
+
+    for linha in linhas:
+        linha['operador_nome'] = _nome_usuario(linha, 'operador')
+        linha['excluido_por_nome'] = (
+            _nome_usuario(linha, 'excluido_por') if linha['excluido_por__username'] else None
+        )
+    return linhas, proxima
+
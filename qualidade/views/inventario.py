@@ -12,11 +12,17 @@ from django.db import models
 from django.core.paginator import Paginator
 from django.db.models import F
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 
 
+from .. import lixeira
+from ..catalogo import invalidar as invalidar_catalogo
+from ..condicional import ficha_inventario_condicional
+from ..estoque import itens_em, ler_momento
+from ..idempotencia import idempotente
 from ..models import (
     FichaInventario, ItemInventario, ModeloCalcado, 
-    Cor, TamanhoModelo , LogMovimentacaoV2
+    Cor, TamanhoModelo , LogMovimentacaoV2, GRUPO_INJETORA
 )
 
 
@@ -24,15 +30,15 @@ from ..models import (
 def criar_ficha_inventario(request):
     """Criar nova ficha de inventário (apenas INJETORA)"""
     # Verificar se é operador do setor INJETORA
-    if request.user.perfil.tipo != 'operador':
+    if request.ctx.tipo != 'operador':
         messages.error(request, 'Apenas operadores podem criar fichas')
         return redirect('home')
     
-    if not request.user.groups.filter(name='INJETORA').exists():
+    if GRUPO_INJETORA not in request.ctx.grupos:
         messages.error(request, 'Esta funcionalidade é exclusiva do setor INJETORA')
         return redirect('home')
     
-    modelos = ModeloCalcado.objects.filter(ativo=True, excluido=False).order_by('nome')
+    modelos = ModeloCalcado.ativos.filter(ativo=True).order_by('nome')
     
     if request.method == 'POST':
         nome_ficha = request.POST.get('nome_ficha')
@@ -58,11 +64,12 @@ def criar_ficha_inventario(request):
 
 @login_required
 @ensure_csrf_cookie
+@idempotente
 def editar_ficha_inventario(request, ficha_id):
     ficha = get_object_or_404(FichaInventario, id=ficha_id)
 
     # Permissão
-    pode_editar = request.user.perfil.tipo == "operador"
+    pode_editar = request.ctx.tipo == "operador"
     if not pode_editar:
         messages.error(request, "Você não tem permissão para editar esta ficha")
         return redirect("home")
@@ -114,30 +121,12 @@ def editar_ficha_inventario(request, ficha_id):
             quantidade_pe_esquerdo=quantidade_pe_esquerdo,
         )
 
-        # REGISTRO NO HISTÓRICO
-        # Registra a entrada do Pé Direito
+        # REGISTRO NO HISTÓRICO (um log por lado, encadeando os saldos)
+        saldo = (0, 0)
         if quantidade_pe_direito > 0:
-            LogMovimentacaoV2.objects.create(
-                ficha=item.ficha,
-                item=item,
-                operador=request.user,
-                acao='adicionar',
-                lado='PD',
-                quantidade_movimentada=quantidade_pe_direito,
-                saldo_momento=quantidade_pe_direito # Saldo inicial
-            )
-        
-        # Registra a entrada do Pé Esquerdo
+            saldo = LogMovimentacaoV2.registrar(item, request.user, 'adicionar', 'PD', quantidade_pe_direito, saldo)
         if quantidade_pe_esquerdo > 0:
-            LogMovimentacaoV2.objects.create(
-                ficha=item.ficha,
-                item=item,
-                operador=request.user,
-                acao='adicionar',
-                lado='PE',
-                quantidade_movimentada=quantidade_pe_esquerdo,
-                saldo_momento=quantidade_pe_esquerdo # Saldo inicial
-            )
+            LogMovimentacaoV2.registrar(item, request.user, 'adicionar', 'PE', quantidade_pe_esquerdo, saldo)
 
         messages.success(
             request,
@@ -149,7 +138,7 @@ def editar_ficha_inventario(request, ficha_id):
     # -------------------------
     # GET → carrega dados com FILTROS
     # -------------------------
-    modelos = ModeloCalcado.objects.filter(excluido=False)
+    modelos = ModeloCalcado.ativos.all()
 
     # Todos os itens da ficha (antes de filtrar)
     itens_totais = ficha.itens.all().select_related("modelo", "cor", "tamanho")
@@ -249,6 +238,7 @@ def editar_ficha_inventario(request, ficha_id):
 
 
 @login_required
+@idempotente
 def remover_item_inventario(request, item_id):
     if request.method != "POST":
         return redirect("home")
@@ -263,7 +253,7 @@ def remover_item_inventario(request, item_id):
     ficha_id = item.ficha.id
 
     # Permissão
-    if request.user.perfil.tipo != "operador":
+    if request.ctx.tipo != "operador":
         messages.error(request, "Você não tem permissão para excluir itens.")
         return redirect("editar_ficha_inventario", ficha_id=ficha_id)
 
@@ -278,28 +268,14 @@ def remover_item_inventario(request, item_id):
     qtd_pe = item.quantidade_pe_esquerdo
 
     # 3. Cria os Logs (Eles vão sobreviver ao delete pelo SET_NULL)
+    saldo = (qtd_pd, qtd_pe)
     if qtd_pd > 0:
-        LogMovimentacaoV2.objects.create(
-            ficha=item.ficha,
-            item=item,
-            identificacao_item=info_item,
-            operador=request.user,
-            acao='subtrair',
-            lado='PD',
-            quantidade_movimentada=qtd_pd,
-            saldo_momento=0
+        saldo = LogMovimentacaoV2.registrar(
+            item, request.user, 'subtrair', 'PD', qtd_pd, saldo, identificacao_item=info_item
         )
-    
     if qtd_pe > 0:
-        LogMovimentacaoV2.objects.create(
-            ficha=item.ficha,
-            item=item,
-            identificacao_item=info_item,
-            operador=request.user,
-            acao='subtrair',
-            lado='PE',
-            quantidade_movimentada=qtd_pe,
-            saldo_momento=0
+        LogMovimentacaoV2.registrar(
+            item, request.user, 'subtrair', 'PE', qtd_pe, saldo, identificacao_item=info_item
         )
 
     # 4. DELEÇÃO SEGURA: Usamos o QuerySet para evitar o erro de 'id is None'
@@ -310,6 +286,7 @@ def remover_item_inventario(request, item_id):
 
 
 @login_required
+@idempotente
 def atualizar_quantidade_item(request, item_id):
     if request.method != "POST":
         return redirect("home")
@@ -317,7 +294,7 @@ def atualizar_quantidade_item(request, item_id):
     item = get_object_or_404(ItemInventario, id=item_id)
 
     # Permissão
-    if request.user.perfil.tipo != "operador":
+    if request.ctx.tipo != "operador":
         messages.error(request, "Você não tem permissão para alterar quantidades.")
         return redirect("editar_ficha_inventario", ficha_id=item.ficha.id)
 
@@ -375,7 +352,17 @@ def atualizar_quantidade_item(request, item_id):
         messages.error(request, "Ação inválida.")
         return redirect("editar_ficha_inventario", ficha_id=item.ficha.id)
 
-    item.save()
+    with transaction.atomic():
+        item.save()
+        item.refresh_from_db()
+
+        # O saldo de antes sai do valor gravado, não da leitura feita na validação
+        delta = valor if acao == 'adicionar' else -valor
+        antes = (
+            item.quantidade_pe_direito - (delta if lado == 'PD' else 0),
+            item.quantidade_pe_esquerdo - (delta if lado == 'PE' else 0),
+        )
+        LogMovimentacaoV2.registrar(item, request.user, acao, lado, valor, antes)
 
     # 1. Captura os filtros que vieram do formulário
     f_modelo = request.POST.get("f_modelo", "")
@@ -393,18 +380,6 @@ def atualizar_quantidade_item(request, item_id):
     if query_params:
         url = f"{url}?{'&'.join(query_params)}"
 
-    item.refresh_from_db() 
-
-    LogMovimentacaoV2.objects.create(
-        ficha=item.ficha,
-        item=item,
-        operador=request.user,
-        acao=acao, # 'adicionar' ou 'subtrair'
-        lado=lado, # 'PE' ou 'PD'
-        quantidade_movimentada=valor,
-        saldo_momento=item.quantidade_pe_esquerdo + item.quantidade_pe_direito
-    )
-
     messages.success(request, mensagem)
     return redirect(url)
 
@@ -415,7 +390,7 @@ def gerenciar_modelos(request):
     """Gerenciar modelos de calçados (apenas qualidade)"""
     
     # Verificar permissão
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem gerenciar modelos.')
         return redirect('home')
 
@@ -482,7 +457,7 @@ def gerenciar_modelos(request):
                 messages.error(request, 'Modelo não informado.')
                 return redirect('gerenciar_modelos')
 
-            modelo = get_object_or_404(ModeloCalcado, id=modelo_id, excluido=False)
+            modelo = get_object_or_404(ModeloCalcado.ativos, id=modelo_id)
 
             # 1) Caso 1: veio um campo de texto com nome_cor (adicionar uma cor por nome)
             nome_cor = request.POST.get('nome_cor', '').strip()
@@ -498,7 +473,7 @@ def gerenciar_modelos(request):
 
             # Se veio nome_cor: buscar (case-insensitive) ou criar
             if nome_cor:
-                cor_obj = Cor.objects.filter(nome__iexact=nome_cor, excluido=False).first()
+                cor_obj = Cor.ativos.filter(nome__iexact=nome_cor).first()
                 if not cor_obj:
                     cor_obj = Cor.objects.create(nome=nome_cor, criado_por=request.user)
                 cores_para_adicionar.append(cor_obj)
@@ -506,7 +481,7 @@ def gerenciar_modelos(request):
             # Se vieram ids: converter para objetos Cor válidos (ignorando já excluídos)
             if cores_ids:
                 # filtra somente as cores válidas
-                cores_qs = Cor.objects.filter(pk__in=cores_ids, excluido=False)
+                cores_qs = Cor.ativos.filter(pk__in=cores_ids)
                 # adiciona cada objeto à lista (evita duplicatas)
                 for c in cores_qs:
                     if c not in cores_para_adicionar:
@@ -529,7 +504,7 @@ def gerenciar_modelos(request):
 
                 # Criar tamanhos existentes para a nova cor (evita duplicatas)
                 tamanhos_existentes = (
-                    TamanhoModelo.objects.filter(modelo=modelo, excluido=False)
+                    TamanhoModelo.ativos.filter(modelo=modelo)
                     .values_list('numero', flat=True)
                     .distinct()
                 )
@@ -566,7 +541,7 @@ def gerenciar_modelos(request):
                 messages.error(request, "Modelo não informado.")
                 return redirect('gerenciar_modelos')
 
-            modelo = get_object_or_404(ModeloCalcado, id=modelo_id, excluido=False)
+            modelo = get_object_or_404(ModeloCalcado.ativos, id=modelo_id)
 
             # lista de tamanhos enviados pelos checkboxes
             tamanhos_sel = request.POST.getlist('tamanhos[]') or request.POST.getlist('tamanhos')
@@ -590,7 +565,7 @@ def gerenciar_modelos(request):
             tamanhos_limpos = sorted(set(tamanhos_limpos))  # remove duplicatas e ordena
 
             # todas as cores vinculadas ao modelo
-            cores = modelo.cores.filter(excluido=False)
+            cores = modelo.cores.ativos()
 
             if not cores.exists():
                 messages.error(request, "O modelo não possui cores. Adicione cores antes de adicionar tamanhos.")
@@ -635,7 +610,7 @@ def gerenciar_modelos(request):
             
             try:
                 with transaction.atomic():
-                    modelo = ModeloCalcado.objects.get(id=modelo_id, excluido=False)
+                    modelo = ModeloCalcado.ativos.get(id=modelo_id)
                     modelo.excluido = True
                     modelo.excluido_em = timezone.now()
                     modelo.excluido_por = request.user
@@ -655,51 +630,39 @@ def gerenciar_modelos(request):
     # GET - Exibir página
     # --------------------
 
-    # Buscar modelos ativos
-    modelos = (
-        ModeloCalcado.objects.filter(excluido=False)
-        .prefetch_related('cores', 'tamanhos')
-        .order_by('nome')
-    )
-    # Verificar duplicação de nome (incluindo excluídos)
-    cores_disponiveis = Cor.objects.filter(excluido=False, ativo=True).order_by('nome')
-
     # Definir faixas de tamanhos
     tamanhos_infantil_completo = list(range(26, 37))  # 26 até 36
     tamanhos_adulto_completo = list(range(34, 46))    # 34 até 45
 
-    # Processar cada modelo para calcular tamanhos disponíveis
-    for modelo in modelos:
-        # Contar tamanhos distintos
-        modelo.tamanho_count = (
-            modelo.tamanhos.filter(excluido=False)
-            .values('numero')
-            .distinct()
-            .count()
+    def _modelos_com_tamanhos():
+        """Modelos ativos com os tamanhos que já têm e os que faltam, a partir
+        dos tamanhos pré-carregados (sem consulta por modelo)"""
+        modelos = list(
+            ModeloCalcado.ativos.all()
+            .prefetch_related('cores', 'tamanhos')
+            .order_by('nome')
         )
-        
-        # Pegar tamanhos que o modelo JÁ possui
-        tamanhos_existentes = set(
-            modelo.tamanhos.filter(excluido=False)
-            .values_list('numero', flat=True)
-            .distinct()
-        )
-        
-        # Calcular tamanhos disponíveis para adicionar (que NÃO existem ainda)
-        modelo.tamanhos_infantil_disponiveis = [
-            str(t) for t in tamanhos_infantil_completo 
-            if str(t) not in tamanhos_existentes
-        ]
-        modelo.tamanhos_unicos = (
-            modelo.tamanhos.filter(excluido=False)
-            .values_list('numero', flat=True)
-            .distinct()
-            .order_by('numero')
-        )
-        modelo.tamanhos_adulto_disponiveis = [
-            str(t) for t in tamanhos_adulto_completo 
-            if str(t) not in tamanhos_existentes
-        ]
+        for modelo in modelos:
+            # Tamanhos que o modelo JÁ possui (fora da lixeira)
+            tamanhos_existentes = {t.numero for t in modelo.tamanhos.all() if not t.excluido}
+            modelo.tamanho_count = len(tamanhos_existentes)
+            modelo.tamanhos_unicos = sorted(tamanhos_existentes)
+
+            # Tamanhos disponíveis para adicionar (que NÃO existem ainda)
+            modelo.tamanhos_infantil_disponiveis = [
+                str(t) for t in tamanhos_infantil_completo
+                if str(t) not in tamanhos_existentes
+            ]
+            modelo.tamanhos_adulto_disponiveis = [
+                str(t) for t in tamanhos_adulto_completo
+                if str(t) not in tamanhos_existentes
+            ]
+        return modelos
+
+    # Os cartões dos modelos ficam no cache de fragmentos (versão do catálogo):
+    # a lista só é montada quando o template realmente renderiza o bloco
+    modelos = SimpleLazyObject(_modelos_com_tamanhos)
+    cores_disponiveis = Cor.ativos.filter(ativo=True).order_by('nome')
 
     context = {
         'modelos': modelos,
@@ -713,9 +676,18 @@ def gerenciar_modelos(request):
 
 
 @login_required
+@ficha_inventario_condicional
 def visualizar_ficha_inventario(request, ficha_id):
     ficha = get_object_or_404(FichaInventario, id=ficha_id)
 
+    # Estoque numa data (?as_of=AAAA-MM-DD ou AAAA-MM-DDTHH:MM), refeito pelo histórico
+    as_of = request.GET.get('as_of')
+    if as_of:
+        momento = ler_momento(as_of)
+        if momento:
+            return _visualizar_ficha_inventario_em(request, ficha, momento, as_of)
+        messages.error(request, 'Data inválida para a consulta do estoque (use AAAA-MM-DD)')
+
     # Todos os itens da ficha (antes de filtrar)
     itens_totais = ficha.itens.all().select_related('modelo', 'cor', 'tamanho')
     
@@ -813,16 +785,77 @@ def visualizar_ficha_inventario(request, ficha_id):
         'numeros': numeros_na_ficha,
 
         'total_pares': total_pares,
+        'total_itens': len(itens),
         'modelos_diferentes': modelos_diferentes,
     }
 
     return render(request, 'qualidade/visualizar_ficha_inventario.html', context)
 
+
+def _visualizar_ficha_inventario_em(request, ficha, momento, as_of):
+    """Mesma tela, com os itens como estavam em ``momento`` (filtros em memória)"""
+    itens_totais = itens_em(ficha, momento)
+
+    modelo_id = request.GET.get('modelo')
+    cor_id = request.GET.get('cor')
+    numero = request.GET.get('numero')
+
+    def _filtrar(itens, modelo=True, cor=True, tamanho=True):
+        return [
+            item for item in itens
+            if (not (modelo and modelo_id) or str(item.modelo_id) == modelo_id)
+            and (not (cor and cor_id) or str(item.cor_id) == cor_id)
+            and (not (tamanho and numero) or item.tamanho.numero == numero)
+        ]
+
+    itens = _filtrar(itens_totais)
+    for item in itens:
+        item.pares = item.total_pares
+        item.sobra_esquerda = item.quantidade_pe_esquerdo - item.pares
+        item.sobra_direita = item.quantidade_pe_direito - item.pares
+
+    paginator = Paginator(itens, 15)
+    itens_paginados = paginator.get_page(request.GET.get('page'))
+
+    # Opções dos filtros, na mesma lógica da tela atual
+    modelos = {item.modelo_id: item.modelo for item in itens_totais}
+    cores = {item.cor_id: item.cor for item in _filtrar(itens_totais, cor=False, tamanho=False)}
+    numeros = {item.tamanho.numero for item in _filtrar(itens_totais, tamanho=False)}
+
+    context = {
+        'ficha': ficha,
+        'itens': itens,
+        'itens_paginados': itens_paginados,
+
+        'modelo_selecionado': modelo_id,
+        'cor_selecionada': cor_id,
+        'numero_selecionado': numero,
+
+        'modelos': sorted(modelos.values(), key=lambda m: m.nome),
+        'cores': sorted(cores.values(), key=lambda c: c.nome),
+        'numeros': sorted(numeros),
+
+        'total_pares': sum(item.pares for item in itens),
+        'total_itens': len(itens),
+        'modelos_diferentes': len({item.modelo_id for item in itens}),
+
+        'momento': momento,
+        'as_of': as_of,
+    }
+    return render(request, 'qualidade/visualizar_ficha_inventario.html', context)
+
+def _restaurar_tamanhos(ids):
+    """Como na restauração individual, os tamanhos voltam junto com os modelos.
+    UPDATE em lote não dispara signals: a versão do catálogo é trocada aqui."""
+    TamanhoModelo.objects.filter(modelo_id__in=ids).update(excluido=False, ativo=True)
+    invalidar_catalogo()
+
+
 @login_required
 def lixeira_modelos(request):
     """Lixeira dos modelos de calçado (apenas qualidade)."""
 
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem acessar a lixeira.')
         return redirect('home')
 
@@ -830,6 +863,14 @@ def lixeira_modelos(request):
         acao = request.POST.get('acao')
         modelo_id = request.POST.get('modelo_id')
 
+        if acao in lixeira.ACOES_LOTE:
+            lixeira.processar_lote(request, (
+                lixeira.na_lixeira(ModeloCalcado, request),
+                'modelo(s)',
+                _restaurar_tamanhos,
+            ))
+            return redirect('lixeira_modelos')
+
         # 1) Restaurar da lixeira
         if acao == 'restaurar':
             try:
@@ -855,6 +896,7 @@ def lixeira_modelos(request):
                 modelo = ModeloCalcado.objects.get(id=modelo_id, excluido=True)
                 nome_modelo = modelo.nome
                 modelo.delete()
+                invalidar_catalogo()
                 messages.success(request, f'Modelo "{nome_modelo}" excluído permanentemente!')
             except ModeloCalcado.DoesNotExist:
                 messages.error(request, 'Modelo não encontrado na lixeira.')
@@ -862,7 +904,7 @@ def lixeira_modelos(request):
         return redirect('lixeira_modelos')
 
     # Listar somente excluídos
-    modelos_excluidos = ModeloCalcado.objects.filter(excluido=True).order_by('-criado_em')
+    modelos_excluidos = ModeloCalcado.objects.na_lixeira().order_by('-criado_em')
 
     context = {
         'modelos': modelos_excluidos,
@@ -873,7 +915,7 @@ def lixeira_modelos(request):
 def gerenciar_cores(request):
     """Gerenciar cores do calçado (apenas qualidade)"""
     # Verificar se é usuário da qualidade
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem gerenciar partes')
         return redirect('home')
     
@@ -897,7 +939,7 @@ def gerenciar_cores(request):
         elif acao == 'mover_lixeira':
             cor_id = request.POST.get('cor_id')
             try:
-                cor = Cor.objects.get(id=cor_id, excluido=False)
+                cor = Cor.ativos.get(id=cor_id)
                 cor.excluido = True
                 cor.excluido_em = timezone.now()
                 cor.save()
@@ -908,7 +950,7 @@ def gerenciar_cores(request):
         elif acao == 'ativar_desativar':
             cor_id = request.POST.get('cor_id')
             try:
-                cor = Cor.objects.get(id=cor_id, excluido=False)
+                cor = Cor.ativos.get(id=cor_id)
                 cor.ativo = not cor.ativo
                 cor.save()
                 status = 'ativada' if cor.ativo else 'desativada'
@@ -919,7 +961,7 @@ def gerenciar_cores(request):
         return redirect('gerenciar_cores')
     
     # Listar apenas partes NÃO EXCLUÍDAS
-    cores = Cor.objects.filter(excluido=False).order_by('ordem', 'nome')
+    cores = Cor.ativos.order_by('ordem', 'nome')
     
     context = {
         'cores': cores,
@@ -929,13 +971,19 @@ def gerenciar_cores(request):
 @login_required
 def lixeira_cores(request):
     """Lixeira de nomes de cores (apenas qualidade)"""
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem acessar a lixeira')
         return redirect('home')
     
     if request.method == 'POST':
         acao = request.POST.get('acao')
         cor_id = request.POST.get('cor_id')
+
+        if acao in lixeira.ACOES_LOTE:
+            lixeira.processar_lote(request, (
+                lixeira.na_lixeira(Cor, request), 'cor(es)', lambda ids: invalidar_catalogo(),
+            ))
+            return redirect('lixeira_cores')
         
         if acao == 'restaurar':
             try:
@@ -952,6 +1000,7 @@ def lixeira_cores(request):
                 cor = Cor.objects.get(id=cor_id, excluido=True)
                 nome_cor = cor.nome
                 cor.delete()
+                invalidar_catalogo()
                 messages.success(request, f'Registro de cor "{nome_cor}" excluído permanentemente!')
             except Cor.DoesNotExist:
                 messages.error(request, 'Nome de cor não encontrada na lixeira')
@@ -959,7 +1008,7 @@ def lixeira_cores(request):
         return redirect('lixeira_cores')
     
     # Listar apenas partes EXCLUÍDAS
-    cores_excluidas = Cor.objects.filter(excluido=True).order_by('-excluido_em')
+    cores_excluidas = Cor.objects.na_lixeira().order_by('-excluido_em')
     
     context = {
         'cores': cores_excluidas,
@@ -968,7 +1017,7 @@ def lixeira_cores(request):
 
 @login_required
 def excluir_ficha_inventario(request, ficha_id):
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem excluir fichas')
         return redirect('home')
 
@@ -8,6 +8,7 @@ from django.contrib import messages
 from django.utils import timezone
 from django.db import models
 
+from .. import lixeira
 from ..models import NomeOperador
 
 
@@ -15,7 +16,7 @@ from ..models import NomeOperador
 def gerenciar_operadores(request):
     """Gerenciar operadores (apenas qualidade)"""
     # Verificar se é usuário da qualidade
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem gerenciar operadores')
         return redirect('home')
     
@@ -39,7 +40,7 @@ def gerenciar_operadores(request):
         elif acao == 'mover_lixeira':
             operador_id = request.POST.get('operador_id')
             try:
-                operador = NomeOperador.objects.get(id=operador_id, excluido=False)
+                operador = NomeOperador.ativos.get(id=operador_id)
                 operador.excluido = True
                 operador.excluido_em = timezone.now()
                 operador.save()
@@ -50,7 +51,7 @@ def gerenciar_operadores(request):
         elif acao == 'ativar_desativar':
             operador_id = request.POST.get('operador_id')
             try:
-                operador = NomeOperador.objects.get(id=operador_id, excluido=False)
+                operador = NomeOperador.ativos.get(id=operador_id)
                 operador.ativo = not operador.ativo
                 operador.save()
                 status = 'ativo' if operador.ativo else 'desativado'
@@ -61,7 +62,7 @@ def gerenciar_operadores(request):
         return redirect('gerenciar_operadores')
     
     # Listar apenas partes NÃO EXCLUÍDAS
-    operadores = NomeOperador.objects.filter(excluido=False).order_by('ordem', 'nome')
+    operadores = NomeOperador.ativos.order_by('ordem', 'nome')
     
     context = {
         'operadores': operadores,
@@ -72,13 +73,17 @@ def gerenciar_operadores(request):
 @login_required
 def lixeira_operadores(request):
     """Lixeira de nomes de operadores (apenas qualidade)"""
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem acessar a lixeira')
         return redirect('home')
     
     if request.method == 'POST':
         acao = request.POST.get('acao')
         operador_id = request.POST.get('operador_id')
+
+        if acao in lixeira.ACOES_LOTE:
+            lixeira.processar_lote(request, (lixeira.na_lixeira(NomeOperador, request), 'operador(es)'))
+            return redirect('lixeira_operadores')
         
         if acao == 'restaurar':
             try:
@@ -102,7 +107,7 @@ def lixeira_operadores(request):
         return redirect('lixeira_operadores')
     
     # Listar apenas partes EXCLUÍDAS
-    operadores_excluidos = NomeOperador.objects.filter(excluido=True).order_by('-excluido_em')
+    operadores_excluidos = NomeOperador.objects.na_lixeira().order_by('-excluido_em')
     
     context = {
         'operadores': operadores_excluidos,
@@ -8,6 +8,8 @@ from django.contrib import messages
 from django.utils import timezone
 from django.db import models
 
+from .. import lixeira
+from ..catalogo import invalidar as invalidar_catalogo
 from ..models import ParteCalcado
 
 
@@ -15,7 +17,7 @@ from ..models import ParteCalcado
 def gerenciar_partes(request):
     """Gerenciar partes do calçado (apenas qualidade)"""
     # Verificar se é usuário da qualidade
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem gerenciar partes')
         return redirect('home')
     
@@ -39,7 +41,7 @@ def gerenciar_partes(request):
         elif acao == 'mover_lixeira':
             parte_id = request.POST.get('parte_id')
             try:
-                parte = ParteCalcado.objects.get(id=parte_id, excluido=False)
+                parte = ParteCalcado.ativos.get(id=parte_id)
                 parte.excluido = True
                 parte.excluido_em = timezone.now()
                 parte.save()
@@ -50,7 +52,7 @@ def gerenciar_partes(request):
         elif acao == 'ativar_desativar':
             parte_id = request.POST.get('parte_id')
             try:
-                parte = ParteCalcado.objects.get(id=parte_id, excluido=False)
+                parte = ParteCalcado.ativos.get(id=parte_id)
                 parte.ativo = not parte.ativo
                 parte.save()
                 status = 'ativada' if parte.ativo else 'desativada'
@@ -61,7 +63,7 @@ def gerenciar_partes(request):
         return redirect('gerenciar_partes')
     
     # Listar apenas partes NÃO EXCLUÍDAS
-    partes = ParteCalcado.objects.filter(excluido=False).order_by('ordem', 'nome')
+    partes = ParteCalcado.ativos.order_by('ordem', 'nome')
     
     context = {
         'partes': partes,
@@ -72,13 +74,19 @@ def gerenciar_partes(request):
 @login_required
 def lixeira_partes(request):
     """Lixeira de partes (apenas qualidade)"""
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Apenas usuários da qualidade podem acessar a lixeira')
         return redirect('home')
     
     if request.method == 'POST':
         acao = request.POST.get('acao')
         parte_id = request.POST.get('parte_id')
+
+        if acao in lixeira.ACOES_LOTE:
+            lixeira.processar_lote(request, (
+                lixeira.na_lixeira(ParteCalcado, request), 'parte(s)', lambda ids: invalidar_catalogo(),
+            ))
+            return redirect('lixeira_partes')
         
         if acao == 'restaurar':
             try:
@@ -95,6 +103,7 @@ def lixeira_partes(request):
                 parte = ParteCalcado.objects.get(id=parte_id, excluido=True)
                 nome_parte = parte.nome
                 parte.delete()
+                invalidar_catalogo()
                 messages.success(request, f'Parte "{nome_parte}" excluída permanentemente!')
             except ParteCalcado.DoesNotExist:
                 messages.error(request, 'Parte não encontrada na lixeira')
@@ -102,7 +111,7 @@ def lixeira_partes(request):
         return redirect('lixeira_partes')
     
     # Listar apenas partes EXCLUÍDAS
-    partes_excluidas = ParteCalcado.objects.filter(excluido=True).order_by('-excluido_em')
+    partes_excluidas = ParteCalcado.objects.na_lixeira().order_by('-excluido_em')
     
     context = {
         'partes': partes_excluidas,
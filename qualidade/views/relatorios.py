@@ -11,18 +11,33 @@ from django.db.models import Sum
 from datetime import datetime, timedelta
 from django.utils import timezone 
 from io import BytesIO
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.pdfgen import canvas
 from django.core.paginator import Paginator
 
-from ..models import Ficha, ParteCalcado, FichaInventario, LogMovimentacaoV2, RegistroParte
+from ..estoque import itens_em, ler_momento
+from ..models import Ficha, ParteCalcado, FichaInventario, LogMovimentacaoV2, RegistroParte, ProducaoDiaria, LancamentoParte
+
+
+def _totais_por_parte(data_inicio, data_fim, perfil_id=None, nome_ficha=None, parte_id=None):
+    """Totais do período por parte, lidos do resumo diário (ProducaoDiaria).
+    Retorna (totais_por_parte, total_geral)."""
+    resumo = ProducaoDiaria.objects.filter(data__range=[data_inicio, data_fim])
+    if perfil_id:
+        resumo = resumo.filter(operador_id=perfil_id)
+    if nome_ficha:
+        resumo = resumo.filter(nome_ficha=nome_ficha)
+    if parte_id:
+        resumo = resumo.filter(parte_id=parte_id)
+
+    totais_por_parte = {
+        linha['parte__nome']: linha['soma']
+        for linha in resumo.values('parte__nome').annotate(soma=Sum('total')).order_by('parte__nome')
+    }
+    return totais_por_parte, sum(totais_por_parte.values())
 
 
 @login_required
 def relatorio_producao(request):
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         messages.error(request, 'Acesso negado.')
         return redirect('home')
 
@@ -35,20 +50,24 @@ def relatorio_producao(request):
 
     # Dados para carregar os selects do filtro
     todos_usuarios = User.objects.filter(perfil__tipo='operador').order_by('first_name')
-    todas_partes = ParteCalcado.objects.filter(ativo=True, excluido=False).order_by('nome')
+    todas_partes = ParteCalcado.ativos.filter(ativo=True).order_by('nome')
     # Nomes únicos de fichas cadastrados no sistema para o filtro
-    nomes_fichas_unicos = Ficha.objects.filter(excluido=False).values_list('nome_ficha', flat=True).distinct().order_by('nome_ficha')
+    nomes_fichas_unicos = Ficha.ativos.values_list('nome_ficha', flat=True).distinct().order_by('nome_ficha')
 
-    resultados = []
     totais_por_parte = {}
     total_geral = 0
+    registros = []
 
     # 2. Lógica de Busca (Só executa se houver datas)
     if data_inicio and data_fim:
+        # Cards de resumo: vêm do resumo diário, sem reler os registros
+        totais_por_parte, total_geral = _totais_por_parte(
+            data_inicio, data_fim, perfil_id, nome_ficha, parte_id
+        )
+
         # Filtro base: Fichas no período e não excluídas
-        fichas = Ficha.objects.filter(
+        fichas = Ficha.ativos.filter(
             data__range=[data_inicio, data_fim],
-            excluido=False
         )
 
         # Aplicar filtros opcionais
@@ -57,43 +76,37 @@ def relatorio_producao(request):
         if nome_ficha:
             fichas = fichas.filter(nome_ficha=nome_ficha)
 
-        # Buscar os registros de partes dessas fichas
-        # Usamos prefetch_related para não travar o banco com muitas queries
-        registros = RegistroParte.objects.filter(ficha__in=fichas).select_related('ficha', 'parte', 'ficha__operador')
+        # Buscar os registros de partes dessas fichas (ordenados no banco por parte e data)
+        registros = RegistroParte.objects.filter(ficha__in=fichas).select_related(
+            'ficha', 'parte', 'ficha__operador'
+        ).order_by('parte__nome', 'ficha__data', 'id')
 
         if parte_id:
             registros = registros.filter(parte_id=parte_id)
 
-        # 3. Organização dos dados para o Template
-        # Queremos mostrar: Data | Nome Ficha | Parte | Quantidade (Soma do JSON)
-        for reg in registros:
-            qtd_total_registro = reg.total() # Usa o método que já tem no model
-            nome_parte = reg.parte.nome
-            
-            resultados.append({
-                'data': reg.ficha.data,
-                'perfil': reg.ficha.operador.get_full_name() or reg.ficha.operador.username,
-                'nome_ficha': reg.ficha.nome_ficha,
-                'parte': reg.parte.nome,
-                'quantidade': qtd_total_registro
-            })
-
-            if nome_parte in totais_por_parte:
-                totais_por_parte[nome_parte] += qtd_total_registro
-            else:
-                totais_por_parte[nome_parte] = qtd_total_registro
-
-            total_geral += qtd_total_registro
-
-        # Ordenar resultados por data
-        resultados.sort(key=lambda x: (x['parte'], x['data']))
-
     
     # ---- LOGICA DE PAGINAÇÃO ------
-    paginator = Paginator(resultados, 50) # 50 registros por página
+    paginator = Paginator(registros, 50) # 50 registros por página
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
+    # Peças por hora de cada registro da página (só as horas com lançamento)
+    ritmos = LancamentoParte.ritmo_por_registro([reg.id for reg in page_obj.object_list])
+
+    # 3. Organização dos dados para o Template (só a página atual)
+    # Queremos mostrar: Data | Nome Ficha | Parte | Quantidade (Soma do JSON)
+    page_obj.object_list = [
+        {
+            'data': reg.ficha.data,
+            'perfil': reg.ficha.operador.get_full_name() or reg.ficha.operador.username,
+            'nome_ficha': reg.ficha.nome_ficha,
+            'parte': reg.parte.nome,
+            'quantidade': reg.total(),
+            'ritmo': ritmos.get(reg.id),
+        }
+        for reg in page_obj.object_list
+    ]
+
 
     context = {
         'page_obj': page_obj,
@@ -116,7 +129,10 @@ def gerar_relatorio(request, ficha_id):
     """Gerar relatório PDF de uma ficha específica"""
     ficha = get_object_or_404(Ficha, id=ficha_id)
     
-    # Criar PDF
+    # Criar PDF (ReportLab importado aqui: carrega o Pillow e pesa no boot de cada worker)
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
@@ -168,7 +184,13 @@ def gerar_relatorio(request, ficha_id):
 @login_required
 def gerar_relatorio_ficha_inventario(request, ficha_id):
     ficha = get_object_or_404(FichaInventario, id=ficha_id)
-    itens = ficha.itens.select_related("modelo", "tamanho", "cor")
+
+    # ?as_of=AAAA-MM-DD: estoque da ficha naquela data, refeito pelo histórico
+    momento = ler_momento(request.GET.get('as_of'))
+    if momento:
+        itens = itens_em(ficha, momento)
+    else:
+        itens = ficha.itens.select_related("modelo", "tamanho", "cor")
 
     total_pares_geral = 0
     total_avulsos_geral = 0
@@ -178,6 +200,9 @@ def gerar_relatorio_ficha_inventario(request, ficha_id):
         total_pares_geral += pares
         total_avulsos_geral += abs(item.quantidade_pe_direito - item.quantidade_pe_esquerdo)
 
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
@@ -189,6 +214,8 @@ def gerar_relatorio_ficha_inventario(request, ficha_id):
     p.setFont("Helvetica", 10)
     p.drawString(40, height - 75, f"Ficha: {ficha.id} | Nome: {ficha.nome_ficha}")
     p.drawString(40, height - 90, f"Data: {ficha.data.strftime('%d/%m/%Y')} | Operador: {ficha.operador.username}")
+    if momento:
+        p.drawString(40, height - 100, f"Posição do estoque em {timezone.localtime(momento).strftime('%d/%m/%Y %H:%M')}")
 
     # --- Bloco de Totais ---
     p.rect(40, height - 145, 520, 40) 
@@ -263,14 +290,15 @@ def gerar_relatorio_ficha_inventario(request, ficha_id):
     p.save()
     buffer.seek(0)
     response = HttpResponse(buffer, content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="ficha_{ficha.id}.pdf"'
+    sufixo = f"_{timezone.localtime(momento):%Y%m%d}" if momento else ""
+    response["Content-Disposition"] = f'attachment; filename="ficha_{ficha.id}{sufixo}.pdf"'
     return response
 
 
 
 @login_required
 def gerar_pdf_producao(request):
-    if request.user.perfil.tipo != 'qualidade':
+    if request.ctx.tipo != 'qualidade':
         return HttpResponse('Acesso negado', status=403)
 
     # 1. Filtros
@@ -284,7 +312,7 @@ def gerar_pdf_producao(request):
         return HttpResponse('Selecione um período.')
 
     # 2. Busca e Processamento (Lógica idêntica à view do sistema)
-    fichas = Ficha.objects.filter(data__range=[data_inicio, data_fim], excluido=False)
+    fichas = Ficha.ativos.filter(data__range=[data_inicio, data_fim])
     if perfil_id:
         fichas = fichas.filter(operador_id=perfil_id)
     if nome_ficha:
@@ -294,26 +322,20 @@ def gerar_pdf_producao(request):
     if parte_id:
         registros = registros.filter(parte_id=parte_id)
 
-    # 3. Cálculo de Totais (A lógica que adicionamos agora)
-    totais_por_parte = {}
-    total_geral = 0
-    dados_para_tabela = []
+    # 3. Cálculo de Totais (lidos do resumo diário)
+    totais_por_parte, total_geral = _totais_por_parte(
+        data_inicio, data_fim, perfil_id, nome_ficha, parte_id
+    )
 
-    for reg in registros:
-        qtd = reg.total()
-        nome_parte = reg.parte.nome
-        
-        # Acumula para o resumo
-        totais_por_parte[nome_parte] = totais_por_parte.get(nome_parte, 0) + qtd
-        total_geral += qtd
-        
-        # Guarda para a tabela
-        dados_para_tabela.append(reg)
-
-    # Ordenar dados da tabela por data
-    dados_para_tabela.sort(key=lambda x: x.ficha.data)
+    # Dados da tabela ordenados por data no próprio banco
+    dados_para_tabela = registros.order_by('ficha__data', 'id')
 
     # 4. Configuração do ReportLab
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.pdfgen import canvas
+
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="producao_{data_inicio}.pdf"'
 